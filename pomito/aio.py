@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+# Pomito - Pomodoro timer on steroids
+"""Asyncio runtime for the pomodoro service.
+
+Runs the pomodoro service on an asyncio event loop instead of threads. Timers
+are `loop.call_at` handles, signals are dispatched as coroutines and task
+plugin calls can be awaited concurrently. Use this to embed pomito in an
+asyncio application::
+
+    dispatcher = AsyncMessageDispatcher()
+    pomito = Pomito(config, database, dispatcher)
+    service = AsyncPomodoro(pomito)
+    dispatcher.start()
+    service.start_session(task)
+
+All methods, except `AsyncMessageDispatcher.queue_message`, must be called on
+the event loop thread. Objects created without a `loop` use the loop running
+when they are created or started.
+"""
+
+import asyncio
+import inspect
+import logging
+from collections import deque
+
+from pomito.main import Message
+from pomito.pomodoro import Pomodoro, TimerChange
+
+__all__ = ["AsyncMessageDispatcher", "AsyncPomodoro", "AsyncTimer"]
+logger = logging.getLogger("pomito.aio")
+
+
+def _call_receivers(signal, sender, **kwargs):
+    """Call the receivers of a signal. Get the awaitables they return."""
+    awaitables = []
+    for receiver in signal.receivers_for(sender):
+        try:
+            result = receiver(sender, **kwargs)
+        except Exception:
+            logger.exception("Error in signal receiver.")
+            continue
+        if inspect.isawaitable(result):
+            awaitables.append(result)
+    return awaitables
+
+
+class AsyncTimer(object):
+    """A timer driven by the asyncio event loop.
+
+    Equivalent of `pomodoro.Timer`, each tick is a `loop.call_at` handle
+    anchored to the start time. `stop` delivers the interrupt callback right
+    away, so there is nothing to `join`; use `wait` to await completion.
+    """
+
+    def __init__(self, duration, callback, interval=1, loop=None):
+        """Create an instance of the timer.
+
+        Args:
+            duration: total duration for the timer
+            callback: callback that will be invoked on stop or completion
+            interval: duration to increment the timer on each loop
+            loop: event loop to run the timer, default is the loop running
+                at `start`
+        """
+        self.duration = duration
+        self.time_elapsed = interval
+        self.actual_elapsed = 0
+        self.deadline = None
+        self._interval = interval
+        self._tick = 0
+        self._tick_count = round(duration / interval) if duration > 0 else None
+        self._start_time = None
+        self._parent_callback = callback
+        self._loop = loop
+        self._handle = None
+        self._done = None
+
+    def start(self):
+        """Start the timer."""
+        if self._done is not None:
+            raise RuntimeError("Timer can only be started once.")
+        self._loop = self._loop or asyncio.get_running_loop()
+        self._done = self._loop.create_future()
+        self._start_time = self._loop.time()
+        self.deadline = self._start_time + self._interval
+        self._handle = self._loop.call_at(self.deadline, self._fire)
+
+    def stop(self):
+        """Stop the timer. Interrupt callback is invoked synchronously."""
+        if not self.is_alive():
+            return
+        self._handle.cancel()
+        self.actual_elapsed = self._loop.time() - self._start_time
+        self._finish(TimerChange.INTERRUPT)
+
+    def is_alive(self):
+        """Get True if the timer is started and not done yet."""
+        return self._done is not None and not self._done.done()
+
+    def join(self, timeout=None):
+        """Don't block the event loop. See `wait`."""
+        pass
+
+    async def wait(self):
+        """Wait until the timer is done."""
+        if self._done is not None:
+            await asyncio.shield(self._done)
+
+    def _fire(self):
+        now = self._loop.time()
+        self.actual_elapsed = now - self._start_time
+        self._tick = max(self._tick + 1,
+                         int(self.actual_elapsed / self._interval))
+        if self._tick_count is not None and self._tick >= self._tick_count:
+            self.time_elapsed = self.duration
+            self._finish(TimerChange.COMPLETE)
+            return
+
+        self.time_elapsed = (self._tick + 1) * self._interval
+        next_deadline = self._start_time + (self._tick + 1) * self._interval
+        self._handle = self._loop.call_at(next_deadline, self._fire)
+        try:
+            self._parent_callback(TimerChange.INCREMENT)
+        finally:
+            self.deadline = next_deadline
+
+    def _finish(self, notify_reason):
+        try:
+            self._parent_callback(notify_reason)
+        finally:
+            self._done.set_result(notify_reason)
+
+
+class AsyncMessageDispatcher(object):
+    """Message dispatcher running as a task on the event loop.
+
+    Drop-in replacement for `main.MessageDispatcher`. Receivers may be plain
+    functions or coroutine functions; coroutines returned for a message are
+    awaited concurrently before the next message is dispatched.
+    """
+
+    # Sentinel queued by `stop` to end the dispatcher task
+    _STOP = object()
+
+    def __init__(self, loop=None):
+        """Create an instance of the dispatcher.
+
+        Args:
+            loop: event loop to run the dispatcher, default is the loop
+                running at `start`
+        """
+        self._loop = loop
+        self._pending = deque()
+        self._wakeup = None
+        self._task = None
+
+    def start(self):
+        """Start the dispatcher task."""
+        if self._task is not None:
+            raise RuntimeError("Dispatcher is already started.")
+        self._loop = self._loop or asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = self._loop.create_task(self._run())
+        if self._pending:
+            self._wakeup.set()
+
+    def stop(self):
+        """Stop the dispatcher after dispatching the queued messages."""
+        self._put(self._STOP)
+
+    def is_alive(self):
+        """Get alive status of dispatcher."""
+        return self._task is not None and not self._task.done()
+
+    def join(self, timeout=None):
+        """Don't block the event loop. See `wait_closed`."""
+        pass
+
+    async def wait_closed(self):
+        """Wait until the dispatcher task is done."""
+        if self._task is not None:
+            await self._task
+
+    def queue_message(self, message):
+        """Queue a Message to be dispatched. Safe to call from any thread.
+
+        Args:
+            message: message to be dispatched. Type: Message.
+        """
+        if type(message) is not Message:
+            raise TypeError("Only objects of type Message can be queued.")
+        if message.signal.receivers:
+            self._put(message)
+        else:
+            logger.info("AsyncMessageDispatcher: skipped message: " +
+                        message.kwargs.__str__())
+
+    def _put(self, message):
+        self._pending.append(message)
+        if self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._pending:
+                message = self._pending.popleft()
+                if message is self._STOP:
+                    return
+                await self._send(message)
+
+    @staticmethod
+    async def _send(message):
+        awaitables = _call_receivers(message.signal, None, **message.kwargs)
+        if awaitables:
+            results = await asyncio.gather(*awaitables, return_exceptions=True)
+            for result in results:
+                if isinstance(result, Exception):
+                    logger.error("Error in signal receiver: {0}".format(result))
+
+
+class AsyncPomodoro(Pomodoro):
+    """Pomodoro service running on an asyncio event loop.
+
+    Same signals and methods as `pomodoro.Pomodoro`. Timers and commands run
+    on the event loop. Task plugin calls are available as coroutines, they run
+    in the loop's default executor so that they can be awaited concurrently.
+    """
+
+    def __init__(self, pomito_instance, loop=None):
+        """Create an instance of the async pomodoro service.
+
+        Args:
+            pomito_instance: main.Pomito instance, preferably created with an
+                `AsyncMessageDispatcher`
+            loop: event loop to run the service, default is the running loop
+        """
+        self._loop = loop or asyncio.get_running_loop()
+        # Tasks of coroutine increment receivers, the loop keeps only weak
+        # references to them
+        self._increment_tasks = set()
+        super(AsyncPomodoro, self).__init__(pomito_instance,
+                                            create_timer=self._get_async_timer)
+
+    def _get_async_timer(self, duration, callback, interval=1):
+        return AsyncTimer(duration, callback, interval, self._loop)
+
+    async def get_tasks_async(self):
+        """Get all tasks in the current task plugin."""
+        return await self._run_in_executor(self.get_tasks)
+
+    async def get_tasks_by_filter_async(self, task_filter):
+        """Get all tasks with attributes matching a filter.
+
+        See `Pomodoro.get_tasks_by_filter`.
+        """
+        return await self._run_in_executor(self.get_tasks_by_filter,
+                                           task_filter)
+
+    async def get_task_by_id_async(self, task_id):
+        """Get the task with id matching task id.
+
+        See `Pomodoro.get_task_by_id`.
+        """
+        return await self._loop.run_in_executor(None, self.get_task_by_id,
+                                                task_id)
+
+    def _run_in_executor(self, func, *args):
+        # Task plugins may return generators, drain them in the executor
+        return self._loop.run_in_executor(None, lambda: list(func(*args)))
+
+    def _notify_timer_increment(self, time_elapsed):
+        results = [receiver(time_elapsed) for receiver in
+                   self._get_increment_receivers(time_elapsed)]
+        results.extend(_call_receivers(self.signal_timer_increment,
+                                       time_elapsed))
+        for result in results:
+            if inspect.isawaitable(result):
+                future = asyncio.ensure_future(result, loop=self._loop)
+                self._increment_tasks.add(future)
+                future.add_done_callback(self._on_increment_done)
+
+    def _on_increment_done(self, future):
+        self._increment_tasks.discard(future)
+        if not future.cancelled() and future.exception() is not None:
+            logger.error("Error in timer increment receiver: {0}"
+                         .format(future.exception()))
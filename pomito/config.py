@@ -24,6 +24,13 @@ class Configuration(object):
     ui_plugin = "qtapp"
     task_plugin = "nulltask"
 
+    # Database settings, see `pomito.db`
+    journal_mode = "wal"
+    synchronous = "normal"          # Safe with write-ahead log
+    cache_size = 8 * 1024           # Page cache per connection (in KiB)
+    mmap_size = 64                  # Memory mapped database (in MiB)
+    busy_timeout = 5                # Wait for a locked database (in seconds)
+
     def __init__(self, config_file, config_data={}):
         """Create an instance of pomito configuration."""
         self._config_file = os.environ.get("POMITO_CONFIG")
@@ -67,6 +74,16 @@ class Configuration(object):
             self.short_break_duration = self._get_seconds("pomito", "short_break_duration")
             self.long_break_duration = self._get_seconds("pomito", "long_break_duration")
             self.long_break_frequency = self._parser.getint("pomito", "long_break_frequency")
+            self.journal_mode = self._parser.get("pomito", "journal_mode",
+                                                 fallback=self.journal_mode)
+            self.synchronous = self._parser.get("pomito", "synchronous",
+                                                fallback=self.synchronous)
+            self.cache_size = self._parser.getint("pomito", "cache_size",
+                                                  fallback=self.cache_size)
+            self.mmap_size = self._parser.getint("pomito", "mmap_size",
+                                                 fallback=self.mmap_size)
+            self.busy_timeout = self._parser.getfloat("pomito", "busy_timeout",
+                                                      fallback=self.busy_timeout)
 
         if self._parser.has_section("plugins"):
             self.ui_plugin = self._parser.get("plugins", "ui", fallback=self.ui_plugin)
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+# Pomito - Pomodoro timer on steroids.
+"""Database connections for pomito.db.
+
+Connections are per thread: peewee opens a connection for each thread on
+first use, e.g. the dispatcher, the ui and the activity writer. Every
+connection is set up with the pragmas from `Configuration`.
+
+With the default write-ahead log, readers do not block the writer and the
+writer does not block readers. Reports use a separate read-only database,
+see `create_reporting_database`.
+"""
+
+import logging
+import pathlib
+
+from peewee import SqliteDatabase
+
+__all__ = ["create_database", "create_reporting_database", "get_pragmas"]
+logger = logging.getLogger("pomito.db")
+
+
+def get_pragmas(config):
+    """Get the sqlite pragmas for a configuration.
+
+    Args:
+        config: `Configuration` with the database settings
+
+    Returns:
+        Sequence of `(pragma, value)` applied to every connection.
+    """
+    return (("journal_mode", config.journal_mode),
+            ("synchronous", config.synchronous),
+            ("cache_size", -config.cache_size),
+            ("mmap_size", config.mmap_size * 1024 * 1024))
+
+
+def create_database(path, config):
+    """Create the read-write database.
+
+    Args:
+        path: path to the sqlite database file
+        config: `Configuration` with the database settings
+    """
+    logger.debug("Using database '{0}'.".format(path))
+    return SqliteDatabase(path, pragmas=get_pragmas(config),
+                          timeout=config.busy_timeout)
+
+
+def create_reporting_database(path, config):
+    """Create a read-only database for reports.
+
+    Reports are read on their own connections, these never take a write
+    lock on the database. The database at `path` must exist.
+
+    Args:
+        path: path to the sqlite database file
+        config: `Configuration` with the database settings
+    """
+    # Journal mode is persistent and set by the read-write database
+    pragmas = [p for p in get_pragmas(config) if p[0] != "journal_mode"]
+    pragmas.append(("query_only", 1))
+    uri = "{0}?mode=ro".format(pathlib.Path(path).absolute().as_uri())
+    return SqliteDatabase(uri, uri=True,
+                          pragmas=pragmas, timeout=config.busy_timeout)
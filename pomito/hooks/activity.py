@@ -3,13 +3,22 @@
 """Activity module maintains a log of all user activities."""
 
 
+import logging
+import re
+import threading
+import time
 from datetime import datetime
+from enum import Enum
+from queue import Empty, Queue
 
 from pomito.hooks import Hook
+from pomito.pomodoro import TimerChange, TimerType
 
-from peewee import Model, Proxy, DateTimeField, CharField, TextField
+from peewee import (EXCLUDED, SQL, Case, Model, Proxy, CharField, DateField,
+                    DateTimeField, FloatField, IntegerField, TextField, fn)
 
 database_proxy = Proxy()
+logger = logging.getLogger("pomito.hooks.activity")
 
 
 class ActivityHook(Hook):
@@ -18,26 +27,69 @@ class ActivityHook(Hook):
     Keeps a record of pomodoro statistics.
     """
 
-    def __init__(self, service):
+    def __init__(self, service, batch_size=100, flush_interval=1.0):
+        """Create an instance of the activity hook.
+
+        Activities are written to the database on a background thread, in
+        batches of up to `batch_size` rows or after `flush_interval` seconds.
+        """
         self._service = service
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._writer = None
+        self._started_at = None
 
     def initialize(self):
         database_proxy.initialize(self._service.get_db())
+        migrate_activities(self._service.get_db())
         ActivityModel.create_table(True)
+        if not DailyRollupModel.table_exists():
+            DailyRollupModel.create_table()
+            TaskRollupModel.create_table(True)
+            rebuild_rollups(self._service.get_db())
+        self._writer = ActivityWriter(self._service.get_db(),
+                                      self._batch_size,
+                                      self._flush_interval)
+        self._writer.start()
 
+        self._service.signal_session_started.connect(self.handle_started)
+        self._service.signal_break_started.connect(self.handle_started)
+        self._service.signal_interruption_started.connect(self.handle_started)
         self._service.signal_session_stopped\
             .connect(self.handle_session_stopped)
         self._service.signal_break_stopped.connect(self.handle_break_stopped)
         self._service.signal_interruption_stopped\
             .connect(self.handle_interruption_stopped)
 
-    def log(self, category, data):
-        activity = ActivityModel(timestamp=datetime.now(),
-                                 category=category,
-                                 data=data)
-        activity.save()
+    def log(self, category, started_at=None, duration=None, task_uid=None,
+            session_count=None, break_type=None, reason=None):
+        """Queue an activity to be written to the database.
+
+        See `ActivityModel` for the arguments.
+        """
+        timestamp = datetime.now()
+        if duration is None and started_at is not None:
+            duration = (timestamp - started_at).total_seconds()
+        self._writer.write({"timestamp": timestamp,
+                            "category": category,
+                            "started_at": started_at,
+                            "duration": duration,
+                            "task_uid": task_uid,
+                            "session_count": session_count,
+                            "break_type": break_type,
+                            "reason": reason,
+                            "data": None})
+
+    def flush(self):
+        """Wait until all queued activities are written."""
+        if self._writer is not None:
+            self._writer.flush()
 
     def close(self):
+        self._service.signal_session_started.disconnect(self.handle_started)
+        self._service.signal_break_started.disconnect(self.handle_started)
+        self._service.signal_interruption_started\
+            .disconnect(self.handle_started)
         self._service.signal_session_stopped\
             .disconnect(self.handle_session_stopped)
         self._service.signal_break_stopped\
@@ -45,18 +97,34 @@ class ActivityHook(Hook):
         self._service.signal_interruption_stopped\
             .disconnect(self.handle_interruption_stopped)
 
+        # Pending activities are written before the writer exits
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
     ####
     # Pomodoro service signal handlers
     ####
     def handler(category):
         def wrapper(func):
             def inner(self, *args, **kwargs):
-                data = ";".join(["{0}={1}".format(k, v.__str__()) for k, v in
-                                 list(kwargs.items())])
-                self.log(category, data)
+                task = kwargs.get("task")
+                task_uid = getattr(task, "uid", None)
+                self.log(category,
+                         started_at=self._started_at,
+                         duration=kwargs.get("duration"),
+                         task_uid=None if task_uid is None else str(task_uid),
+                         session_count=kwargs.get("session_count"),
+                         break_type=_get_value(kwargs.get("break_type")),
+                         reason=_get_value(kwargs.get("reason")))
+                self._started_at = None
             return inner
         return wrapper
 
+    def handle_started(self, *args, **kwargs):
+        """Record start time of a session, break or interruption."""
+        self._started_at = datetime.now()
+
     @handler(category="break")
     def handle_break_stopped(self, *args, **kwargs): pass    # pragma: no cover
 
@@ -68,10 +136,354 @@ class ActivityHook(Hook):
         pass
 
 
+class ActivityWriter(threading.Thread):
+    """Writes activities to the database in batches.
+
+    Rows are queued by the dispatcher thread and inserted by this thread in a
+    single transaction per batch. A batch is written when it has `batch_size`
+    rows or when its oldest row is `flush_interval` seconds old. A batch which
+    fails is kept and retried after `flush_interval`, on `flush` and on
+    `close`; its rows are dropped only if the write on `close` fails.
+    """
+
+    # Sentinel queued by `close` to stop the writer
+    _STOP = object()
+
+    def __init__(self, database, batch_size=100, flush_interval=1.0):
+        """Create an instance of the writer.
+
+        Args:
+            database: peewee database to write the activities
+            batch_size: maximum rows in a transaction
+            flush_interval: maximum seconds a row waits in the queue
+        """
+        threading.Thread.__init__(self, name="ActivityWriter", daemon=True)
+        self._database = database
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._queue = Queue()
+
+    def write(self, row):
+        """Queue a row for ActivityModel."""
+        self._queue.put(row)
+
+    def flush(self):
+        """Wait until all rows queued so far are written."""
+        flushed = threading.Event()
+        self._queue.put(flushed)
+        flushed.wait()
+
+    def close(self):
+        """Write pending rows and stop the writer."""
+        self._queue.put(self._STOP)
+        self.join()
+
+    def run(self):
+        """Thread run loop. Do not call directly."""
+        rows = []
+        deadline = None
+        failed = False
+        try:
+            while True:
+                timeout = None
+                if rows:
+                    timeout = max(0, deadline - time.monotonic())
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except Empty:
+                    item = None
+
+                if isinstance(item, dict):
+                    if not rows:
+                        deadline = time.monotonic() + self._flush_interval
+                    rows.append(item)
+                    # Retry a failed batch on the deadline, not on each row
+                    if len(rows) < self._batch_size or failed:
+                        continue
+
+                failed = not self._write(rows)
+                if failed:
+                    deadline = time.monotonic() + self._flush_interval
+                else:
+                    rows = []
+
+                if isinstance(item, threading.Event):
+                    item.set()
+                elif item is self._STOP:
+                    if rows:
+                        logger.error("Dropped {0} activities.".format(len(rows)))
+                    return
+        finally:
+            self._database.close()
+
+    def _write(self, rows):
+        if not rows:
+            return True
+        try:
+            with self._database.atomic():
+                ActivityModel.insert_many(rows).execute()
+                _update_rollups(rows)
+        except Exception as e:
+            logger.error("Error writing {0} activities: {1}".format(len(rows), e))
+            return False
+        return True
+
+
 class ActivityModel(Model):
+    """An activity logged by the hook.
+
+    Columns are filled as applicable for the category:
+        timestamp: end time of the activity
+        category: session, break or interruption
+        started_at: start time of the activity, if known
+        duration: duration of the activity in seconds
+        task_uid: uid of the task for a session
+        session_count: completed sessions at the end of a session
+        break_type: `TimerType` value for a break
+        reason: `TimerChange` value for end of a session or break
+        data: unparsed legacy data, `k=v;k=v`, for migrated activities
+    """
+
     timestamp = DateTimeField()
-    category = CharField(index=True)
-    data = TextField()
+    category = CharField()
+    started_at = DateTimeField(null=True)
+    duration = FloatField(null=True)
+    task_uid = CharField(null=True)
+    session_count = IntegerField(null=True)
+    break_type = CharField(null=True)
+    reason = CharField(null=True)
+    data = TextField(null=True)
+
+    class Meta:
+        database = database_proxy
+        # Statistics filter on a category and a time range. The index covers
+        # the aggregated columns so that queries never read the table.
+        indexes = (
+            (("category", "timestamp", "reason", "duration", "task_uid"), False),
+        )
+
+
+class DailyRollupModel(Model):
+    """Activity counters for a day.
+
+    Rollups are updated with each batch of activities, `rebuild_rollups`
+    recomputes them from the activity log.
+
+    Columns:
+        day: day the activities ended
+        sessions: completed sessions
+        interrupted_sessions: interrupted sessions
+        breaks: completed or interrupted breaks
+        interruptions: interruptions
+        focused_seconds: duration of completed and interrupted sessions
+    """
+
+    day = DateField(unique=True)
+    sessions = IntegerField(default=0)
+    interrupted_sessions = IntegerField(default=0)
+    breaks = IntegerField(default=0)
+    interruptions = IntegerField(default=0)
+    focused_seconds = FloatField(default=0.0)
+
+    class Meta:
+        database = database_proxy
+
+
+class TaskRollupModel(Model):
+    """Session counters for a task in a day.
+
+    See `DailyRollupModel` for the columns. `task_uid` is empty for sessions
+    without a task.
+    """
+
+    day = DateField()
+    task_uid = CharField(default="")
+    sessions = IntegerField(default=0)
+    interrupted_sessions = IntegerField(default=0)
+    focused_seconds = FloatField(default=0.0)
 
     class Meta:
         database = database_proxy
+        indexes = (
+            (("day", "task_uid"), True),
+        )
+
+
+_DAILY_COUNTERS = ("sessions", "interrupted_sessions", "breaks",
+                   "interruptions", "focused_seconds")
+_TASK_COUNTERS = ("sessions", "interrupted_sessions", "focused_seconds")
+
+
+def _update_rollups(rows):
+    """Add activity rows to the rollups. Must run in a transaction."""
+    days = {}
+    tasks = {}
+    for row in rows:
+        day = row["timestamp"].date()
+        daily = days.get(day)
+        if daily is None:
+            daily = days[day] = dict.fromkeys(_DAILY_COUNTERS, 0)
+            daily["day"] = day
+
+        category = row["category"]
+        if category == "break":
+            daily["breaks"] += 1
+        elif category == "interruption":
+            daily["interruptions"] += 1
+        elif category == "session":
+            key = (day, row["task_uid"] or "")
+            task = tasks.get(key)
+            if task is None:
+                task = tasks[key] = dict.fromkeys(_TASK_COUNTERS, 0)
+                task.update(day=key[0], task_uid=key[1])
+
+            if row["reason"] == TimerChange.COMPLETE.value:
+                counter = "sessions"
+            elif row["reason"] == TimerChange.INTERRUPT.value:
+                counter = "interrupted_sessions"
+            else:
+                counter = None
+            for rollup in (daily, task):
+                if counter is not None:
+                    rollup[counter] += 1
+                rollup["focused_seconds"] += row["duration"] or 0
+
+    _upsert(DailyRollupModel, list(days.values()), _DAILY_COUNTERS,
+            [DailyRollupModel.day])
+    _upsert(TaskRollupModel, list(tasks.values()), _TASK_COUNTERS,
+            [TaskRollupModel.day, TaskRollupModel.task_uid])
+
+
+def _upsert(model, rows, counters, conflict_target):
+    if not rows:
+        return
+    update = {getattr(model, c): getattr(model, c) + getattr(EXCLUDED, c)
+              for c in counters}
+    model.insert_many(rows)\
+        .on_conflict(conflict_target=conflict_target, update=update)\
+        .execute()
+
+
+def rebuild_rollups(database):
+    """Recompute the rollups from the activity log.
+
+    Args:
+        database: peewee database with the activity log
+    """
+    logger.info("Rebuilding activity rollups.")
+    session = ActivityModel.category == "session"
+
+    def count(condition):
+        return fn.SUM(Case(None, [(condition, 1)], 0))
+
+    complete = count(session &
+                     (ActivityModel.reason == TimerChange.COMPLETE.value))
+    interrupted = count(session &
+                        (ActivityModel.reason == TimerChange.INTERRUPT.value))
+    focused = fn.TOTAL(Case(None, [(session, ActivityModel.duration)], 0))
+    day = fn.date(ActivityModel.timestamp)
+
+    daily = ActivityModel.select(
+        day, complete, interrupted,
+        count(ActivityModel.category == "break"),
+        count(ActivityModel.category == "interruption"), focused)\
+        .group_by(SQL("1"))
+    tasks = ActivityModel.select(
+        day, fn.COALESCE(ActivityModel.task_uid, ""),
+        complete, interrupted, focused)\
+        .where(session)\
+        .group_by(SQL("1"), SQL("2"))
+
+    with database.atomic():
+        DailyRollupModel.delete().execute()
+        DailyRollupModel.insert_from(
+            daily, [DailyRollupModel.day] +
+            [getattr(DailyRollupModel, c) for c in _DAILY_COUNTERS]).execute()
+        TaskRollupModel.delete().execute()
+        TaskRollupModel.insert_from(
+            tasks, [TaskRollupModel.day, TaskRollupModel.task_uid] +
+            [getattr(TaskRollupModel, c) for c in _TASK_COUNTERS]).execute()
+
+
+def _get_value(value):
+    if isinstance(value, Enum):
+        return value.value
+    return None if value is None else str(value)
+
+
+_LEGACY_KEYS = ("session_count", "task", "reason", "break_type", "duration")
+_legacy_split = re.compile(r";(?=(?:{0})=)".format("|".join(_LEGACY_KEYS)))
+_legacy_task_uid = re.compile(r"^I:(.*?) \| E:")
+
+
+def _parse_legacy_data(data):
+    """Parse legacy activity data, `k=v;k=v`, into column values."""
+    values = {}
+    for item in _legacy_split.split(data or ""):
+        key, _, value = item.partition("=")
+        if key in _LEGACY_KEYS and value != "None":
+            values[key] = value
+
+    def get_enum(enum, value):
+        # Legacy values are formatted as `TimerChange.COMPLETE`
+        try:
+            return enum[value.rpartition(".")[2]].value
+        except (AttributeError, KeyError):
+            return value
+
+    task_uid = None
+    task = _legacy_task_uid.match(values.get("task", ""))
+    if task is not None:
+        task_uid = task.group(1)
+
+    def get_number(key, number_type):
+        try:
+            return number_type(values[key])
+        except (KeyError, ValueError):
+            return None
+
+    return (get_number("duration", float), task_uid,
+            get_number("session_count", int),
+            get_enum(TimerType, values.get("break_type")),
+            get_enum(TimerChange, values.get("reason")))
+
+
+def migrate_activities(database, batch_size=10000):
+    """Migrate the activity log to the latest schema.
+
+    Earlier versions stored the signal arguments as a `k=v;k=v` string in
+    `data`. The table is rebuilt with typed columns parsed from `data`; `data`
+    is retained for migrated rows.
+
+    Args:
+        database: peewee database with the activity log
+        batch_size: rows parsed and inserted at once
+    """
+    table = ActivityModel._meta.table_name
+    columns = [c.name for c in database.get_columns(table)]
+    if not columns:
+        return
+
+    # Superseded by the statistics index in `ActivityModel.Meta`
+    database.execute_sql("DROP INDEX IF EXISTS {0}_category".format(table))
+    if "reason" in columns:
+        return
+
+    logger.info("Migrating activities to structured schema.")
+    with database.atomic():
+        legacy = "{0}_legacy".format(table)
+        database.execute_sql("ALTER TABLE {0} RENAME TO {1}".format(table, legacy))
+        ActivityModel.create_table()
+
+        insert = ("INSERT INTO {0} (id, timestamp, category, duration, task_uid, "
+                  "session_count, break_type, reason, data) "
+                  "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)".format(table))
+        cursor = database.execute_sql("SELECT id, timestamp, category, data "
+                                      "FROM {0} ORDER BY id".format(legacy))
+        rows = cursor.fetchmany(batch_size)
+        while rows:
+            database.cursor().executemany(insert, [
+                (r[0], r[1], r[2]) + _parse_legacy_data(r[3]) + (r[3],)
+                for r in rows])
+            rows = cursor.fetchmany(batch_size)
+        database.execute_sql("DROP TABLE {0}".format(legacy))
@@ -6,12 +6,13 @@ import logging
 import os
 import sys
 import threading
-from queue import Queue
-
-from peewee import SqliteDatabase
+import time
+from contextlib import contextmanager
+from queue import Empty, Queue
 
 import pomito.plugins
 from pomito.config import Configuration
+from pomito.db import create_database, create_reporting_database
 
 PACKAGE_NAME = "pomito"
 DATA_HOME = CONFIG_HOME = os.path.expanduser("~")
@@ -39,7 +40,16 @@ class Message(object):
 
 
 class MessageDispatcher(threading.Thread):
-    """Simple queue based message dispatcher."""
+    """Simple queue based message dispatcher.
+
+    The dispatcher thread sleeps on a blocking `Queue.get` until a message
+    arrives, and drains all pending messages in a single wakeup. A sentinel
+    queued by `stop` wakes the thread for shutdown, so an idle dispatcher
+    doesn't wake up at all.
+    """
+
+    # Sentinel queued by `stop` to wake up the dispatcher thread
+    _STOP = object()
 
     def __init__(self):
         threading.Thread.__init__(self)
@@ -49,19 +59,20 @@ class MessageDispatcher(threading.Thread):
 
     def start(self):
         """ Starts the dispatcher.  """
-        if threading.currentThread() == self:
+        if threading.current_thread() == self:
             raise RuntimeError("Cannot call start on the thread itself.")
         threading.Thread.start(self)
 
     def stop(self):
         """Stops processing the queue.
 
-        Doesn't ensure that queue is empty before stop. Message are thrown away.
-        Look at _message_queue.join() in future.
+        Messages queued before the stop are dispatched, anything queued later
+        is thrown away.
         """
-        if threading.currentThread() == self:
+        if threading.current_thread() == self:
             raise RuntimeError("Cannot call start on the thread itself.")
         self._stop_event.set()
+        self._message_queue.put(self._STOP)
 
     def queue_message(self, message):
         """Queue a Message to be dispatched.
@@ -83,21 +94,38 @@ class MessageDispatcher(threading.Thread):
 
     def run(self):
         """Worker for the message dispatcher thread."""
-        while self._stop_event.is_set() is False:
-            while self._message_queue.empty() is False:
-                message = self._message_queue.get()
-
-                # It is possible that we a signal is dispatched to a receiver
-                # not present during enqueue of the message, how ever is present
-                # now. YAGNI call for the moment.
-                logger.debug("MessageDispatcher: dispatch message: " +
-                             message.kwargs.__str__())
-                logger.debug("MessageDispatcher: receivers: " +
-                             message.signal.receivers.__str__())
-                message.send()
-                logger.debug("MessageDispatcher: message dispatched!")
+        while True:
+            # Block until there's work, then drain the queue in one go
+            batch = [self._message_queue.get()]
+            while True:
+                try:
+                    batch.append(self._message_queue.get_nowait())
+                except Empty:
+                    break
+
+            for message in batch:
+                if message is self._STOP:
+                    self._discard(batch)
+                    return
+                self._dispatch(message)
                 self._message_queue.task_done()
-            self._stop_event.wait(0.01)
+
+    def _dispatch(self, message):
+        # It is possible that we a signal is dispatched to a receiver
+        # not present during enqueue of the message, how ever is present
+        # now. YAGNI call for the moment.
+        logger.debug("MessageDispatcher: dispatch message: " +
+                     message.kwargs.__str__())
+        logger.debug("MessageDispatcher: receivers: " +
+                     message.signal.receivers.__str__())
+        message.send()
+        logger.debug("MessageDispatcher: message dispatched!")
+
+    def _discard(self, batch):
+        # Mark the remainder of the batch starting with stop sentinel as done
+        # so that `_message_queue.join()` doesn't block forever.
+        for _ in batch[batch.index(self._STOP):]:
+            self._message_queue.task_done()
 
 
 class Pomito(object):
@@ -109,6 +137,9 @@ class Pomito(object):
         - Handover execution to UI plugin
     """
 
+    # Seconds to wait for the pomodoro commands on exit
+    _exit_timeout = 5
+
     def __init__(self, config=None, database=None, message_dispatcher=None):
         """Create a Pomito object.
 
@@ -121,24 +152,32 @@ class Pomito(object):
 
         self._config = config
         self._database = database
+        self._database_path = None
+        self._reporting_database = None
         self._message_dispatcher = message_dispatcher
         self._threads = {}
         self._hooks = []
+        self._scheduler = pomodoro.TimerScheduler()
+
+        # Seconds taken by each startup phase, see tests/test_startup.py
+        self.startup_times = {}
 
         if self._message_dispatcher is None:
             self._message_dispatcher = MessageDispatcher()
-        if self._config is None:
-            self._config_file = os.path.join(CONFIG_DIR, "config.ini")
-            self._config = Configuration(self._config_file)
-        self._config.load()
+        with self._measure("config"):
+            if self._config is None:
+                self._config_file = os.path.join(CONFIG_DIR, "config.ini")
+                self._config = Configuration(self._config_file)
+            self._config.load()
 
         # Pomodoro service instance. Order of initializations are important
         self.pomodoro_service = pomodoro.Pomodoro(self)
 
         # Default plugins
-        pomito.plugins.initialize(self.pomodoro_service)
-        self.ui_plugin = pomito.plugins.get_plugin(self._config.ui_plugin)
-        self.task_plugin = pomito.plugins.get_plugin(self._config.task_plugin)
+        with self._measure("plugins"):
+            pomito.plugins.initialize(self.pomodoro_service)
+            self.ui_plugin = pomito.plugins.get_plugin(self._config.ui_plugin)
+            self.task_plugin = pomito.plugins.get_plugin(self._config.task_plugin)
 
         # Add the plugins to threads list
         self._threads['task_plugin'] = threading.Thread(target=self.task_plugin)
@@ -152,19 +191,22 @@ class Pomito(object):
         """Initialize configuration, database and starts worker threads."""
         os.makedirs(DATA_DIR, exist_ok=True)
 
-        database_path = os.path.join(DATA_DIR, "pomito.db")
-        if self._database is None:
-            self._database = SqliteDatabase(None)
-            self._database.init(database_path)
-        self._database.connect()
+        with self._measure("database"):
+            if self._database is None:
+                self._database_path = os.path.join(DATA_DIR, "pomito.db")
+                self._database = create_database(self._database_path,
+                                                 self._config)
+            self._database.connect()
 
         # Initialize the plugins
-        self.ui_plugin.initialize()
-        self.task_plugin.initialize()
+        with self._measure("plugin_init"):
+            self.ui_plugin.initialize()
+            self.task_plugin.initialize()
 
         # Initialize the hooks
-        for hook in self._hooks:
-            hook.initialize()
+        with self._measure("hooks"):
+            for hook in self._hooks:
+                hook.initialize()
         return
 
     def run(self):
@@ -179,11 +221,23 @@ class Pomito(object):
 
     def exit(self):
         """Clean up and save any configuration data. Prepare for exiting the application."""
+        if self.task_plugin is not None:
+            self.task_plugin.close()
+        # Run the commands posted so far, e.g. stopping the session when the
+        # window is closed, and dispatch their signals before stopping
+        if self._scheduler.is_alive():
+            if not self.pomodoro_service.flush(self._exit_timeout):
+                logger.warning("Exit: pomodoro commands didn't complete.")
         if self._message_dispatcher.is_alive():
             self._message_dispatcher.stop()
             self._message_dispatcher.join()
+        self._scheduler.stop()
+        if self._scheduler.is_alive():
+            self._scheduler.join()
         for hook in self._hooks:
             hook.close()
+        if self._reporting_database is not None:
+            self._reporting_database.close()
         if self._database is not None:
             self._database.close()
 
@@ -196,12 +250,46 @@ class Pomito(object):
         """
         return self._database
 
+    def get_reporting_db(self):
+        """Get a read-only database for reports, e.g. `pomito.stats`.
+
+        Returns:
+            database peewee.SqliteDatabase object, the injected database if
+            pomito was created with one
+
+        """
+        if self._database_path is None:
+            return self._database
+        if self._reporting_database is None:
+            self._reporting_database = create_reporting_database(
+                self._database_path, self._config)
+        return self._reporting_database
+
+    def get_scheduler(self):
+        """Get the scheduler which runs all timers.
+
+        Returns:
+            scheduler pomodoro.TimerScheduler object
+
+        """
+        return self._scheduler
+
     def get_configuration(self):
         return self._config
 
     def queue_signal(self, message):
         self._message_dispatcher.queue_message(message)
 
+    @contextmanager
+    def _measure(self, phase):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.startup_times[phase] = time.perf_counter() - start
+            logger.debug("Startup: {0} took {1:.1f}ms."
+                         .format(phase, self.startup_times[phase] * 1000))
+
     def _validate_state(self):
         """Validates configuration, plugins."""
         import pomito.plugins
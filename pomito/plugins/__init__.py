@@ -5,43 +5,80 @@ pomito.plugins package.
 Base package for plugins.
 """
 
-__all__ = ['initialize', 'get_plugin']
+import importlib
+import threading
+
+__all__ = ['initialize', 'get_plugin', 'get_plugins', 'PluginFactory']
 
 # TODO Enable plugin discovery, support for drop-in plugins
 # TODO Validate plugins
 # TODO Handle plugins may fail to import due to dependencies
 PLUGINS = {}
 
+_pomodoro_service = None
+_lock = threading.RLock()
+
+
+class PluginFactory(object):
+    """Creates a plugin on first use.
+
+    The plugin module, and the libraries it depends on, are imported only when
+    the plugin is created. E.g. asana and trello clients take hundreds of
+    milliseconds to import.
+    """
+
+    __slots__ = ["module", "name", "kind", "cache"]
+
+    def __init__(self, module, name, kind, cache=None):
+        """Create a plugin factory.
+
+        Args:
+            module (string): module with the plugin class
+            name (string): name of the plugin class
+            kind (string): ``task`` or ``ui``
+            cache (string): configuration section of a remote task plugin.
+                The plugin is wrapped in a `CachedTaskPlugin` if provided.
+        """
+        self.module = module
+        self.name = name
+        self.kind = kind
+        self.cache = cache
+
+    def create(self, pomodoro_service):
+        """Import and create the plugin."""
+        module = importlib.import_module(self.module)
+        plugin = getattr(module, self.name)(pomodoro_service)
+        if self.cache is not None:
+            from .task.cache import CachedTaskPlugin
+            plugin = CachedTaskPlugin(plugin, pomodoro_service, self.cache)
+        return plugin
+
 
 def initialize(pomodoro_service, custom_plugins=[]):
-    """Discover plugins.
+    """Register plugins.
 
-    Every plugin has access to the pomodoro_service layer only.
+    Every plugin has access to the pomodoro_service layer only. Plugins are
+    created on the first `get_plugin` call.
 
     Args:
         pomodoro_service (pomodoro.Pomodoro): The pomodoro service object
     """
     import os
 
-    from .ui import console
-    from .task import asana
-    from .task import rtm
-    from .task import text
-    from .task import trello
-    from .task import nulltask
-
-    global PLUGINS
-    PLUGINS.update({'console': console.Console(pomodoro_service),
-                    'asana': asana.AsanaTask(pomodoro_service),
-                    'rtm': rtm.RTMTask(pomodoro_service),
-                    'text': text.TextTask(pomodoro_service),
-                    'trello': trello.TrelloTask(pomodoro_service),
-                    'nulltask': nulltask.NullTask(pomodoro_service)})
+    global PLUGINS, _pomodoro_service
+    _pomodoro_service = pomodoro_service
+    PLUGINS.update({
+        'console': PluginFactory('pomito.plugins.ui.console', 'Console', 'ui'),
+        'asana': PluginFactory('pomito.plugins.task.asana', 'AsanaTask', 'task',
+                               cache='task.asana'),
+        'rtm': PluginFactory('pomito.plugins.task.rtm', 'RTMTask', 'task'),
+        'text': PluginFactory('pomito.plugins.task.text', 'TextTask', 'task'),
+        'trello': PluginFactory('pomito.plugins.task.trello', 'TrelloTask', 'task',
+                                cache='task.trello'),
+        'nulltask': PluginFactory('pomito.plugins.task.nulltask', 'NullTask', 'task')})
 
     if os.environ.get("POMITO_TEST") is None:
-        from .ui import qtapp
-
-        PLUGINS['qtapp'] = qtapp.QtUI(pomodoro_service)
+        PLUGINS['qtapp'] = PluginFactory('pomito.plugins.ui.qtapp', 'QtUI', 'ui')
     else:
         # CI machines may not have Qt installed, ensure the lookup
         # doesn't fail
@@ -54,9 +91,38 @@ def get_plugin(plugin_name):
     Args:
         plugin_name (string): name of the plugin.
     """
-    return PLUGINS[plugin_name]
+    plugin = PLUGINS[plugin_name]
+    if not isinstance(plugin, PluginFactory):
+        return plugin
+
+    with _lock:
+        # Another thread may have created the plugin
+        plugin = PLUGINS[plugin_name]
+        if isinstance(plugin, PluginFactory):
+            plugin = PLUGINS[plugin_name] = plugin.create(_pomodoro_service)
+    return plugin
 
 
-def get_plugins():
-    """Get all plugins."""
-    return PLUGINS
+def get_plugins(kind=None):
+    """Get all plugins.
+
+    Args:
+        kind (string): ``task`` or ``ui`` to get only plugins of a kind. Other
+            plugins are not created.
+    """
+    names = [k for k, v in list(PLUGINS.items())
+             if kind is None or _get_kind(v) == kind]
+    return {k: get_plugin(k) for k in names}
+
+
+def _get_kind(plugin):
+    from .task import TaskPlugin
+    from .ui import UIPlugin
+
+    if isinstance(plugin, PluginFactory):
+        return plugin.kind
+    if isinstance(plugin, TaskPlugin):
+        return 'task'
+    if isinstance(plugin, UIPlugin):
+        return 'ui'
+    return None
@@ -3,6 +3,8 @@
 
 import abc
 
+from pomito.task import TaskIndex
+
 class TaskPlugin(metaclass=abc.ABCMeta):
     """Defines the contract for all Task plugins."""
 
@@ -16,6 +18,12 @@ class TaskPlugin(metaclass=abc.ABCMeta):
         Called by pomito on start up."""
         pass
 
+    def close(self):
+        """Releases resources of the Task Plugin, e.g. background threads.
+
+        Called by pomito on exit."""
+        pass
+
     @abc.abstractmethod
     def get_tasks(self):
         """Gets list of all tasks from the plugin.
@@ -32,9 +40,7 @@ class TaskPlugin(metaclass=abc.ABCMeta):
         if task_filter is None or task_filter == "*":
             yield from self.get_tasks()
         else:
-            for task in self.get_tasks():
-                if task_filter in str(task):
-                    yield task
+            yield from self._get_task_index().search(task_filter)
 
     def get_task_by_id(self, task_id):
         """Gets a task with matching task_id-ish.
@@ -43,11 +49,17 @@ class TaskPlugin(metaclass=abc.ABCMeta):
             task_id: string. substring in Task id matched from left.
             Like commit-ish in case of git.
         """
-        tasks = []
-        for tsk in self.get_tasks():
-            if str(tsk.uid).startswith(str(task_id)):
-                tasks.append(tsk)
+        tasks = self._get_task_index().find_by_uid(str(task_id))
         if len(tasks) > 1:
             raise ValueError("Found {0} tasks matching id {1}."\
                              .format(len(tasks), task_id))
         return None if len(tasks) == 0 else tasks[0]
+
+    def _get_task_index(self):
+        """Gets the index of tasks, updated if the tasks changed."""
+        # Plugins may not call the base constructor
+        index = self.__dict__.get("_task_index")
+        if index is None:
+            index = self._task_index = TaskIndex()
+        index.update(self.get_tasks())
+        return index
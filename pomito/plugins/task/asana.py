@@ -2,6 +2,9 @@
 """Task plugin for http://www.asana.com."""
 
 import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 import asana
 
@@ -12,6 +15,8 @@ __all__ = ['AsanaTask']
 
 logger = logging.getLogger('pomito.plugins.task.asana')
 
+_DONE = object()
+
 
 def _create_asana_api(api_key, debug=False):
     """Create default AsanaAPI instance."""
@@ -19,7 +24,13 @@ def _create_asana_api(api_key, debug=False):
 
 
 class AsanaTask(task.TaskPlugin):
-    """Asana task plugin for pomito."""
+    """Asana task plugin for pomito.
+
+    Tasks of all workspaces are fetched concurrently, with up to
+    `max_workers` (configurable in `[task.asana]`) requests in flight.
+    """
+
+    default_max_workers = 8
 
     def __init__(self, pomodoro_service, get_asana_api=_create_asana_api):
         """Create an instance of AsanaTask."""
@@ -29,17 +40,27 @@ class AsanaTask(task.TaskPlugin):
         self._pomodoro_service = pomodoro_service
 
         self.asana_api = None
+        self.max_workers = self.default_max_workers
 
     def initialize(self):
         """Initialize the asana task plugin."""
         try:
+            max_workers = self._pomodoro_service.get_config("task.asana",
+                                                            "max_workers")
+            if max_workers is not None:
+                self.max_workers = max(1, int(max_workers))
+
             api_key = self._pomodoro_service.get_config("task.asana", "api_key")
             self.asana_api = self._get_asana_api(api_key)
         except Exception as ex:
             logger.error("Error initializing plugin: {0}".format(ex))
 
     def get_tasks(self):
-        """Get all incomplete tasks assigned to the user."""
+        """Get all incomplete tasks assigned to the user.
+
+        Workspaces are fetched in parallel; tasks are yielded as they arrive,
+        so the order across workspaces is not stable.
+        """
         # TODO support for sections, tags
         try:
             def create_task(asana_task):
@@ -51,10 +72,51 @@ class AsanaTask(task.TaskPlugin):
                             description=asana_task['name'])
 
             me = self.asana_api.users.me()
-            for w in me['workspaces']:
-                yield from map(create_task,
-                               self.asana_api.tasks.find_all({'assignee': "me",
-                                                              'workspace': w['id'],
-                                                              'completed_since': "now"}))
+            workspaces = list(me['workspaces'])
+            yield from map(create_task, self._fetch_all(workspaces))
         except AttributeError as attrib_error:
             logger.error("Error getting tasklist: {0}".format(attrib_error))
+
+    def _fetch_all(self, workspaces):
+        """Fetch tasks of `workspaces` on a thread pool.
+
+        Pages of a workspace are fetched in sequence since the next page
+        offset is only known from the previous page.
+        """
+        if len(workspaces) == 0:
+            return
+
+        results = queue.Queue()
+        cancelled = threading.Event()
+
+        def fetch(workspace):
+            try:
+                for t in self.asana_api.tasks.find_all({'assignee': "me",
+                                                        'workspace': workspace['id'],
+                                                        'completed_since': "now"}):
+                    if cancelled.is_set():
+                        break
+                    results.put(t)
+            finally:
+                results.put(_DONE)
+
+        workers = min(self.max_workers, len(workspaces))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(fetch, w) for w in workspaces]
+            try:
+                pending = len(futures)
+                while pending > 0:
+                    item = results.get()
+                    if item is _DONE:
+                        pending -= 1
+                    else:
+                        yield item
+            finally:
+                # Caller may stop reading early, skip remaining fetches
+                cancelled.set()
+                for f in futures:
+                    f.cancel()
+
+        for f in futures:
+            if not f.cancelled():
+                f.result()
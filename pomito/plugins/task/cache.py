@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""Local cache for remote task plugins.
+
+Remote plugins, e.g. asana and trello, fetch tasks over the network on every
+`get_tasks`. `CachedTaskPlugin` keeps the tasks in `pomito.db` and serves all
+reads from memory. Stale tasks are refreshed on a background thread.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from peewee import (Model, Proxy, CharField, DateTimeField, IntegerField,
+                    TextField, chunked)
+
+from pomito.plugins import task
+from pomito.task import Task
+
+__all__ = ['CachedTaskPlugin', 'TaskCacheModel', 'TaskCacheStateModel']
+
+database_proxy = Proxy()
+logger = logging.getLogger('pomito.plugins.task.cache')
+
+
+class CachedTaskPlugin(task.TaskPlugin):
+    """Serves tasks of a plugin from a local cache.
+
+    Tasks are read from the cache table on `initialize`. Reads are served from
+    memory; if the cache is older than its time to live, a refresh is started
+    on a background thread and the cached tasks are returned meanwhile. The
+    first read of an empty cache waits for the refresh.
+
+    Time to live (in seconds) is read from `cache_ttl` in the plugin section
+    of the configuration, e.g. `[task.asana]`.
+    """
+
+    default_ttl = 15 * 60
+    # Seconds to wait for a running refresh on close
+    close_timeout = 10
+
+    def __init__(self, plugin, pomodoro_service, section):
+        """Create an instance of the cache.
+
+        Args:
+            plugin: `TaskPlugin` to cache
+            pomodoro_service: pomodoro service instance
+            section: configuration section of the plugin, used as the cache key
+        """
+        self._plugin = plugin
+        self._pomodoro_service = pomodoro_service
+        self._section = section
+        self._ttl = timedelta(seconds=self.default_ttl)
+
+        self._tasks = []
+        self._fetched_at = None
+        self._etag = None
+        self._refresh_lock = threading.Lock()
+        self._refresh_thread = None
+        self._thread_lock = threading.Lock()
+        self._closed = False
+
+    @property
+    def plugin(self):
+        """Get the cached plugin."""
+        return self._plugin
+
+    def initialize(self):
+        """Initialize the plugin and load cached tasks."""
+        self._plugin.initialize()
+        try:
+            ttl = self._pomodoro_service.get_config(self._section, "cache_ttl")
+            if ttl is not None:
+                self._ttl = timedelta(seconds=float(ttl))
+
+            database_proxy.initialize(self._pomodoro_service.get_db())
+            TaskCacheModel.create_table(True)
+            TaskCacheStateModel.create_table(True)
+            self._load()
+        except Exception as e:
+            logger.error("Error loading task cache: {0}".format(e))
+
+        if self._fetched_at is not None and self.is_stale():
+            self.refresh_async()
+
+    def close(self):
+        """Wait for a running refresh and close the cached plugin.
+
+        No refresh is started after close, and a refresh still running after
+        `close_timeout` seconds doesn't update the cache table.
+        """
+        with self._thread_lock:
+            self._closed = True
+            thread = self._refresh_thread
+        if thread is not None:
+            thread.join(self.close_timeout)
+        self._plugin.close()
+
+    def get_tasks(self):
+        """Get cached tasks.
+
+        Tasks are fetched from the plugin if the cache is empty.
+        """
+        if self._fetched_at is None:
+            self.refresh()
+        tasks = self._tasks
+        if self.is_stale():
+            self.refresh_async()
+        return tasks
+
+    def is_stale(self):
+        """Check if the cache is older than its time to live."""
+        return self._fetched_at is None or\
+            datetime.now() - self._fetched_at > self._ttl
+
+    def refresh(self):
+        """Fetch tasks from the plugin and update the cache.
+
+        Returns:
+            True if the tasks changed since the last fetch.
+        """
+        with self._refresh_lock:
+            fetched_at = datetime.now()
+            tasks = list(self._plugin.get_tasks())
+            etag = _get_etag(tasks)
+
+            changed = etag != self._etag
+            if changed:
+                self._tasks = tasks
+            self._fetched_at = fetched_at
+            self._etag = etag
+            try:
+                if not self._closed:
+                    self._save(tasks if changed else None)
+            except Exception as e:
+                logger.error("Error saving task cache: {0}".format(e))
+            logger.debug("Refreshed {0} tasks for {1}, changed = {2}."
+                         .format(len(tasks), self._section, changed))
+            return changed
+
+    def refresh_async(self):
+        """Refresh the cache on a background thread.
+
+        Returns:
+            The refresh thread. No new refresh is started while one runs,
+            None if the cache is closed.
+        """
+        with self._thread_lock:
+            if self._closed:
+                return None
+            thread = self._refresh_thread
+            if thread is None or not thread.is_alive():
+                thread = threading.Thread(target=self._refresh_in_background,
+                                          name="TaskCacheRefresh", daemon=True)
+                self._refresh_thread = thread
+                thread.start()
+            return thread
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.error("Error refreshing tasks for {0}: {1}"
+                         .format(self._section, e))
+        finally:
+            database_proxy.close()
+
+    def _load(self):
+        state = TaskCacheStateModel.get_or_none(
+            TaskCacheStateModel.plugin == self._section)
+        if state is None:
+            return
+
+        query = TaskCacheModel.select()\
+            .where(TaskCacheModel.plugin == self._section)\
+            .order_by(TaskCacheModel.position)
+        self._tasks = [Task(t.uid, t.estimate, t.actual, json.loads(t.tags),
+                            t.description) for t in query]
+        self._fetched_at = state.fetched_at
+        self._etag = state.etag
+
+    def _save(self, tasks):
+        database = self._pomodoro_service.get_db()
+        with database.atomic():
+            if tasks is not None:
+                TaskCacheModel.delete()\
+                    .where(TaskCacheModel.plugin == self._section).execute()
+                rows = ({"plugin": self._section,
+                         "position": i,
+                         "uid": str(t.uid),
+                         "estimate": t.estimate,
+                         "actual": t.actual,
+                         "tags": json.dumps(t.tags, default=str),
+                         "description": t.description}
+                        for i, t in enumerate(tasks))
+                for batch in chunked(rows, 500):
+                    TaskCacheModel.insert_many(batch).execute()
+
+            TaskCacheStateModel.insert(plugin=self._section,
+                                       fetched_at=self._fetched_at,
+                                       etag=self._etag)\
+                .on_conflict_replace().execute()
+
+
+class TaskCacheModel(Model):
+    """A cached task of a plugin."""
+
+    plugin = CharField()
+    position = IntegerField()
+    uid = CharField()
+    estimate = IntegerField()
+    actual = IntegerField()
+    tags = TextField()
+    description = TextField()
+
+    class Meta:
+        database = database_proxy
+        indexes = (
+            (("plugin", "position"), True),
+        )
+
+
+class TaskCacheStateModel(Model):
+    """Validators for the cached tasks of a plugin.
+
+    Columns:
+        plugin: configuration section of the plugin
+        fetched_at: time the tasks were last fetched
+        etag: hash of the fetched tasks, unchanged tasks are not rewritten
+    """
+
+    plugin = CharField(unique=True)
+    fetched_at = DateTimeField()
+    etag = CharField()
+
+    class Meta:
+        database = database_proxy
+
+
+def _get_etag(tasks):
+    # Plugins may fetch in parallel, ignore the order of tasks
+    digest = hashlib.sha1()
+    for t in sorted(str(t) for t in tasks):
+        digest.update(t.encode("utf-8"))
+        digest.update(b"\n")
+    return digest.hexdigest()
@@ -1,51 +1,680 @@
 # -*- coding: utf-8 -*-
-"""A text file based task plugin implementation."""
+"""A text file based task plugin implementation.
 
+Every line of the task file is a task, see docs/sample_todo.txt:
+
+    I:<id> | E:<estimate> | A:<actual> | C:<completed> | T:<tags> | D:<desc>
+
+`C` is optional, lines starting with `--` and blank lines are skipped.
+Malformed lines are logged with their line number and skipped.
+
+Changes to estimates and actuals are appended to a journal next to the task
+file, `<file>.journal`, and replayed on load. The task file is rewritten with
+the changes once the journal has more than `journal_size` entries.
+
+The task file is watched for changes, e.g. edits in an editor, and the changed
+lines are read again, see `TextTask.reload`. Set `watch` to `false` to read the
+file only on start.
+
+Parsed tasks are saved to a snapshot in the data directory, and loaded instead
+of parsing the task file on start if it did not change, see `TaskSnapshot`.
+Set `snapshot` to `false` to always parse the task file.
+"""
+
+import hashlib
 import logging
+import marshal
+import mmap
+import os
+import re
+import tempfile
+import threading
+import zlib
+from array import array
+from itertools import chain
 
 from pomito.plugins import task
-from pomito.task import Task
+from pomito.plugins.task.watch import FileWatcher
+from pomito.pomodoro import TimerChange
+from pomito.task import StringColumn, Task, TaskStore
 from io import open
 
 
-__all__ = ['TextTask']
+__all__ = ['TextTask', 'TaskJournal', 'TaskSnapshot', 'parse_tasks', 'read_tasks']
 logger = logging.getLogger('pomito.plugins.task.text')
 
+# Only <desc> can contain `|`, it is the rest of the line
+_TASK_PATTERN = re.compile(r"\s*I:([^|]*)\|\s*E:\s*(\d+)\s*\|\s*A:\s*(\d+)\s*\|"
+                           r"(?:\s*C:\s*\d*\s*\|)?\s*T:([^|]*)\|\s*D:(.*)")
+# First line of a compacted task file, the last journal entry in the file
+_JOURNAL_MARK = re.compile(r"--\s*journal:\s*(\d+)")
+# Task file is compared with its last read in blocks, see `_get_digest`
+_BLOCK_SIZE = 64 * 1024
+# Journal changes of fewer tasks are applied by a lookup of each task instead
+# of indexing all tasks
+_INDEX_LOOKUPS = 16
+# Configuration values which turn off an option
+_OFF = ("false", "no", "0")
+
 
 class TextTask(task.TaskPlugin):
     """Implements a plugin to read/write Tasks from a text file.
     See doc/sample_tasks.txt for details of task file.
+
+    Tasks are kept in a `TaskStore`; a `Task` is created on first access.
+    Completed sessions add to the actual pomodoros of their task, see
+    `update_actual`. Changes to the task file are read by `reload`.
     """
 
+    default_journal_size = 1000
+
     def __init__(self, pomodoro_service):
         self._pomodoro_service = pomodoro_service
-        self.tasks = []
+        self.tasks = TaskStore()
+        self._file_path = None
+        self._journal = None
+        self._journal_size = self.default_journal_size
+        # Changes in the journal since the task file was written, by uid
+        self._changes = {}
+        # Digest of the task file as last read, and for every line of it, 1
+        # if the line is a task
+        self._digest = _get_digest(b"")
+        self._task_lines = bytearray()
+        self._watcher = None
+        self._lock = threading.RLock()
 
     def initialize(self):
         # Read plugin configuration
         try:
             file_path = self._pomodoro_service.get_config("task.text", "file")
-            with open(file_path, 'r') as f:
-                for t in f.readlines():
-                    if not t.startswith("--"):
-                        task_tuple = self.parse_task(t)
-                        self.tasks.append(Task(*task_tuple))
+            journal_size = self._pomodoro_service.get_config("task.text",
+                                                             "journal_size")
+            if journal_size is not None:
+                self._journal_size = int(journal_size)
+            watch = self._pomodoro_service.get_config("task.text", "watch")
+            use_snapshot = self._pomodoro_service.get_config("task.text", "snapshot")
+
+            snapshot = loaded = None
+            if str(use_snapshot).lower() not in _OFF:
+                snapshot = TaskSnapshot(os.path.join(
+                    self._pomodoro_service.get_data_dir(), "snapshots"), file_path)
+                loaded = snapshot.load()
+            if loaded is not None:
+                tasks, digest, task_lines, since = loaded
+            else:
+                stat = os.stat(file_path)
+                tasks, digest, task_lines, since = _read_file(file_path)
+                if snapshot is not None:
+                    try:
+                        snapshot.save(stat, tasks, digest, task_lines, since)
+                    except Exception as e:
+                        logger.warning("Error saving snapshot of {0}: {1}"
+                                       .format(file_path, e))
+
+            journal = TaskJournal(file_path + ".journal")
+            self._changes = journal.replay(since)
+            _apply_changes(tasks, self._changes)
+            self.tasks = tasks
+            self._file_path = file_path
+            self._journal = journal
+            self._digest, self._task_lines = digest, task_lines
+            if journal.size > self._journal_size:
+                self.compact()
+            if str(watch).lower() not in _OFF:
+                self._watcher = FileWatcher(file_path, self.reload).start()
         except Exception as e:
             logger.debug(("Error initializing plugin: {0}".format(e)))
+        self._pomodoro_service.signal_session_stopped\
+            .connect(self._on_session_stopped)
         return
 
+    def close(self):
+        """Stop watching the task file and updating tasks for sessions."""
+        self._pomodoro_service.signal_session_stopped\
+            .disconnect(self._on_session_stopped)
+        if self._watcher is not None:
+            self._watcher.stop()
+            self._watcher = None
+
     def get_tasks(self):
         return self.tasks
 
+    def reload(self):
+        """Read the changes to the task file since it was last read.
+
+        The file is compared with the last read by the hashes of its blocks,
+        only the lines from the first to the last changed block are parsed,
+        e.g. a few hundred lines for an edit of one line. Journal
+        changes are applied to the parsed tasks. Unchanged tasks keep their
+        `Task`, changes are sent with `signal_tasks_changed`.
+
+        Returns:
+            Tuple of lists `(added, removed, changed)`, see
+            `Pomodoro.notify_tasks_changed`.
+        """
+        with self._lock:
+            if self._file_path is None:
+                return [], [], []
+            with open(self._file_path, 'rb') as f:
+                data = f.read()
+            digest = _get_digest(data)
+            start, stop = _get_changed_range(self._digest, digest, data)
+
+            # Lines from `stop` are the same as the last lines of the last read
+            text = data[start:stop].decode('utf-8')
+            lines = text.split("\n")
+            if len(text) == 0 or text.endswith("\n"):
+                lines.pop()
+            start_line = data.count(b"\n", 0, start)
+            end_lines = data.count(b"\n", stop)
+            if stop < len(data) and not data.endswith(b"\n"):
+                end_lines += 1
+            previous_stop_line = len(self._task_lines) - end_lines
+
+            tasks = TaskStore()
+            task_lines = bytearray(len(lines))
+            for number, fields in _parse_lines(lines, self._file_path, start_line + 1):
+                tasks.append(*fields)
+                task_lines[number - start_line - 1] = 1
+            _apply_changes(tasks, self._changes, warn=False)
+
+            first = self._task_lines.count(1, 0, start_line)
+            last = first + self._task_lines.count(1, start_line, previous_stop_line)
+            added, removed, changed = _match_tasks(self.tasks[first:last], tasks)
+            self.tasks = self.tasks.splice(first, last, tasks)
+            self._digest = digest
+            self._task_lines[start_line:previous_stop_line] = task_lines
+
+        logger.debug("Reloaded lines {0} to {1} of {2}: {3} added, {4} removed, "
+                     "{5} changed.".format(start_line + 1, start_line + len(lines),
+                                           self._file_path, len(added),
+                                           len(removed), len(changed)))
+        if added or removed or changed:
+            self._pomodoro_service.notify_tasks_changed(added, removed, changed)
+        return added, removed, changed
+
+    def update_actual(self, task):
+        """Add a pomodoro to the actual pomodoros of a task.
+
+        The change is written to the journal.
+        """
+        with self._lock:
+            task.update_actual()
+            self._record(str(task.uid), 0, 1)
+
+    def update_estimate(self, task, estimate):
+        """Update the estimated pomodoros of a task.
+
+        The change is written to the journal.
+        """
+        with self._lock:
+            change = int(estimate) - task.estimate
+            task.update_estimate(estimate)
+            self._record(str(task.uid), change, 0)
+
+    def compact(self):
+        """Write the changes in the journal to the task file.
+
+        The task file is written to a temporary file and renamed over the
+        original. Its first line records the last journal entry written, the
+        journal is cleared after. If the journal is not cleared, e.g. pomito
+        exits, entries up to the recorded one are skipped on replay.
+
+        Changes to the task file are read before, see `reload`.
+        """
+        with self._lock:
+            if self._journal is None or self._journal.size == 0:
+                return
+            self.reload()
+            path = self._file_path
+            directory = os.path.dirname(os.path.abspath(path))
+            fd, temp_path = tempfile.mkstemp(prefix=".todo-", dir=directory)
+            try:
+                with open(fd, 'w', encoding='utf-8') as out:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        out.write("-- journal: {0}\n".format(self._journal.sequence))
+                        changes = dict(self._changes)
+                        marked = False
+                        for number, line in enumerate(f):
+                            if number == 0 and _JOURNAL_MARK.match(line):
+                                marked = True
+                                continue
+                            out.write(_update_line(line, changes))
+                            if len(changes) == 0:
+                                out.writelines(f)
+                    out.flush()
+                    os.fsync(out.fileno())
+                os.chmod(temp_path, os.stat(path).st_mode & 0o7777)
+                os.replace(temp_path, path)
+            except BaseException:
+                os.remove(temp_path)
+                raise
+            self._journal.clear()
+            self._changes = {}
+            # Only estimates and actuals changed, the file need not be reloaded
+            self._digest = _get_file_digest(path)
+            if not marked:
+                self._task_lines.insert(0, 0)
+            logger.debug("Compacted task journal into {0}.".format(path))
+
+    def _record(self, uid, estimate, actual):
+        if self._journal is None:
+            return
+        self._journal.append(uid, estimate, actual)
+        change = self._changes.setdefault(uid, [0, 0])
+        change[0] += estimate
+        change[1] += actual
+        if self._journal.size > self._journal_size:
+            self.compact()
+
+    def _on_session_stopped(self, *args, **kwargs):
+        task = kwargs.get("task")
+        if kwargs.get("reason") == TimerChange.COMPLETE and isinstance(task, Task):
+            try:
+                self.update_actual(task)
+            except Exception as e:
+                logger.error("Error updating task {0}: {1}".format(task.uid, e))
+
     def parse_task(self, task):
         return TextTask._parse_task(task)
 
     @staticmethod
     def _parse_task(task):
-        import re
+        """Parse a line of the task file.
+
+        Returns:
+            Tuple of `(uid, estimate, actual, tags, description)`, or None if
+            the line is not a task.
+        """
+        match = _TASK_PATTERN.match(task)
+        if match is None:
+            return None
+        uid, estimate, actual, tags, description = match.groups()
+        return (uid.strip() or None, int(estimate), int(actual), tags.strip(),
+                description.strip())
+
+
+def parse_tasks(lines, source="<tasks>"):
+    """Parse tasks from lines of a task file.
+
+    Args:
+        lines: iterable of lines
+        source: name of the file for the warnings of malformed lines
+
+    Returns:
+        Generator of `Task`.
+    """
+    for _, fields in _parse_lines(lines, source):
+        yield Task(*fields)
+
+
+def read_tasks(file_path):
+    """Read tasks from a task file.
+
+    Returns:
+        Generator of `Task`, the file is read as the tasks are consumed.
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        yield from parse_tasks(f, file_path)
+
+
+class TaskJournal(object):
+    """Append-only log of changes to the estimate and actual of tasks.
+
+    An entry is a line `<sequence> <estimate change> <actual change> <uid>`.
+    Entries are flushed on append. A partly written last entry, e.g. if the
+    process is killed, is skipped on replay.
+    """
+
+    def __init__(self, path):
+        """Create a journal at `path`, the file is created on first append."""
+        self.path = path
+        # Sequence of the last entry, entries in the file
+        self.sequence = 0
+        self.size = 0
+
+    def replay(self, since=0):
+        """Read the journal.
+
+        Args:
+            since: sequence of the last entry already applied
+
+        Returns:
+            dict of uid to `[estimate change, actual change]` of the entries
+            after `since`.
+        """
+        changes = {}
+        self.sequence = since
+        self.size = 0
+        if not os.path.exists(self.path):
+            return changes
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for number, line in enumerate(f, 1):
+                try:
+                    if not line.endswith("\n"):
+                        raise ValueError("incomplete entry")
+                    sequence, estimate, actual, uid = line[:-1].split(" ", 3)
+                    sequence, estimate, actual = int(sequence), int(estimate), int(actual)
+                except ValueError:
+                    logger.warning("Skipping malformed journal entry at {0}:{1}"
+                                   .format(self.path, number))
+                    continue
+                self.size += 1
+                self.sequence = max(self.sequence, sequence)
+                if sequence > since:
+                    change = changes.setdefault(uid, [0, 0])
+                    change[0] += estimate
+                    change[1] += actual
+        return changes
+
+    def append(self, uid, estimate, actual):
+        """Add an entry for a change of the estimate and actual of a task."""
+        self.sequence += 1
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write("{0} {1} {2} {3}\n".format(self.sequence, estimate, actual, uid))
+        self.size += 1
+
+    def clear(self):
+        """Remove all entries."""
+        with open(self.path, 'w', encoding='utf-8'):
+            pass
+        self.size = 0
+
+
+class TaskSnapshot(object):
+    """Parsed tasks of a task file, to load the tasks without parsing.
+
+    A snapshot is a file in `directory` named by the hash of the path of the
+    task file. It has a header written with `marshal`, followed by the
+    columns of the tasks as raw sections. Sections are read from a memory
+    map; strings are loaded as `StringColumn`, i.e. not split up.
 
-        # Sample task format: I:<id> | E:<estimate> | A:<actual> | T:<tags> | D:<desc>
-        # Only <desc> can contain spaces. <tags> can be comma separated
-        p = re.compile("[IEATD]:([\w,\s]*)\|?")
-        task_tuple = tuple(map(lambda x: x.groups()[-1].strip('\n '), p.finditer(task)))
-        return task_tuple
+    A snapshot is loaded only if the size, modification time and contents
+    of the task file are the same as on save. Contents are compared by the
+    digest of the task file, see `_get_digest`.
+    """
+
+    version = 1
+
+    def __init__(self, directory, file_path):
+        """Create a snapshot for `file_path`, the file is created on save."""
+        self.file_path = os.path.abspath(file_path)
+        name = hashlib.sha1(self.file_path.encode("utf-8")).hexdigest()
+        self.path = os.path.join(directory, name + ".snapshot")
+
+    def load(self):
+        """Load the snapshot.
+
+        Returns:
+            Tuple of `(tasks, digest, task lines, journal sequence)`, see
+            `save`. None if the snapshot is missing or the task file changed.
+        """
+        try:
+            stat = os.stat(self.file_path)
+            with open(self.path, 'rb') as f:
+                version, file_path, size, mtime, digest, since, sizes = marshal.load(f)
+                if (version, file_path, size, mtime) != \
+                        (self.version, self.file_path, stat.st_size, stat.st_mtime_ns):
+                    return None
+                if _get_file_digest(self.file_path, tail=False)[1] != digest[1]:
+                    return None
+                start = f.tell()
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    sections = _read_sections(data, start, sizes)
+        except (OSError, EOFError, ValueError, TypeError) as e:
+            logger.debug("Skipping snapshot {0}: {1}".format(self.path, e))
+            return None
+
+        (uids, uid_offsets, estimates, actuals, tags, tag_offsets, descriptions,
+         description_offsets, task_lines) = sections
+        tasks = TaskStore.from_columns(StringColumn(uids, uid_offsets, None),
+                                       estimates, actuals,
+                                       StringColumn(tags, tag_offsets),
+                                       StringColumn(descriptions, description_offsets),
+                                       copy=False)
+        return tasks, digest, task_lines, since
+
+    def save(self, stat, tasks, digest, task_lines, since):
+        """Save a snapshot of the parsed tasks of the task file.
+
+        Args:
+            stat: `os.stat` of the task file before it was read
+            tasks: `TaskStore` of the parsed tasks, without journal changes
+            digest: digest of the task file, see `_get_digest`
+            task_lines: `bytearray`, 1 for every line which is a task
+            since: last journal entry written to the task file
+        """
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        uids = StringColumn.pack(tasks.uids, "I", None)
+        tags = StringColumn.pack(tasks.tags, "I")
+        descriptions = StringColumn.pack(tasks.descriptions, "I")
+        sections = [uids.text.encode('utf-8'), uids.offsets.tobytes(),
+                    array('i', tasks.estimates).tobytes(),
+                    array('i', tasks.actuals).tobytes(),
+                    tags.text.encode('utf-8'), tags.offsets.tobytes(),
+                    descriptions.text.encode('utf-8'), descriptions.offsets.tobytes(),
+                    bytes(task_lines)]
+        header = (self.version, self.file_path, stat.st_size, stat.st_mtime_ns,
+                  digest, since, [len(s) for s in sections])
+        fd, temp_path = tempfile.mkstemp(prefix=".snapshot-", dir=directory)
+        try:
+            with open(fd, 'wb') as f:
+                marshal.dump(header, f)
+                f.writelines(sections)
+            os.replace(temp_path, self.path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+
+# Sections of a snapshot: str, typecode of an array, or bytearray
+_SECTIONS = (str, 'I', 'i', 'i', str, 'I', str, 'I', bytearray)
+
+
+def _read_sections(data, start, sizes):
+    if len(sizes) != len(_SECTIONS) or start + sum(sizes) != len(data):
+        raise ValueError("Snapshot is truncated.")
+    sections = []
+    with memoryview(data) as view:
+        for kind, size in zip(_SECTIONS, sizes):
+            with view[start:start + size] as section:
+                if kind is str:
+                    sections.append(str(section, 'utf-8'))
+                elif kind is bytearray:
+                    sections.append(bytearray(section))
+                else:
+                    values = array(kind)
+                    values.frombytes(section)
+                    sections.append(values)
+            start += size
+    return sections
+
+
+def _read_file(file_path):
+    """Parse a task file.
+
+    Returns:
+        Tuple of `(tasks, digest, task lines, journal sequence)`; `task lines`
+        has a 1 for every line which is a task.
+    """
+    # Changes while the file is read are found by the next reload
+    digest = _get_file_digest(file_path)
+    tasks = TaskStore()
+    task_lines = bytearray()
+    with open(file_path, 'rb') as f:
+        lines = _read_lines(f, task_lines)
+        first = next(lines, "")
+        mark = _JOURNAL_MARK.match(first)
+        for number, fields in _parse_lines(chain([first], lines), file_path):
+            tasks.append(*fields)
+            task_lines[number - 1] = 1
+    return tasks, digest, task_lines, int(mark.group(1)) if mark else 0
+
+
+def _get_uid(uid, description):
+    # Tasks without id are identified by the md5 of description, see Task.uid
+    return uid if uid is not None else Task(None, 0, 0, None, description).uid
+
+
+def _apply_changes(tasks, changes, warn=True):
+    """Apply journal changes to the columns of a new `TaskStore`.
+
+    Changes of tasks which are not in `tasks` are logged if `warn`.
+    """
+    if len(changes) == 0:
+        return
+    positions = {}
+    if len(changes) <= _INDEX_LOOKUPS:
+        for uid in changes:
+            try:
+                positions[uid] = tasks.uids.index(uid)
+            except ValueError:
+                pass
+    else:
+        for i, uid in enumerate(tasks.uids):
+            if uid is not None:
+                positions.setdefault(uid, i)
+    if any(uid not in positions for uid in changes):
+        for i, uid in enumerate(tasks.uids):
+            if uid is None:
+                positions.setdefault(_get_uid(uid, tasks.descriptions[i]), i)
+
+    for uid, (estimate, actual) in changes.items():
+        i = positions.get(uid)
+        if i is None:
+            if not warn:
+                continue
+            logger.warning("Skipping journal changes of unknown task {0}.".format(uid))
+            continue
+        tasks.estimates[i] += estimate
+        tasks.actuals[i] += actual
+
+
+def _match_tasks(tasks, store):
+    """Match the tasks of `store` with the `tasks` they replace.
+
+    Tasks are matched by uid, in order for tasks with the same uid. Unchanged
+    tasks are reused in `store`.
+
+    Returns:
+        Tuple of lists `(added, removed, changed)`.
+    """
+    previous = {}
+    for t in tasks:
+        previous.setdefault(t.uid, []).append(t)
+    added, changed = [], []
+    for i, uid in enumerate(store.uids):
+        candidates = previous.get(_get_uid(uid, store.descriptions[i]))
+        if not candidates:
+            added.append(store[i])
+            continue
+        old = candidates.pop(0)
+        if (old.estimate, old.actual, old.tags, old.description) == \
+                (store.estimates[i], store.actuals[i], store.tags[i],
+                 store.descriptions[i]):
+            store[i] = old
+        else:
+            changed.append((old, store[i]))
+    removed = [t for c in previous.values() for t in c]
+    return added, removed, changed
+
+
+def _get_digest(data, tail=True):
+    """Get the digest of the contents of a file, to find changed blocks.
+
+    Returns:
+        Tuple of `(size, head, tail)`; `head` and `tail` are CRC-32 of the
+        blocks of `data` from its start and from its end. An edit changes the
+        blocks around it, blocks before it are the same in `head` and blocks
+        after it in `tail`. `tail` is None if not `tail`.
+    """
+    size = len(data)
+    blocks = range(0, size, _BLOCK_SIZE)
+    tails = None
+    with memoryview(data) as view:
+        head = [zlib.crc32(view[i:i + _BLOCK_SIZE]) for i in blocks]
+        if tail:
+            tails = [zlib.crc32(view[max(size - i - _BLOCK_SIZE, 0):size - i])
+                     for i in blocks]
+    return size, head, tails
+
+
+def _get_file_digest(path, tail=True):
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return _get_digest(b"", tail)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return _get_digest(data, tail)
+
+
+def _get_changed_range(previous, digest, data):
+    """Get the lines of `data` changed since the `previous` digest.
+
+    Returns:
+        Tuple of `(start, stop)` offsets in `data`, at the start of a line.
+        Lines after `stop` are the same as the last lines of the previous
+        data.
+    """
+    (previous_size, previous_head, previous_tail), (size, head, tail) = previous, digest
+    same = min(previous_size, size)
+    prefix = min(_count_equal(previous_head, head) * _BLOCK_SIZE, same)
+    suffix = min(_count_equal(previous_tail, tail) * _BLOCK_SIZE, same - prefix)
+    start = data.rfind(b"\n", 0, prefix) + 1
+    # Same line breaks in both from the first in the suffix
+    stop = data.find(b"\n", size - suffix) + 1 if suffix > 0 else 0
+    return start, stop if stop > 0 else size
+
+
+def _count_equal(a, b):
+    count = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        count += 1
+    return count
+
+
+def _update_line(line, changes):
+    """Get `line` with the changes of its task, the change is consumed."""
+    # Most lines are unchanged, check the id before matching the line
+    head = line.partition("|")[0].strip()
+    if head.startswith("I:") and head[2:].strip() and head[2:].strip() not in changes:
+        return line
+    match = _TASK_PATTERN.match(line)
+    if match is None:
+        return line
+    uid = _get_uid(match.group(1).strip() or None, match.group(5).strip())
+    change = changes.pop(uid, None)
+    if change is None:
+        return line
+    estimate = int(match.group(2)) + change[0]
+    actual = int(match.group(3)) + change[1]
+    return "".join((line[:match.start(2)], str(estimate),
+                    line[match.end(2):match.start(3)], str(actual),
+                    line[match.end(3):]))
+
+
+def _read_lines(f, task_lines):
+    """Decode the lines of a binary file, adding a 0 to `task_lines` for
+    every line."""
+    for line in f:
+        task_lines.append(0)
+        yield line.decode('utf-8')
+
+
+def _parse_lines(lines, source, start=1):
+    """Get `(line number, task fields)` for the tasks in `lines`.
+
+    Lines are numbered from `start`.
+    """
+    parse = TextTask._parse_task
+    for number, line in enumerate(lines, start):
+        if line.startswith("--") or line.isspace() or len(line) == 0:
+            continue
+        fields = parse(line)
+        if fields is None:
+            logger.warning("Skipping malformed task at {0}:{1}: {2}"
+                           .format(source, number, line.strip()[:80]))
+            continue
+        yield number, fields
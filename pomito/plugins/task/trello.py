@@ -2,8 +2,9 @@
 """Trello plugin for pomito."""
 
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from trello import TrelloClient
+from trello import Board, List, TrelloClient
 
 from pomito.plugins import task
 from pomito.task import Task
@@ -19,7 +20,15 @@ def _create_trello_client(api_key, api_secret):
 
 
 class TrelloTask(task.TaskPlugin):
-    """Trello task plugin for pomito."""
+    """Trello task plugin for pomito.
+
+    Lists of the configured `board` and `list` are resolved on the first
+    `get_tasks` and reused after. Configure `board_id` or `list_id` to skip
+    the lookup. Boards and lists are fetched with up to `max_workers`
+    requests in flight.
+    """
+
+    default_max_workers = 8
 
     def __init__(self, pomodoro_service, get_trello_api=_create_trello_client):
         """Create an instance of TrelloTask."""
@@ -31,6 +40,10 @@ class TrelloTask(task.TaskPlugin):
         self.trello_api = None
         self.trello_board = None
         self.trello_list = None
+        self.trello_board_id = None
+        self.trello_list_id = None
+        self.max_workers = self.default_max_workers
+        self._lists = None
 
     def initialize(self):
         """Initialize the trello task plugin."""
@@ -41,10 +54,17 @@ class TrelloTask(task.TaskPlugin):
         api_secret = _get_config("api_secret")
         self.trello_board = _get_config("board")
         self.trello_list = _get_config("list")
+        self.trello_board_id = _get_config("board_id")
+        self.trello_list_id = _get_config("list_id")
+        max_workers = _get_config("max_workers")
+        if max_workers is not None:
+            self.max_workers = max(1, int(max_workers))
 
         self.trello_api = self._get_trello_client(api_key, api_secret)
+        self._lists = None
         if api_key is None or api_secret is None\
-                or self.trello_board is None or self.trello_list is None:
+                or (self.trello_board is None and self.trello_board_id is None)\
+                or (self.trello_list is None and self.trello_list_id is None):
             logger.error("Error initializing plugin: invalid configuration")
 
     def get_tasks(self):
@@ -59,16 +79,40 @@ class TrelloTask(task.TaskPlugin):
                             tags=card.labels,
                             description=card.name)
 
-            for b in self.trello_api.list_boards():
-                if self.trello_board is not None and b.name != self.trello_board:
-                    continue
-
-                if self.trello_list is not None:
-                    lists = [lo for lo in b.list_lists() if lo.name == self.trello_list]
-                else:
-                    lists = b.list_lists()
-
-                for l in lists:
-                    yield from map(create_task, l.list_cards())
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                lists = self._get_lists(executor)
+                futures = [executor.submit(lo.list_cards) for lo in lists]
+                for f in as_completed(futures):
+                    yield from map(create_task, f.result())
         except AttributeError as attrib_error:
             logger.error("Error getting tasklist: {0}".format(attrib_error))
+        except Exception:
+            # Board or list may be removed, resolve again on next call
+            self._lists = None
+            raise
+
+    def _get_lists(self, executor):
+        """Get the trello lists to fetch cards from.
+
+        Lists are resolved once and cached. Lists of matching boards are
+        fetched in parallel on `executor`.
+        """
+        if self._lists is not None:
+            return self._lists
+
+        if self.trello_list_id is not None:
+            board = Board(self.trello_api, board_id=self.trello_board_id)
+            lists = [List(board, self.trello_list_id)]
+        else:
+            if self.trello_board_id is not None:
+                boards = [Board(self.trello_api, board_id=self.trello_board_id)]
+            else:
+                boards = [b for b in self.trello_api.list_boards()
+                          if self.trello_board is None or b.name == self.trello_board]
+            lists = [lo for board_lists in executor.map(lambda b: b.list_lists(), boards)
+                     for lo in board_lists
+                     if self.trello_list is None or lo.name == self.trello_list]
+
+        if len(lists) > 0:
+            self._lists = lists
+        return lists
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""Watch a file for changes.
+
+`FileWatcher` calls back on a background thread once a file is written. On
+Linux the directory of the file is watched with inotify, since editors often
+write a new file and rename it over the original. Elsewhere, or if inotify is
+not available, the file is polled for changes to its modification time, size
+and inode.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+
+__all__ = ['FileWatcher']
+logger = logging.getLogger('pomito.plugins.task.watch')
+
+# See inotify(7)
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_EVENT = struct.Struct("iIII")
+
+
+class FileWatcher(object):
+    """Calls `callback()` on the watcher thread when a file changes.
+
+    Changes within `delay` seconds of each other are reported once, e.g. an
+    editor writing a backup and the file. A change is reported only if the
+    modification time, size or inode of the file differ from the last report;
+    a missing file is not reported.
+    """
+
+    def __init__(self, path, callback, interval=1.0, delay=0.05, use_inotify=True):
+        """Create a watcher, call `start` to watch.
+
+        Args:
+            path: file to watch
+            callback: callable without arguments
+            interval: seconds between checks if the file is polled
+            delay: seconds to wait for more changes before a report
+            use_inotify: poll the file even if inotify is available if False
+        """
+        self.path = os.path.abspath(path)
+        self._callback = callback
+        self._interval = interval
+        self._delay = delay
+        self._libc = _load_inotify() if use_inotify else None
+        self._signature = _get_signature(self.path)
+        self._stop_event = threading.Event()
+        # Pipe to wake the inotify thread on stop, closed by the thread
+        self._wake_lock = threading.Lock()
+        self._wake_read = self._wake_write = None
+        self._thread = None
+
+    @property
+    def uses_inotify(self):
+        """Check if the file is watched with inotify instead of polled."""
+        return self._libc is not None
+
+    def start(self):
+        """Start watching on a background thread."""
+        fd = None
+        if self._libc is not None:
+            try:
+                fd = self._add_watch()
+            except OSError as e:
+                logger.debug("Polling {0}, inotify failed: {1}".format(self.path, e))
+                self._libc = None
+        if fd is not None:
+            self._wake_read, self._wake_write = os.pipe()
+            self._thread = threading.Thread(target=self._watch, args=(fd,),
+                                            name="FileWatcher", daemon=True)
+        else:
+            self._thread = threading.Thread(target=self._poll,
+                                            name="FileWatcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop watching, waits for a running callback to return.
+
+        May be called from the callback.
+        """
+        if self._stop_event.is_set():
+            return
+        self._stop_event.set()
+        with self._wake_lock:
+            if self._wake_write is not None:
+                os.write(self._wake_write, b"\0")
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def _add_watch(self):
+        libc = self._libc
+        fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        directory = os.path.dirname(self.path).encode(sys.getfilesystemencoding())
+        if libc.inotify_add_watch(fd, directory, _IN_CLOSE_WRITE | _IN_MOVED_TO) < 0:
+            error = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(error, "inotify_add_watch")
+        return fd
+
+    def _watch(self, fd):
+        name = os.path.basename(self.path).encode(sys.getfilesystemencoding())
+        try:
+            while not self._stop_event.is_set():
+                select.select([fd, self._wake_read], [], [])
+                if not self._read_events(fd, name):
+                    continue
+                # Wait for the writes to settle
+                while select.select([fd, self._wake_read], [], [], self._delay)[0]:
+                    if self._stop_event.is_set():
+                        return
+                    self._read_events(fd, name)
+                self._notify()
+        finally:
+            os.close(fd)
+            with self._wake_lock:
+                os.close(self._wake_read)
+                os.close(self._wake_write)
+                self._wake_read = self._wake_write = None
+
+    def _read_events(self, fd, name):
+        """Read pending events, check if any is for the watched file."""
+        found = False
+        while True:
+            try:
+                data = os.read(fd, 64 * 1024)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return found
+                raise
+            offset = 0
+            while offset < len(data):
+                _, _, _, length = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size
+                found = found or data[offset:offset + length].rstrip(b"\0") == name
+                offset += length
+
+    def _poll(self):
+        while not self._stop_event.wait(self._interval):
+            if _get_signature(self.path) != self._signature and \
+                    not self._stop_event.wait(self._delay):
+                self._notify()
+
+    def _notify(self):
+        signature = _get_signature(self.path)
+        if signature is None or signature == self._signature:
+            return
+        self._signature = signature
+        try:
+            self._callback()
+        except Exception:
+            logger.exception("Error in callback for changes to {0}.".format(self.path))
+
+
+def _get_signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+def _load_inotify():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6",
+                           use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p,
+                                           ctypes.c_uint32]
+    except (OSError, AttributeError):
+        return None
+    return libc
@@ -6,6 +6,7 @@ import logging
 
 import click
 
+from pomito.hooks.activity import rebuild_rollups
 from pomito.plugins import ui
 
 # pylint: disable=invalid-name
@@ -58,6 +59,13 @@ def _pomito_list(task_filter=None):
         click.echo(t)
         count += 1
 
+@pomito_shell.command("rebuild")
+def _pomito_rebuild():
+    """Rebuilds activity statistics from the activity log."""
+    pomodoro_service = _get_pomodoro_service()
+    rebuild_rollups(pomodoro_service.get_db())
+    click.echo("Activity statistics rebuilt.")
+
 @pomito_shell.command("quit")
 @click.pass_context
 def _pomito_quit(ctx):
@@ -2,10 +2,16 @@
 """Task widget for pomito."""
 
 import logging
+from datetime import datetime, timedelta
+from itertools import islice
+
 from PyQt5 import QtCore, QtGui, QtWidgets
 
+from pomito import stats
 from pomito.plugins.ui.qt.qt_task import Ui_TaskWindow
-from pomito.plugins.ui.qt.utils import get_elided_text, Worker, WorkerCompletedEvent
+from pomito.plugins.ui.qt.utils import (get_elided_text, SignalBridge, Worker,
+                                        WorkerCompletedEvent)
+from pomito.search import TaskSearch
 from pomito.task import Task
 
 logger = logging.getLogger("pomito.plugins.ui.qtapp.task")
@@ -18,6 +24,8 @@ class TaskWindow(QtWidgets.QWidget, Ui_TaskWindow):
 
     task_selected = QtCore.Signal(Task)
     pending_session_start = False
+    # Tasks used in these many days rank higher in search
+    recency_days = 90
 
     def __init__(self, service):
         """Create an instance of Task Widget.
@@ -27,6 +35,9 @@ class TaskWindow(QtWidgets.QWidget, Ui_TaskWindow):
         """
         QtWidgets.QWidget.__init__(self)
         self._service = service
+        self._search = TaskSearch()
+        self._search_worker = None
+        self._search_stale = False
 
         # Set up user interface from designer
         self.setupUi(self)
@@ -61,6 +72,10 @@ class TaskWindow(QtWidgets.QWidget, Ui_TaskWindow):
         self.act_select_task.triggered.connect(lambda:
                                                self.list_task_selected(self.list_task.currentIndex()))
 
+        # Task plugins send changes on their own threads
+        self._bridge = SignalBridge(self)
+        self._bridge.connect(self._service.signal_tasks_changed, self.on_tasks_changed)
+
         self._apply_task_filter("")
         return
 
@@ -71,44 +86,66 @@ class TaskWindow(QtWidgets.QWidget, Ui_TaskWindow):
 
     def get_task(self):
         """Get tasks for plugin."""
+        self._update_search()
+        self.show()
+
+    def on_tasks_changed(self, *args, **kwargs):
+        """Update the shown tasks for changes in the task plugin."""
+        self._taskmodel.applyChanges(kwargs.get("removed", []),
+                                     kwargs.get("changed", []))
+        if self.isVisible():
+            self._update_search()
+
+    def _update_search(self):
+        """Index the tasks of the plugin on a worker thread.
+
+        One worker runs at a time, a request while it runs starts another
+        once it completes.
+        """
+        if self._search_worker is not None:
+            self._search_stale = True
+            return
+
         def func():
             try:
-                return list(self._service.get_tasks())
+                tasks = list(self._service.get_tasks())
             except Exception as e:
                 logger.debug("Error: {0}".format(e))
-                return []
+                tasks = []
+            # Index on the worker thread, searches are on the ui thread
+            self._search.update(tasks, self._get_last_used())
+            # Close the connection opened by this thread
+            self._service.get_reporting_db().close()
+            return tasks
 
         def on_complete(result):
+            self._search_worker = None
             if isinstance(result, list):
                 logger.debug("Got {0} tasks".format(len(result)))
-                self._taskmodel.updateTasks(result)
-                self._apply_task_filter("")
+                self._apply_task_filter(self.txt_filter.text())
             else:
                 logger.debug("Error in worker thread: {0}".format(result))
+            if self._search_stale:
+                self._search_stale = False
+                self._update_search()
 
-        t = Worker(self, on_complete, func)
-        t.start()
-        self.show()
+        self._search_worker = Worker(self, on_complete, func)
+        self._search_worker.start()
 
     def _apply_task_filter(self, text):
-        # self.list_task.clearContents()
-        # self.list_task.setRowCount(0)
-        # self.list_task.setSortingEnabled(False)
-
-        # for t in self._tasks.values():
-        # if text == u"" or t.description.lower().find(text.lower()) >= 0:
-        # self.list_task.insertRow(0)
-        # self.list_task.setItem(0, 0,
-        # QtWidgets.QTableWidgetItem(unicode(t.estimate)))
-        # self.list_task.setItem(0, 1,
-        # QtWidgets.QTableWidgetItem(unicode(t.actual)))
-        # # Reuse statusTip to store the uid, need to map the uid into
-        # # Task object later!
-        # _item = QtWidgets.QTableWidgetItem(t.description)
-        # _item.setStatusTip(unicode(t.uid))
-        # self.list_task.setItem(0, 2, _item)
-        # self.list_task.setSortingEnabled(True)
-        return
+        """Show tasks matching `text`, best match first."""
+        self._taskmodel.setTasks(self._search.search(text))
+
+    def _get_last_used(self):
+        """Get the last day each task was used in a session."""
+        end = datetime.now()
+        start = end - timedelta(days=self.recency_days)
+        database = self._service.get_reporting_db()
+        try:
+            return dict(stats.get_last_session_per_task(start, end, database))
+        except Exception as e:
+            logger.debug("Error reading task history: {0}".format(e))
+            return {}
 
     ###
     # Widget function overrides
@@ -137,11 +174,18 @@ class TaskWindow(QtWidgets.QWidget, Ui_TaskWindow):
     # Task UI helpers
     ###
     class TaskModel(QtCore.QAbstractListModel):
-        """Model for the task entity."""
+        """Model for the task entity.
+
+        Tasks are read from an iterable in batches of `batch_size`, more
+        batches are fetched as the view scrolls.
+        """
+
+        batch_size = 50
 
         def __init__(self):
             """Create a task model instance."""
             self._tasks = []
+            self._pending = None
             QtCore.QAbstractListModel.__init__(self)
             return
 
@@ -154,10 +198,57 @@ class TaskWindow(QtWidgets.QWidget, Ui_TaskWindow):
             if index.isValid() and role == QtCore.Qt.DisplayRole:
                 return self._tasks[index.row()]
 
+        def canFetchMore(self, index):
+            """Check if there are more tasks to fetch."""
+            return self._pending is not None
+
+        def fetchMore(self, index):
+            """Fetch the next batch of tasks."""
+            if self._pending is None:
+                return
+            batch = list(islice(self._pending, self.batch_size))
+            if len(batch) < self.batch_size:
+                self._pending = None
+            if len(batch) > 0:
+                first = len(self._tasks)
+                self.beginInsertRows(QtCore.QModelIndex(), first, first + len(batch) - 1)
+                self._tasks.extend(batch)
+                self.endInsertRows()
+
+        def setTasks(self, tasks):
+            """Show tasks from an iterable, only the first batch is read."""
+            self.beginResetModel()
+            self._tasks = []
+            self._pending = iter(tasks)
+            self.endResetModel()
+            self.fetchMore(QtCore.QModelIndex())
+
+        def applyChanges(self, removed, changed):
+            """Remove and replace tasks changed in the plugin.
+
+            Args:
+                removed: list of removed `Task`
+                changed: list of `(old task, new task)`
+            """
+            removed = {id(t) for t in removed}
+            replaced = {id(old): new for old, new in changed}
+            for row in reversed(range(len(self._tasks))):
+                key = id(self._tasks[row])
+                if key in removed:
+                    self.beginRemoveRows(QtCore.QModelIndex(), row, row)
+                    del self._tasks[row]
+                    self.endRemoveRows()
+                elif key in replaced:
+                    self._tasks[row] = replaced[key]
+                    index = self.index(row)
+                    self.dataChanged.emit(index, index)
+
         def updateTasks(self, tasks):
             """Update the tasks from plugin."""
-            self._tasks = tasks
-            self.dataChanged.emit(self.createIndex(0, 0), self.createIndex(len(self._tasks), 0))
+            self.beginResetModel()
+            self._tasks = list(tasks)
+            self._pending = None
+            self.endResetModel()
             return
 
     class TaskItemDelegate(QtWidgets.QStyledItemDelegate):
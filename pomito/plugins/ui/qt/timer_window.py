@@ -7,7 +7,7 @@ from PyQt5 import QtCore, QtGui, QtWidgets
 from pomito.plugins.ui.qt.task_widget import TaskWindow
 from pomito.plugins.ui.qt.interrupt_widget import InterruptWindow
 from pomito.plugins.ui.qt.shell import Taskbar, Tray
-from pomito.plugins.ui.qt.utils import get_elided_text
+from pomito.plugins.ui.qt.utils import get_elided_text, SignalBridge
 from pomito.plugins.ui.qt.qt_timer import Ui_MainWindow
 from pomito.pomodoro import TimerChange
 from pomito.task import Task
@@ -63,14 +63,19 @@ class TimerWindow(QtWidgets.QMainWindow, Ui_MainWindow):
         self._interrupt_window.interrupt_selected.connect(self.interrupt_selected)
         self._task_window.task_selected.connect(self.task_selected)
 
-        # Setup signal handlers for pomodoro service
-        self._service.signal_timer_increment.connect(self.on_timer_increment)
-        self._service.signal_session_started.connect(self.on_session_start)
-        self._service.signal_session_stopped.connect(self.on_session_stop)
-        self._service.signal_break_started.connect(self.on_break_start)
-        self._service.signal_break_stopped.connect(self.on_break_stop)
-        self._service.signal_interruption_started.connect(self.on_interrupt_start)
-        self._service.signal_interruption_stopped.connect(self.on_interrupt_stop)
+        # Setup signal handlers for pomodoro service. Signals are sent on the
+        # timer and dispatcher threads, the bridge calls handlers on ui thread
+        self._bridge = SignalBridge(self)
+        self._bridge.connect_timer_increment(self._service, self.on_timer_increment,
+                                             resolution=1)
+        self._bridge.connect(self._service.signal_session_started, self.on_session_start)
+        self._bridge.connect(self._service.signal_session_stopped, self.on_session_stop)
+        self._bridge.connect(self._service.signal_break_started, self.on_break_start)
+        self._bridge.connect(self._service.signal_break_stopped, self.on_break_stop)
+        self._bridge.connect(self._service.signal_interruption_started,
+                             self.on_interrupt_start)
+        self._bridge.connect(self._service.signal_interruption_stopped,
+                             self.on_interrupt_stop)
 
         # Setup platform specific configuration
         def toggle_timer():
@@ -108,6 +113,7 @@ class TimerWindow(QtWidgets.QMainWindow, Ui_MainWindow):
             self._service.stop_interruption()
         elif self.btn_timer.isChecked():
             self._service.stop_break()
+        self._bridge.disconnect()
         self._timer_tray.hide()
 
     def resizeEvent(self, resize_event):
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 """Utilities for Qt integration."""
 
+import threading
+
 from PyQt5 import QtCore, QtGui, QtWidgets
 
 
@@ -31,7 +33,7 @@ def get_elided_text(rect, font, text):
     textLayout.endLayout()
 
     # XXX are we calculating the width correctly?
-    return metrics.elidedText(text, QtCore.Qt.ElideRight, totalWidth + rect.width())
+    return metrics.elidedText(text, QtCore.Qt.ElideRight, int(totalWidth + rect.width()))
 
 
 class WorkerCompletedEvent(QtCore.QEvent):
@@ -105,3 +107,91 @@ class Worker(QtCore.QThread):
             result = e
         finally:
             WorkerCompletedEvent.post_to(self.parent(), self._on_complete, result)
+
+
+class SignalBridge(QtCore.QObject):
+    """Delivers pomodoro service signals on the Qt thread.
+
+    Service signals are sent on the timer and dispatcher threads. The bridge
+    posts a `WorkerCompletedEvent` for every signal, its receivers are called
+    on the thread of the bridge, i.e. the ui thread.
+
+    Timer increments are coalesced: a receiver has at most one pending
+    increment event, which delivers the latest time elapsed. The timer thread
+    only posts events, a slow receiver doesn't hold it up.
+
+    Events pending on `disconnect` are not delivered.
+    """
+
+    def __init__(self, parent=None):
+        """Create an instance of the bridge.
+
+        Args:
+            parent: owning widget, receivers are called on its thread
+        """
+        super(SignalBridge, self).__init__(parent)
+        self._lock = threading.Lock()
+        self._pending_increments = {}
+        self._connections = []
+        # Increased on disconnect, events of earlier connections are dropped
+        self._generation = 0
+        # Receivers must not be called once the bridge is deleted
+        connections = self._connections
+        self.destroyed.connect(lambda: _disconnect_all(connections))
+
+    def connect(self, signal, receiver):
+        """Call receiver(sender, **kwargs) on the Qt thread for a signal.
+
+        Args:
+            signal: blinker signal of the pomodoro service
+            receiver: callable
+        """
+        def forward(sender, **kwargs):
+            WorkerCompletedEvent.post_to(self, self._deliver, self._generation,
+                                         receiver, sender, kwargs)
+        signal.connect(forward, weak=False)
+        self._connections.append((signal.disconnect, forward))
+
+    def connect_timer_increment(self, service, receiver, resolution=1):
+        """Call receiver(time_elapsed) on the Qt thread for timer increments.
+
+        See `Pomodoro.connect_timer_increment`.
+        """
+        def forward(time_elapsed):
+            with self._lock:
+                post = receiver not in self._pending_increments
+                self._pending_increments[receiver] = time_elapsed
+            if post:
+                WorkerCompletedEvent.post_to(self, self._deliver_increment,
+                                             receiver)
+        service.connect_timer_increment(forward, resolution)
+        self._connections.append((service.disconnect_timer_increment, forward))
+
+    def disconnect(self):
+        """Disconnect all receivers. Pending events are thrown away."""
+        _disconnect_all(self._connections)
+        with self._lock:
+            self._generation += 1
+            self._pending_increments.clear()
+
+    def customEvent(self, event):
+        """Override for custom events."""
+        if isinstance(event, WorkerCompletedEvent):
+            event.callback()
+
+    def _deliver(self, generation, receiver, sender, kwargs):
+        if generation == self._generation:
+            receiver(sender, **kwargs)
+
+    def _deliver_increment(self, receiver):
+        with self._lock:
+            if receiver not in self._pending_increments:
+                return
+            time_elapsed = self._pending_increments.pop(receiver)
+        receiver(time_elapsed)
+
+
+def _disconnect_all(connections):
+    while connections:
+        disconnect, forward = connections.pop()
+        disconnect(forward)
@@ -46,8 +46,6 @@ class QtUI(UIPlugin):
         return self._app.run()
 
 
-# FIXME: we're accessing UI QObjects in timer callbacks; this may cause cross
-# thread violation.
 class PomitoApp(QtWidgets.QApplication):
     """Qt application."""
 
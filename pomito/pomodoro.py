@@ -2,14 +2,17 @@
 # Pomito - Pomodoro timer on steroids
 """Implementation of Pomodoro service layer."""
 
+import heapq
+import itertools
 import logging
 import threading
+import time
 import blinker
+from collections import deque
 from enum import Enum
 
 from pomito.main import Message
-from pomito.plugins import get_plugin, get_plugins
-from pomito.plugins.task import TaskPlugin
+from pomito.plugins import get_plugins
 
 logger = logging.getLogger('pomito.service')
 
@@ -41,7 +44,10 @@ class Pomodoro(object):
         - Tasks management: handled by plugin.task.TaskPlugin, we only bubble
         up few methods
         - Session management: completely handled in this layer, we know the
-        state for this
+        state for this. `start_*` and `stop_*` queue a command and return
+        right away; commands run one at a time on the timer thread, see
+        `_post`. Starting a timer stops the running one, starting an
+        interruption preempts a running session
 
     Primary consumers are:
         - Task plugins: implemented by plugin.task.TaskPlugin
@@ -51,13 +57,17 @@ class Pomodoro(object):
 
     # Signals
     # timer_increment
-    #   - args: timer_type, timer_value
+    #   - args: timer_value, sent on every tick. See `connect_timer_increment`
+    #   for notifications at a lower resolution
     # session_started, session_stopped
     #   - args: session_count, task, reason (only for stop)
     # break_started, break_stopped
     #   - args: break_type, reason (only for *_stopped signal)
     # interruption_started, interruption_stopped
     #   - args: duration (only for stop)
+    # tasks_changed
+    #   - args: added, removed, changed. Sent by task plugins which reload
+    #   their tasks, see `notify_tasks_changed`
     signal_timer_increment = blinker.signal('timer_increment')
     signal_session_started = blinker.signal('session_started')
     signal_session_stopped = blinker.signal('session_stopped')
@@ -65,29 +75,46 @@ class Pomodoro(object):
     signal_break_stopped = blinker.signal('break_stopped')
     signal_interruption_started = blinker.signal('interruption_started')
     signal_interruption_stopped = blinker.signal('interruption_stopped')
+    signal_tasks_changed = blinker.signal('tasks_changed')
 
-    def _get_timer(duration, callback, interval=1):
-        return Timer(duration, callback, interval)
+    def __init__(self, pomito_instance, create_timer=None):
+        """Create an instance of the pomodoro service.
 
-    def __init__(self, pomito_instance, create_timer=_get_timer):
-        """Create an instance of the pomodoro service."""
+        Timers and commands are run on the scheduler owned by
+        `pomito_instance` unless a `create_timer(duration, callback,
+        interval=1)` factory is provided. With a custom factory, commands are
+        run on the calling thread, which must be the thread running the
+        timers, e.g. the event loop of `aio.AsyncPomodoro`.
+        """
         self._pomito_instance = pomito_instance
         self._session_count = 0
         self._create_timer = create_timer
+        self._scheduler = None
+        if self._create_timer is None:
+            self._create_timer = self._get_timer
+            self._scheduler = self._pomito_instance.get_scheduler()
         self._config = self._pomito_instance.get_configuration()
         self._timer = self._create_timer(self._config.session_duration,
                                          self._update_state)
-        # other values = "{short, long}_break", "interruption"
-        self._timer_type = TimerType.SESSION
         self.current_task = None
 
-    def _stop_timer(self):
-        # TODO cleanup: decorator for stop* methods. Similar method for start*
-        # methods
-        self._timer.stop()
-        if self._timer.is_alive():
-            self._timer.join()
-        return
+        # State of the service, changed only by commands and callbacks of the
+        # running timer, see `_post`. `_timer_type` is None if no timer runs
+        self._running = None
+        self._timer_type = None
+        # (task, remaining duration) of a session preempted by an interruption
+        self._preempted = None
+        self._commands = deque()
+        self._draining = False
+
+        # Timer increment receivers grouped by resolution, and the last
+        # notified bucket for each resolution in the running timer
+        self._increment_receivers = {}
+        self._increment_marks = {}
+        self._increment_timer = None
+
+    def _get_timer(self, duration, callback, interval=1):
+        return Timer(duration, callback, interval, self._scheduler)
 
     def get_config(self, plugin_name, config_key):
         """Get the config dict for <plugin_name> from pomito ini file."""
@@ -103,6 +130,10 @@ class Pomodoro(object):
         """Get the in application database for Pomito."""
         return self._pomito_instance.get_db()
 
+    def get_reporting_db(self):
+        """Get the read-only database for reports."""
+        return self._pomito_instance.get_reporting_db()
+
     def get_data_dir(self):
         """Get the data directory for pomito application."""
         from .main import DATA_DIR
@@ -110,8 +141,7 @@ class Pomodoro(object):
 
     def get_task_plugins(self):
         """Get list of all registered task plugins."""
-        plugins = get_plugins().items()
-        return [v for k, v in plugins if isinstance(get_plugin(k), TaskPlugin)]
+        return list(get_plugins('task').values())
 
     def get_tasks(self):
         """Get all tasks in the current task plugin."""
@@ -138,30 +168,33 @@ class Pomodoro(object):
         return self._pomito_instance\
             .task_plugin.get_task_by_id(task_id)
 
+    def notify_tasks_changed(self, added, removed, changed):
+        """Send `signal_tasks_changed` for tasks changed by a task plugin.
+
+        Args:
+            added: list of new `Task`
+            removed: list of removed `Task`
+            changed: list of `(old task, new task)`
+        """
+        msg = Message(self.signal_tasks_changed,
+                      added=added,
+                      removed=removed,
+                      changed=changed)
+        self._pomito_instance.queue_signal(msg)
+
     def start_session(self, task):
-        """Start a pomodoro session.
+        """Start a pomodoro session. Stops any running session or break.
 
         Args:
             task: Task - A task object, to be performed during this session
         """
         if task is None:
             raise Exception("Cannot start a session without a valid task!")
-
-        self.current_task = task
-        self._timer_type = TimerType.SESSION
-        self._timer = self._create_timer(self._config.session_duration,
-                                         self._update_state)
-        msg = Message(self.signal_session_started,
-                      session_count=self._session_count,
-                      session_duration=self._config.session_duration,
-                      task=self.current_task)
-        self._pomito_instance.queue_signal(msg)
-        self._timer.start()
+        self._post(self._start_session, task, self._config.session_duration)
 
     def stop_session(self):
         """Stop a pomodoro session."""
-        self._stop_timer()
-        self.current_task = None
+        self._post(self._stop_session)
 
     def start_break(self):
         """Start a break on completion of a session.
@@ -170,25 +203,16 @@ class Pomodoro(object):
         A longer break of duration 15 minutes is introduced after 4 consecutive
         sessions.
         """
-        if self._session_count == self._config.long_break_frequency:
-            self._timer_type = TimerType.LONG_BREAK
-            _duration = self._config.long_break_duration
-        else:
-            self._timer_type = TimerType.SHORT_BREAK
-            _duration = self._config.short_break_duration
-        self._timer = self._create_timer(_duration, self._update_state)
-        msg = Message(self.signal_break_started,
-                      break_type=self._timer_type,
-                      break_duration=_duration)
-        self._pomito_instance.queue_signal(msg)
-        self._timer.start()
+        self._post(self._start_break)
 
     def stop_break(self):
         """Stop a break session."""
-        self._stop_timer()
+        self._post(self._stop)
 
     def start_interruption(self, reason, is_external, add_unplanned_task):
-        """Start an interruption.
+        """Start an interruption. Preempts any running session or break.
+
+        A preempted session is stopped, see `stop_interruption` to resume it.
 
         Args:
             reason (str): reason for interruption
@@ -198,65 +222,305 @@ class Pomodoro(object):
         # TODO option to stop auto monitoring of interruptions
         # TODO add the interruption activity
         # TODO support interruption type for interruption_stop
-        self._timer_type = "interruption"
-        if self._timer.is_alive():
-            logger.debug('Another timer is alive. Wait for join()')
-            self._timer.join()
-        self._timer = self._create_timer(0, self._update_state)
+        self._post(self._start_interruption, reason, is_external)
+
+    def stop_interruption(self, resume=False):
+        """Stop the interruption timer.
+
+        Args:
+            resume (bool): resume the session preempted by the interruption
+                for its remaining duration
+        """
+        self._post(self._stop_interruption, resume)
+
+    def flush(self, timeout=None):
+        """Wait until the commands sent so far are run.
+
+        Returns:
+            False if the commands didn't run within `timeout` seconds.
+        """
+        done = threading.Event()
+        self._post(done.set)
+        return done.wait(timeout)
+
+    def connect_timer_increment(self, receiver, resolution=1):
+        """Subscribe to timer increments at a resolution.
+
+        Unlike `signal_timer_increment`, which is sent on every tick, receiver
+        is only notified once every `resolution` seconds of the timer.
+        Receivers with the same resolution are notified together.
+
+        Args:
+            receiver: callable invoked as receiver(time_elapsed) on the timer
+                thread
+            resolution: seconds between two notifications
+        """
+        if resolution <= 0:
+            raise ValueError("Resolution must be a positive number of seconds.")
+        groups = {r: list(receivers) for r, receivers in
+                  self._increment_receivers.items()}
+        groups.setdefault(resolution, []).append(receiver)
+        self._increment_receivers = groups
+
+    def disconnect_timer_increment(self, receiver):
+        """Unsubscribe a receiver connected with `connect_timer_increment`."""
+        groups = {}
+        for resolution, receivers in self._increment_receivers.items():
+            receivers = [r for r in receivers if r != receiver]
+            if receivers:
+                groups[resolution] = receivers
+        self._increment_receivers = groups
+
+    def _get_increment_receivers(self, time_elapsed):
+        """Get the subscribed receivers due for a notification."""
+        if self._increment_timer is not self._timer:
+            self._increment_timer = self._timer
+            self._increment_marks = {}
+
+        due = []
+        for resolution, receivers in self._increment_receivers.items():
+            bucket = int(time_elapsed // resolution)
+            if bucket > self._increment_marks.get(resolution, 0):
+                self._increment_marks[resolution] = bucket
+                due.extend(receivers)
+        return due
+
+    def _notify_timer_increment(self, time_elapsed):
+        """Notify receivers of a timer increment on the timer thread."""
+        for receiver in self._get_increment_receivers(time_elapsed):
+            receiver(time_elapsed)
+        if self.signal_timer_increment.receivers:
+            self.signal_timer_increment.send(time_elapsed)
+
+    def _post(self, command, *args):
+        """Queue a command to change the state of the service.
+
+        Commands are run one at a time, in order, on the thread running the
+        timers. Starting or stopping a timer doesn't wait for the timer
+        thread, so callers never block.
+        """
+        self._commands.append((command, args))
+        if self._scheduler is not None:
+            self._scheduler.call_soon(self._run_commands)
+        else:
+            self._run_commands()
+
+    def _run_commands(self):
+        # A command may post commands, e.g. a timer started by the command
+        # notifies synchronously; run them after the current one
+        if self._draining:
+            return
+        self._draining = True
+        try:
+            while self._commands:
+                command, args = self._commands.popleft()
+                try:
+                    command(*args)
+                except Exception:
+                    logger.exception("Error in pomodoro command.")
+        finally:
+            self._draining = False
+
+    def _start_session(self, task, duration):
+        self._stop()
+        self._preempted = None
+        self.current_task = task
+        msg = Message(self.signal_session_started,
+                      session_count=self._session_count,
+                      session_duration=duration,
+                      task=task)
+        self._pomito_instance.queue_signal(msg)
+        self._start_timer(TimerType.SESSION, duration)
+
+    def _stop_session(self):
+        self._stop()
+        self.current_task = None
+
+    def _start_break(self):
+        self._stop()
+        self._preempted = None
+        if self._session_count == self._config.long_break_frequency:
+            break_type = TimerType.LONG_BREAK
+            duration = self._config.long_break_duration
+        else:
+            break_type = TimerType.SHORT_BREAK
+            duration = self._config.short_break_duration
+        msg = Message(self.signal_break_started,
+                      break_type=break_type,
+                      break_duration=duration)
+        self._pomito_instance.queue_signal(msg)
+        self._start_timer(break_type, duration)
+
+    def _start_interruption(self, reason, is_external):
+        timer, timer_type = self._running, self._timer_type
+        self._stop()
+        self._preempted = None
+        if timer_type == TimerType.SESSION:
+            self._preempted = (self.current_task,
+                               max(timer.duration - timer.time_elapsed, 0))
         msg = Message(self.signal_interruption_started,
                       reason=reason,
                       external=is_external)
         self._pomito_instance.queue_signal(msg)
-        self._timer.start()
-
-    def stop_interruption(self):
-        """Stop the interruption timer."""
-        self._stop_timer()
+        self._start_timer(TimerType.INTERRUPT, 0)
+
+    def _stop_interruption(self, resume):
+        self._stop()
+        preempted, self._preempted = self._preempted, None
+        if resume and preempted is not None and preempted[1] > 0:
+            self._start_session(*preempted)
+
+    def _start_timer(self, timer_type, duration):
+        def callback(notify_reason):
+            # Timers stopped by a command are done, ignore their callbacks
+            if timer is self._running:
+                self._update_state(notify_reason)
+        timer = self._create_timer(duration, callback)
+        self._timer = self._running = timer
+        self._timer_type = timer_type
+        timer.start()
+
+    def _stop(self):
+        """Stop the running timer, if any."""
+        timer = self._running
+        if timer is not None:
+            self._finish(TimerChange.INTERRUPT)
+            timer.stop()
+
+    def _finish(self, notify_reason):
+        """Leave the state of the running timer and send its stop signal."""
+        timer, timer_type = self._running, self._timer_type
+        self._running = self._timer_type = None
+
+        if timer_type == TimerType.SESSION:
+            if notify_reason == TimerChange.COMPLETE:
+                self._session_count += 1
+            msg = Message(self.signal_session_stopped,
+                          session_count=self._session_count,
+                          task=self.current_task,
+                          reason=notify_reason)
+        elif timer_type == TimerType.SHORT_BREAK or timer_type == TimerType.LONG_BREAK:
+            msg = Message(self.signal_break_stopped,
+                          break_type=timer_type,
+                          reason=notify_reason)
+        else:
+            msg = Message(self.signal_interruption_stopped,
+                          duration=timer.time_elapsed)
+        self._pomito_instance.queue_signal(msg)
 
     def _update_state(self, notify_reason):
         """Update state of the timer.
 
-        This is called in context of timer thread. Try to keep execution as
-        minimal as possible in case of increment notifications.
+        This is called in context of timer thread for the running timer. Try
+        to keep execution as minimal as possible in case of increment
+        notifications.
 
         This method queues the signals into the dispatcher queue.
         """
-        msg = None
         if notify_reason == TimerChange.INCREMENT:
-            self.signal_timer_increment.send(self._timer.time_elapsed)
-        elif notify_reason == TimerChange.COMPLETE:
-            if self._timer_type == TimerType.SESSION:
-                self._session_count += 1
-                msg = Message(self.signal_session_stopped,
-                              session_count=self._session_count,
-                              task=self.current_task,
-                              reason=notify_reason)
-            elif self._timer_type == TimerType.SHORT_BREAK or self._timer_type == TimerType.LONG_BREAK:
-                msg = Message(self.signal_break_stopped,
-                              break_type=self._timer_type,
-                              reason=notify_reason)
-        elif notify_reason == TimerChange.INTERRUPT:
-            if self._timer_type == TimerType.SESSION:
-                # TODO cancel session w/ task. Start interruption timer?
-                msg = Message(self.signal_session_stopped,
-                              session_count=self._session_count,
-                              task=self.current_task,
-                              reason=notify_reason)
-            elif self._timer_type == TimerType.SHORT_BREAK or self._timer_type == TimerType.LONG_BREAK:
-                msg = Message(self.signal_break_stopped,
-                              break_type=self._timer_type,
-                              reason=notify_reason)
-            else:
-                msg = Message(self.signal_interruption_stopped,
-                              duration=self._timer.time_elapsed)
+            self._notify_timer_increment(self._timer.time_elapsed)
+        elif notify_reason == TimerChange.COMPLETE or\
+                notify_reason == TimerChange.INTERRUPT:
+            self._finish(notify_reason)
         else:
             msg = "Invalid state. Notify reason = {0}.".format(notify_reason)
             raise Exception(msg)
-        if msg is not None:
-            self._pomito_instance.queue_signal(msg)
 
 
-class Timer(threading.Thread):
+class TimerScheduler(threading.Thread):
+    """Runs any number of timers on a single thread.
+
+    Timers are kept in a heap ordered by their next deadline. The scheduler
+    thread sleeps on a condition variable until the earliest deadline is due
+    or a new timer is scheduled ahead of it, and invokes the timer callbacks
+    in its own context. The thread is started lazily on first use.
+
+    `call_soon` runs other callbacks on the same thread, e.g. the commands of
+    `Pomodoro`, so that they don't race with the timer callbacks.
+
+    All callbacks share this thread; a slow callback delays every other timer.
+    """
+
+    def __init__(self):
+        """Create an instance of the scheduler."""
+        threading.Thread.__init__(self, name="TimerScheduler", daemon=True)
+
+        self._heap = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._stopped = False
+
+    def schedule(self, timer, deadline):
+        """Schedule a timer to fire at deadline.
+
+        Args:
+            timer: Timer to fire
+            deadline: time in `time.monotonic()` reference
+        """
+        self._push(timer._fire, deadline)
+
+    def call_soon(self, callback):
+        """Call `callback()` on the scheduler thread, after the due timers."""
+        self._push(callback, time.monotonic())
+
+    def _push(self, callback, deadline):
+        with self._condition:
+            if self._stopped:
+                raise RuntimeError("Cannot schedule timers on a stopped scheduler.")
+            count = next(self._counter)
+            heapq.heappush(self._heap, (deadline, count, callback))
+            if self._heap[0][1] == count:
+                self._condition.notify()
+            if self.ident is None:
+                self.start()
+
+    def stop(self):
+        """Stop the scheduler. Pending timers are thrown away."""
+        with self._condition:
+            self._stopped = True
+            self._heap.clear()
+            self._condition.notify()
+
+    def is_current(self):
+        """Get True if this method is called on the scheduler thread."""
+        return threading.current_thread() is self
+
+    def run(self):
+        """Thread run loop. Do not call directly."""
+        while True:
+            with self._condition:
+                while not self._stopped:
+                    if not self._heap:
+                        self._condition.wait()
+                        continue
+                    delay = self._heap[0][0] - time.monotonic()
+                    if delay <= 0:
+                        break
+                    self._condition.wait(delay)
+                if self._stopped:
+                    return
+                _, _, callback = heapq.heappop(self._heap)
+
+            try:
+                callback()
+            except Exception:
+                logger.exception("Error in timer callback.")
+
+
+_default_scheduler = None
+_default_scheduler_lock = threading.Lock()
+
+
+def get_default_scheduler():
+    """Get the scheduler shared by timers created without one."""
+    global _default_scheduler
+    with _default_scheduler_lock:
+        if _default_scheduler is None:
+            _default_scheduler = TimerScheduler()
+        return _default_scheduler
+
+
+class Timer(object):
     """A custom timer inspired by threading.Timer.
 
     Two major differences:
@@ -267,55 +531,102 @@ class Timer(threading.Thread):
         - We stop only when a) stop is called explicitly, notify_reason =
         interrupt; or b) duration is complete, notify_reason = complete
 
-    This runs in its own thread, on which parent_callback is called. User can
-    screw us up due to nature of callbacks, by doing bad stuff in the callback.
+    The timer doesn't own a thread. It is run by a `TimerScheduler`, on whose
+    thread parent_callback is called. User can screw us up due to nature of
+    callbacks, by doing bad stuff in the callback. A timer can be started or
+    stopped on the scheduler thread, but not from its own callback.
 
-    Performance overhead: ~0.03s per minute for vanilla callbacks
-    (see tests/test_timer.py).
+    Tick deadlines are computed from `time.monotonic()` at start, so the timer
+    doesn't drift. If the process is starved past several deadlines, the
+    missed ticks are coalesced into one callback. `actual_elapsed` reports the
+    wall clock time elapsed since start as of the last callback.
     """
 
-    def __init__(self, duration, callback, interval=1):
+    def __init__(self, duration, callback, interval=1, scheduler=None):
         """Create an instance of the timer.
 
         Args:
             duration: total duration for the timer
             callback: callback that will be invoked on stop or completion
             interval: duration to increment the timer on each loop
+            scheduler: TimerScheduler to run the timer, uses a shared default
+                scheduler if None
         """
-        threading.Thread.__init__(self)
-
         self.duration = duration
         self.time_elapsed = interval
+        self.actual_elapsed = 0
+        self.deadline = None
         self._interval = interval
+        self._tick = 0
+        self._tick_count = round(duration / interval) if duration > 0 else None
+        self._start_time = None
         self._notify_reason = TimerChange.COMPLETE
         self._parent_callback = callback
+        self._scheduler = scheduler or get_default_scheduler()
+        self._started = False
+        self._firing = False
         self._finished = threading.Event()
+        self._done = threading.Event()
 
     def start(self):
         """Start the timer."""
-        if threading.currentThread() == self:
-            raise RuntimeError("Cannot call start on the timer thread itself.")
+        if self._firing and self._scheduler.is_current():
+            raise RuntimeError("Cannot call start in the timer callback itself.")
+        if self._started:
+            raise RuntimeError("Timer can only be started once.")
+        self._started = True
         self._notify_reason = TimerChange.INCREMENT
-        threading.Thread.start(self)
+        self._start_time = time.monotonic()
+        self.deadline = self._start_time + self._interval
+        self._scheduler.schedule(self, self.deadline)
 
     def stop(self):
         """Stop the timer."""
-        if threading.currentThread() == self:
-            raise RuntimeError("Cannot call stop on the timer thread itself.")
+        if self._firing and self._scheduler.is_current():
+            raise RuntimeError("Cannot call stop in the timer callback itself.")
         self._notify_reason = TimerChange.INTERRUPT
         self._finished.set()
-
-    def run(self):
-        """Thread run loop. Do not call directly."""
-        while True:
-            self._finished.wait(self._interval)
-
-            if self.time_elapsed == self.duration:
+        if self.is_alive():
+            # Fire right away, the pending tick is ignored
+            self._scheduler.schedule(self, time.monotonic())
+
+    def is_alive(self):
+        """Get True if the timer is started and not done yet."""
+        return self._started and not self._done.is_set()
+
+    def join(self, timeout=None):
+        """Wait until the timer is done."""
+        if self._started:
+            self._done.wait(timeout)
+
+    def _fire(self):
+        """Tick the timer. Called on the scheduler thread."""
+        if self._done.is_set():
+            return
+
+        now = time.monotonic()
+        self.actual_elapsed = now - self._start_time
+        if not self._finished.is_set():
+            # Every deadline is anchored to the start time, so callback and
+            # scheduling delays don't accumulate. Ticks missed while the
+            # process was starved are coalesced into this one.
+            self._tick = max(self._tick + 1,
+                             int(self.actual_elapsed / self._interval))
+            if self._tick_count is not None and self._tick >= self._tick_count:
                 self._notify_reason = TimerChange.COMPLETE
+                self.time_elapsed = self.duration
                 self._finished.set()
             else:
-                self.time_elapsed += self._interval
-            self._parent_callback(self._notify_reason)
+                self.time_elapsed = (self._tick + 1) * self._interval
+                next_deadline = self._start_time + (self._tick + 1) * self._interval
+                self._scheduler.schedule(self, next_deadline)
 
+        self._firing = True
+        try:
+            self._parent_callback(self._notify_reason)
+        finally:
+            self._firing = False
             if self._finished.is_set():
-                break
+                self._done.set()
+            else:
+                self.deadline = next_deadline
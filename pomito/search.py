@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+# Pomito - Pomodoro timer on steroids.
+"""Fuzzy ranked search over tasks.
+
+Descriptions and tags of the tasks are split into lower case tokens. A query
+token matches a task token exactly, as a prefix, or fuzzily if most of its
+trigrams are found in the task token, e.g. `eport` or `rport` match `report`.
+Fuzzy matches need at least four letters.
+Every query token must match for a task to be a result.
+
+Results are ranked by how well the tokens matched, then by the last use of
+the task (see `pomito.stats.get_last_session_per_task`), then by progress:
+tasks with pomodoros left rank above tasks which used up their estimate.
+`TaskSearch.search` yields the best results first, callers can stop after
+the first few.
+
+Sets of tasks are bitmaps (`int`) over the positions of the tasks. Bitmaps
+of frequent tokens and of frequent prefixes up to three letters are built
+with the index, since the first keystrokes of a query match most tasks.
+"""
+
+import re
+from bisect import bisect_left
+from collections import Counter, defaultdict, namedtuple
+from itertools import groupby
+
+from pomito.task import get_version
+
+__all__ = ["TaskSearch"]
+
+_TOKEN = re.compile(r"\w+")
+_EXACT, _PREFIX, _FUZZY = 3, 2, 1
+
+_Index = namedtuple("_Index", ["tasks", "vocabulary", "postings", "trigrams",
+                               "bitmaps", "prefixes", "order", "rank"])
+
+
+class TaskSearch(object):
+    """Index of tasks for fuzzy ranked search.
+
+    `update` rebuilds the index only if the tasks changed, and tokenizes only
+    the tasks added since the last update or with a changed description or
+    tags. Tasks are compared by identity, changes to tasks are found with
+    `pomito.task.get_version`.
+    """
+
+    # Tokens and short prefixes in more than `1 / _dense_ratio` of the tasks
+    # keep a bitmap; results in more than that are ordered by a scan in rank
+    # order
+    _dense_ratio = 64
+    _prefix_length = 3
+
+    def __init__(self):
+        """Create an empty index."""
+        self._version = None
+        self._tasks = []
+        self._entries = {}
+        self._last_used = {}
+        self._index = _Index([], [], {}, {}, {}, {}, [], [])
+
+    def update(self, tasks, last_used=None):
+        """Update the index.
+
+        Args:
+            tasks: iterable of `Task`
+            last_used: dict of task uid to the `date` the task was last used.
+                Last use from the previous update is kept if `None`.
+
+        Returns:
+            True if the index was rebuilt.
+        """
+        # Read first, a task changed while indexing is indexed on next update
+        version = get_version()
+        tasks = list(tasks)
+        tasks_changed = version != self._version or tasks != self._tasks
+        if not tasks_changed and (last_used is None or last_used == self._last_used):
+            return False
+        if last_used is not None:
+            self._last_used = dict(last_used)
+
+        index = self._index
+        if tasks_changed:
+            index = self._create_index(tasks)
+        order, rank = self._rank(tasks)
+
+        self._version = version
+        self._tasks = tasks
+        self._index = index._replace(order=order, rank=rank)
+        return True
+
+    def search(self, query):
+        """Search tasks matching `query`.
+
+        Args:
+            query: text to search, all tasks are returned for an empty query.
+
+        Returns:
+            Generator of `Task`, best match first.
+        """
+        index = self._index
+        tokens = list(dict.fromkeys(_tokenize(query)))
+        if len(tokens) == 0:
+            yield from (index.tasks[p] for p in index.order)
+            return
+
+        # Tasks grouped by score, sum of the match scores of query tokens
+        buckets = {0: None}
+        for token in tokens:
+            matches = _match(index, token)
+            new_buckets = defaultdict(int)
+            for score, bucket in buckets.items():
+                for match_score, matched in matches:
+                    both = matched if bucket is None else bucket & matched
+                    if both:
+                        new_buckets[score + match_score] |= both
+            buckets = new_buckets
+            if len(buckets) == 0:
+                return
+
+        for score in sorted(buckets, reverse=True):
+            yield from (index.tasks[p] for p in self._order(index, buckets[score]))
+
+    def _create_index(self, tasks):
+        entries = self._entries
+        new_entries = {}
+        postings = defaultdict(list)
+        for position, t in enumerate(tasks):
+            entry = entries.get(id(t))
+            description, tags = t.description, t.tags
+            if entry is None or entry[0] is not t or entry[1] is not description \
+                    or entry[2] is not tags:
+                entry = (t, description, tags,
+                         tuple(set(_tokenize(_get_text(description, tags)))))
+            new_entries[id(t)] = entry
+            for token in entry[3]:
+                postings[token].append(position)
+        self._entries = new_entries
+
+        trigrams = defaultdict(list)
+        for token in postings:
+            for gram in _get_trigrams(token):
+                trigrams[gram].append(token)
+
+        count = len(tasks)
+        dense = count // self._dense_ratio
+        vocabulary = sorted(postings)
+        bitmaps = {t: _to_bitmap(p, count) for t, p in postings.items()
+                   if len(p) > dense}
+        prefixes = {}
+        for length in range(1, self._prefix_length + 1):
+            for prefix, tokens in groupby(vocabulary, key=lambda t: t[:length]):
+                tokens = list(tokens)
+                if sum(len(postings[t]) for t in tokens) > dense:
+                    prefixes[prefix] = _to_bitmap(
+                        (p for t in tokens for p in postings[t]), count)
+        return _Index(tasks, vocabulary, dict(postings), dict(trigrams), bitmaps,
+                      prefixes, [], [])
+
+    def _rank(self, tasks):
+        last_used = self._last_used
+        keys = []
+        for t in tasks:
+            used = last_used.get(str(t.uid))
+            recency = -used.toordinal() if used is not None else 0
+            if t.actual < t.estimate:
+                progress = 0 if t.actual > 0 else 1
+            else:
+                progress = 2
+            keys.append((used is None, recency, progress))
+        order = sorted(range(len(tasks)), key=keys.__getitem__)
+        rank = [0] * len(tasks)
+        for i, p in enumerate(order):
+            rank[p] = i
+        return order, rank
+
+    def _order(self, index, bitmap):
+        """Get positions in `bitmap` in rank order."""
+        count = len(index.tasks)
+        bits = bitmap.to_bytes((count + 7) // 8, "little")
+        if bin(bitmap).count("1") * self._dense_ratio > count:
+            return (p for p in index.order if bits[p >> 3] >> (p & 7) & 1)
+        positions = [i * 8 + j for i, b in enumerate(bits) if b
+                     for j in range(8) if b >> j & 1]
+        return sorted(positions, key=index.rank.__getitem__)
+
+
+def _match(index, token):
+    """Get disjoint bitmaps of tasks matching `token`.
+
+    Returns:
+        List of `(score, bitmap)` for exact, prefix and fuzzy matches.
+    """
+    exact = _union(index, [token]) if token in index.postings else 0
+
+    if token in index.prefixes:
+        prefix = index.prefixes[token]
+    else:
+        vocabulary = index.vocabulary
+        low = bisect_left(vocabulary, token)
+        high = bisect_left(vocabulary, token + "\uffff", low)
+        prefix = _union(index, vocabulary[low:high])
+    prefix &= ~exact
+
+    fuzzy = 0
+    if len(token) >= 4:
+        grams = _get_trigrams(token)
+        counts = Counter()
+        for gram in grams:
+            counts.update(index.trigrams.get(gram, ()))
+        # Allow a third of the trigrams to miss, e.g. a dropped letter
+        required = len(grams) - len(grams) // 3
+        fuzzy = _union(index, [t for t, c in counts.items()
+                               if c >= required and not t.startswith(token)])
+        fuzzy &= ~(exact | prefix)
+
+    return [(s, m) for s, m in ((_EXACT, exact), (_PREFIX, prefix),
+                                (_FUZZY, fuzzy)) if m]
+
+
+def _union(index, tokens):
+    """Get the bitmap of tasks with any of `tokens`."""
+    bitmap = 0
+    sparse = []
+    for t in tokens:
+        b = index.bitmaps.get(t)
+        if b is not None:
+            bitmap |= b
+        else:
+            sparse.extend(index.postings[t])
+    if len(sparse) > 0:
+        bitmap |= _to_bitmap(sparse, len(index.tasks))
+    return bitmap
+
+
+def _to_bitmap(positions, count):
+    bits = bytearray((count + 7) // 8)
+    for p in positions:
+        bits[p >> 3] |= 1 << (p & 7)
+    return int.from_bytes(bits, "little")
+
+
+def _tokenize(text):
+    return _TOKEN.findall(text.lower())
+
+
+def _get_trigrams(token):
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+
+def _get_text(description, tags):
+    if tags is None:
+        tags = ""
+    elif not isinstance(tags, str):
+        tags = " ".join(getattr(t, "name", str(t)) for t in tags)
+    return description + " " + tags
@@ -0,0 +1,333 @@
+# -*- coding: utf-8 -*-
+# Pomito - Pomodoro timer on steroids
+"""Multi-tenant pomodoro server.
+
+Hosts pomodoro sessions for many users in one process. Per user state is kept
+in compact `UserSession` objects; all users share one `TimerScheduler` and one
+`MessageDispatcher`. Signals are the ones sent by `pomodoro.Pomodoro` with an
+additional `user` argument.
+
+A JSON API is exposed over HTTP on localhost:
+
+    GET    /users/<user>            state of the user's timer
+    POST   /users/<user>/session    start a session, body: {"task": "..."}
+    DELETE /users/<user>/session    stop the session
+    POST   /users/<user>/break      start a break
+    DELETE /users/<user>/break      stop the break
+
+A user is known once a session or break is started, other requests return
+404 for unknown users. Starting a timer while one runs, or stopping a timer
+of the other type, returns 409.
+"""
+
+import json
+import logging
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+from pomito.main import Message, MessageDispatcher
+from pomito.pomodoro import Pomodoro, Timer, TimerChange, TimerScheduler, TimerType
+from pomito.task import Task
+
+__all__ = ["SessionManager", "SessionServer", "UserSession"]
+logger = logging.getLogger("pomito.server")
+
+
+class UserSession(object):
+    """Pomodoro state of a single user.
+
+    `timer` and `timer_type` are of the running timer, None if no timer runs.
+    """
+
+    __slots__ = ("user", "session_count", "timer", "timer_type", "task")
+
+    def __init__(self, user):
+        """Create the state for a user."""
+        self.user = user
+        self.session_count = 0
+        self.timer = None
+        self.timer_type = None
+        self.task = None
+
+    def to_dict(self):
+        """Get a json serializable representation of the state."""
+        timer, timer_type = self.timer, self.timer_type
+        running = timer is not None
+        return {"user": self.user,
+                "session_count": self.session_count,
+                "timer_type": timer_type.value if running else None,
+                "time_elapsed": timer.time_elapsed if running else 0,
+                "duration": timer.duration if running else 0,
+                "task": self.task.description if self.task else None}
+
+
+class SessionManager(object):
+    """Manages pomodoro sessions for many users.
+
+    Methods are thread safe. Timer callbacks run on the shared scheduler
+    thread and signals are queued on the shared dispatcher.
+
+    Like `Pomodoro`, stopping a timer leaves its state and sends the stop
+    signal right away; callbacks of the stopped timer are ignored, so a new
+    timer can be started at once.
+    """
+
+    def __init__(self, config, scheduler=None, message_dispatcher=None):
+        """Create a session manager.
+
+        Args:
+            config: loaded `Configuration` with durations for all users
+            scheduler: `TimerScheduler` to run the timers
+            message_dispatcher: `MessageDispatcher` for the signals
+        """
+        self._config = config
+        self._scheduler = scheduler or TimerScheduler()
+        self._message_dispatcher = message_dispatcher or MessageDispatcher()
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start dispatching signals."""
+        self._message_dispatcher.start()
+
+    def stop(self):
+        """Stop all timers and the dispatcher."""
+        self._scheduler.stop()
+        if self._message_dispatcher.is_alive():
+            self._message_dispatcher.stop()
+            self._message_dispatcher.join()
+
+    def get_session(self, user):
+        """Get the state for a user, None if the user never started a timer."""
+        with self._lock:
+            return self._sessions.get(user)
+
+    def start_session(self, user, task):
+        """Start a pomodoro session for user.
+
+        Args:
+            user: user id
+            task: Task - A task object, to be performed during this session
+
+        Raises:
+            RuntimeError: if a timer is running for user
+        """
+        if task is None:
+            raise ValueError("Cannot start a session without a valid task!")
+        duration = self._config.session_duration
+        session = self._start_timer(user, TimerType.SESSION, duration, task)
+        self._queue_signal(Pomodoro.signal_session_started, user,
+                           session_count=session.session_count,
+                           session_duration=duration,
+                           task=task)
+
+    def stop_session(self, user):
+        """Stop the pomodoro session of user.
+
+        Raises:
+            RuntimeError: if a break is running for user
+        """
+        self._stop_timer(user, (TimerType.SESSION,))
+
+    def start_break(self, user):
+        """Start a break for user. See `Pomodoro.start_break`."""
+        session = self._create_session(user)
+        if session.session_count == self._config.long_break_frequency:
+            timer_type = TimerType.LONG_BREAK
+            duration = self._config.long_break_duration
+        else:
+            timer_type = TimerType.SHORT_BREAK
+            duration = self._config.short_break_duration
+        self._start_timer(user, timer_type, duration, None)
+        self._queue_signal(Pomodoro.signal_break_started, user,
+                           break_type=timer_type,
+                           break_duration=duration)
+
+    def stop_break(self, user):
+        """Stop the break of user.
+
+        Raises:
+            RuntimeError: if a session is running for user
+        """
+        self._stop_timer(user, (TimerType.SHORT_BREAK, TimerType.LONG_BREAK))
+
+    def _create_session(self, user):
+        with self._lock:
+            session = self._sessions.get(user)
+            if session is None:
+                session = self._sessions[user] = UserSession(user)
+            return session
+
+    def _start_timer(self, user, timer_type, duration, task):
+        session = self._create_session(user)
+        with self._lock:
+            if session.timer is not None:
+                raise RuntimeError("A timer is already running for {0}."
+                                   .format(user))
+            session.timer_type = timer_type
+            session.task = task
+            timer = Timer(duration,
+                          lambda reason: self._update_state(session, timer, reason),
+                          1, self._scheduler)
+            session.timer = timer
+            timer.start()
+        return session
+
+    def _stop_timer(self, user, timer_types):
+        session = self.get_session(user)
+        if session is None:
+            return
+        with self._lock:
+            timer, timer_type = session.timer, session.timer_type
+            if timer is None:
+                return
+            if timer_type not in timer_types:
+                raise RuntimeError("A {0} is running for {1}."
+                                   .format(timer_type.value, user))
+            stopped = self._finish(session, TimerChange.INTERRUPT)
+        # The interrupt callback is delivered on the scheduler thread and
+        # ignored, don't wait for it.
+        timer.stop()
+        self._queue_stopped(*stopped)
+
+    def _finish(self, session, notify_reason):
+        """Leave the state of the running timer. Called with the lock held.
+
+        Returns:
+            Arguments for `_queue_stopped`.
+        """
+        timer_type, task = session.timer_type, session.task
+        session.timer = session.timer_type = session.task = None
+        if timer_type == TimerType.SESSION and notify_reason == TimerChange.COMPLETE:
+            session.session_count += 1
+        return session.user, timer_type, task, session.session_count, notify_reason
+
+    def _update_state(self, session, timer, notify_reason):
+        """Update state of the user. Called on the scheduler thread."""
+        # Timers stopped by stop_session or stop_break are done, ignore their
+        # callbacks
+        if notify_reason == TimerChange.INCREMENT:
+            if session.timer is timer and Pomodoro.signal_timer_increment.receivers:
+                Pomodoro.signal_timer_increment.send(timer.time_elapsed,
+                                                     user=session.user)
+            return
+
+        with self._lock:
+            if session.timer is not timer:
+                return
+            stopped = self._finish(session, notify_reason)
+        self._queue_stopped(*stopped)
+
+    def _queue_stopped(self, user, timer_type, task, session_count, notify_reason):
+        if timer_type == TimerType.SESSION:
+            self._queue_signal(Pomodoro.signal_session_stopped, user,
+                               session_count=session_count,
+                               task=task,
+                               reason=notify_reason)
+        else:
+            self._queue_signal(Pomodoro.signal_break_stopped, user,
+                               break_type=timer_type,
+                               reason=notify_reason)
+
+    def _queue_signal(self, signal, user, **kwargs):
+        if signal.receivers:
+            self._message_dispatcher.queue_message(Message(signal, user=user, **kwargs))
+
+
+class SessionRequestHandler(BaseHTTPRequestHandler):
+    """Handles the session API requests."""
+
+    _route = re.compile(r"^/users/([^/]+)(?:/(session|break))?/?$")
+
+    def do_GET(self):
+        """Get the state of a user."""
+        user, resource = self._parse_path()
+        if user is None or resource is not None:
+            return self._send(404, {"error": "Not found."})
+        session = self.server.manager.get_session(user)
+        if session is None:
+            return self._send(404, {"error": "Unknown user."})
+        self._send(200, session.to_dict())
+
+    def do_POST(self):
+        """Start a session or break."""
+        user, resource = self._parse_path()
+        if user is None or resource is None:
+            return self._send(404, {"error": "Not found."})
+        try:
+            if resource == "session":
+                body = self._read_json()
+                description = body.get("task") or "No task selected."
+                self.server.manager.start_session(user, Task(body.get("uid"), 0, 0,
+                                                             None, description))
+            else:
+                self.server.manager.start_break(user)
+        except ValueError as e:
+            return self._send(400, {"error": str(e)})
+        except RuntimeError as e:
+            return self._send(409, {"error": str(e)})
+        self._send(200, self.server.manager.get_session(user).to_dict())
+
+    def do_DELETE(self):
+        """Stop a session or break."""
+        user, resource = self._parse_path()
+        if user is None or resource is None:
+            return self._send(404, {"error": "Not found."})
+        if self.server.manager.get_session(user) is None:
+            return self._send(404, {"error": "Unknown user."})
+        try:
+            if resource == "session":
+                self.server.manager.stop_session(user)
+            else:
+                self.server.manager.stop_break(user)
+        except RuntimeError as e:
+            return self._send(409, {"error": str(e)})
+        self._send(200, {"user": user})
+
+    def log_message(self, format, *args):
+        """Log the requests to pomito logger."""
+        logger.debug(format % args)
+
+    def _parse_path(self):
+        match = self._route.match(self.path)
+        if match is None:
+            return None, None
+        return match.groups()
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length == 0:
+            return {}
+        try:
+            body = json.loads(self.rfile.read(length).decode("utf-8"))
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            raise ValueError("Invalid json in request.")
+        if not isinstance(body, dict):
+            raise ValueError("Request must be a json object.")
+        return body
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class SessionServer(ThreadingMixIn, HTTPServer):
+    """HTTP server for the session API. Listens on localhost by default."""
+
+    daemon_threads = True
+
+    def __init__(self, manager, address=("127.0.0.1", 0)):
+        """Create a server for the session manager.
+
+        Args:
+            manager: SessionManager instance
+            address: (host, port) tuple, port 0 picks a free port
+        """
+        HTTPServer.__init__(self, address, SessionRequestHandler)
+        self.manager = manager
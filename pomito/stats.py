@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+# Pomito - Pomodoro timer on steroids.
+"""Statistics over the activity log.
+
+All queries take a time range `[start, end)` of `datetime` and an optional
+peewee `database`. The activity database of the running pomito instance is
+used if `database` is not provided.
+
+Days of the range before today are read from the rollups. The partial days,
+usually just today, are read from the covering index on `ActivityModel`. See
+`pomito.hooks.activity`.
+"""
+
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+
+from peewee import SQL, fn
+
+from pomito.hooks.activity import (ActivityModel, DailyRollupModel,
+                                   TaskRollupModel)
+from pomito.pomodoro import TimerChange
+
+__all__ = ["get_sessions_per_day", "get_sessions_per_week",
+           "get_sessions_per_task", "get_interruption_rate",
+           "get_focus_histogram", "get_last_session_per_task"]
+
+_COMPLETE = TimerChange.COMPLETE.value
+_INTERRUPT = TimerChange.INTERRUPT.value
+
+
+def get_sessions_per_day(start, end, database=None):
+    """Get completed sessions for each day.
+
+    Returns:
+        List of `(date, sessions)` ordered by date. Days without a completed
+        session are not included.
+    """
+    days, ranges = _split_range(start, end)
+    sessions = Counter()
+    if days is not None:
+        day = DailyRollupModel.day
+        query = _select_rollups(DailyRollupModel, days, database, day,
+                                fn.SUM(DailyRollupModel.sessions))\
+            .group_by(day)
+        sessions.update({_parse_date(d): c for d, c in query.tuples()})
+    for raw_start, raw_end in ranges:
+        day = fn.date(ActivityModel.timestamp)
+        query = _select_sessions(raw_start, raw_end, database, day,
+                                 fn.COUNT(SQL("*")))\
+            .where(ActivityModel.reason == _COMPLETE)\
+            .group_by(day)
+        sessions.update({_parse_date(d): c for d, c in query.tuples()})
+    return sorted((d, c) for d, c in sessions.items() if c > 0)
+
+
+def get_sessions_per_week(start, end, database=None):
+    """Get completed sessions for each week.
+
+    Returns:
+        List of `(date, sessions)` ordered by date, where date is the monday
+        of the week. Weeks without a completed session are not included.
+    """
+    days, ranges = _split_range(start, end)
+    sessions = Counter()
+    if days is not None:
+        week = fn.date(DailyRollupModel.day, "-6 days", "weekday 1")
+        query = _select_rollups(DailyRollupModel, days, database, week,
+                                fn.SUM(DailyRollupModel.sessions))\
+            .group_by(week)
+        sessions.update({_parse_date(w): c for w, c in query.tuples()})
+    for raw_start, raw_end in ranges:
+        week = fn.date(ActivityModel.timestamp, "-6 days", "weekday 1")
+        query = _select_sessions(raw_start, raw_end, database, week,
+                                 fn.COUNT(SQL("*")))\
+            .where(ActivityModel.reason == _COMPLETE)\
+            .group_by(week)
+        sessions.update({_parse_date(w): c for w, c in query.tuples()})
+    return sorted((w, c) for w, c in sessions.items() if c > 0)
+
+
+def get_sessions_per_task(start, end, database=None):
+    """Get completed sessions and focused time for each task.
+
+    Returns:
+        List of `(task_uid, sessions, focused_seconds)` ordered by sessions,
+        most first. Focused time includes interrupted sessions. Sessions
+        without a task have `task_uid` as `None`.
+    """
+    days, ranges = _split_range(start, end)
+    sessions = Counter()
+    focused = Counter()
+    if days is not None:
+        task_uid = TaskRollupModel.task_uid
+        query = _select_rollups(TaskRollupModel, days, database, task_uid,
+                                fn.SUM(TaskRollupModel.sessions),
+                                fn.TOTAL(TaskRollupModel.focused_seconds))\
+            .group_by(task_uid)
+        for uid, count, seconds in query.tuples():
+            # Sessions without a task are rolled up with an empty uid
+            uid = uid or None
+            sessions[uid] += count
+            focused[uid] += seconds
+    for raw_start, raw_end in ranges:
+        task_uid = ActivityModel.task_uid
+        query = _select_sessions(raw_start, raw_end, database, task_uid,
+                                 fn.TOTAL(ActivityModel.reason == _COMPLETE),
+                                 fn.TOTAL(ActivityModel.duration))\
+            .group_by(task_uid)
+        for uid, count, seconds in query.tuples():
+            sessions[uid] += int(count)
+            focused[uid] += seconds
+    return sorted(((uid, sessions[uid], focused[uid]) for uid in focused),
+                  key=lambda t: (-t[1], t[0] or ""))
+
+
+def get_interruption_rate(start, end, database=None):
+    """Get the fraction of sessions that were interrupted.
+
+    Returns:
+        Interrupted sessions divided by all sessions, `0.0` if there are no
+        sessions.
+    """
+    days, ranges = _split_range(start, end)
+    total = interrupted = 0
+    if days is not None:
+        query = _select_rollups(
+            DailyRollupModel, days, database,
+            fn.TOTAL(DailyRollupModel.sessions +
+                     DailyRollupModel.interrupted_sessions),
+            fn.TOTAL(DailyRollupModel.interrupted_sessions))
+        total, interrupted = query.tuples().get()
+    for raw_start, raw_end in ranges:
+        query = _select_sessions(raw_start, raw_end, database,
+                                 fn.COUNT(SQL("*")),
+                                 fn.TOTAL(ActivityModel.reason == _INTERRUPT))
+        raw_total, raw_interrupted = query.tuples().get()
+        total += raw_total
+        interrupted += raw_interrupted
+    return interrupted / total if total else 0.0
+
+
+def get_focus_histogram(start, end, database=None):
+    """Get focused time for each hour of the day.
+
+    Time of a session, complete or interrupted, is counted in the hour it
+    ended. Rollups are per day, this query always reads the activity log.
+
+    Returns:
+        List of 24 focused seconds, indexed by hour of the day.
+    """
+    hour = fn.strftime("%H", ActivityModel.timestamp)
+    query = _select_sessions(start, end, database, hour,
+                             fn.TOTAL(ActivityModel.duration))\
+        .group_by(hour)
+    histogram = [0.0] * 24
+    for h, seconds in query.tuples():
+        histogram[int(h)] = seconds
+    return histogram
+
+
+def get_last_session_per_task(start, end, database=None):
+    """Get the last day with a session, complete or interrupted, for each task.
+
+    Returns:
+        List of `(task_uid, date)` ordered by date, latest first. Sessions
+        without a task are not included.
+    """
+    days, ranges = _split_range(start, end)
+    last = {}
+    if days is not None:
+        task_uid = TaskRollupModel.task_uid
+        query = _select_rollups(TaskRollupModel, days, database, task_uid,
+                                fn.MAX(TaskRollupModel.day))\
+            .where(task_uid != "")\
+            .group_by(task_uid)
+        last.update((uid, _parse_date(d)) for uid, d in query.tuples())
+    for raw_start, raw_end in ranges:
+        task_uid = ActivityModel.task_uid
+        query = _select_sessions(raw_start, raw_end, database, task_uid,
+                                 fn.MAX(fn.date(ActivityModel.timestamp)))\
+            .where(task_uid.is_null(False))\
+            .group_by(task_uid)
+        for uid, d in query.tuples():
+            d = _parse_date(d)
+            if uid not in last or last[uid] < d:
+                last[uid] = d
+    return sorted(last.items(), key=lambda t: (-t[1].toordinal(), t[0]))
+
+
+def _split_range(start, end):
+    """Split a time range into rolled up days and partial days.
+
+    Returns:
+        Tuple of `(first_day, last_day)`, range of rolled up days or `None` if
+        there are no complete days before today; and a list of `(start, end)`
+        time ranges to be read from the activity log.
+    """
+    first = datetime.combine(start.date(), time())
+    if first < start:
+        first += timedelta(days=1)
+    last = min(datetime.combine(end.date(), time()),
+               datetime.combine(date.today(), time()))
+    if first >= last:
+        return None, [(start, end)]
+    ranges = [(s, e) for s, e in ((start, first), (last, end)) if s < e]
+    return (first.date(), last.date()), ranges
+
+
+def _select_rollups(model, days, database, *columns):
+    query = model.select(*columns)\
+        .where((model.day >= days[0]) & (model.day < days[1]))
+    if database is not None:
+        query = query.bind(database)
+    return query
+
+
+def _select_sessions(start, end, database, *columns):
+    query = ActivityModel.select(*columns)\
+        .where((ActivityModel.category == "session") &
+               (ActivityModel.timestamp >= start) &
+               (ActivityModel.timestamp < end))
+    if database is not None:
+        query = query.bind(database)
+    return query
+
+
+def _parse_date(value):
+    # Values may be converted by the `timestamp` and `day` fields
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(value, "%Y-%m-%d").date()
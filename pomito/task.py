@@ -2,10 +2,24 @@
 """Task concept and routines."""
 
 import hashlib
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from itertools import accumulate, count, islice
+
+_versions = count(1)
+_version = 0
 
 
 class Task(object):
-    """A Task is an activity that the user is working on during a pomodoro session."""
+    """A Task is an activity that the user is working on during a pomodoro session.
+
+    The string form is cached, setting any field except `completed` resets it.
+    """
+
+    __slots__ = ("_uid", "_description", "_estimate", "_actual", "_tags",
+                 "completed", "_str")
 
     def __init__(self, uid, estimate, actual, tags, description):
         """Create a Task.
@@ -17,29 +31,84 @@ class Task(object):
             actual: Number of pomodoros completed
         """
         try:
-            self.uid = uid
-            self.description = description
-            self.estimate = int(estimate)
-            self.actual = int(actual)
-            self.tags = tags
+            self._uid = uid
+            self._description = description
+            self._estimate = int(estimate)
+            self._actual = int(actual)
+            self._tags = tags
             self.completed = 0  # If a task is completed, there should be no object created
+            self._str = None
         except ValueError:
             raise Exception("Attempt to parse invalid task. Task attributes: '{0}' '{1}' '{2}' '{3}' '{4}'"
                             .format(uid, description, estimate, actual, tags))
 
-        # Every task will have a unique id, which is the md5sum of description.
-        if self.uid is None:
+        return
+
+    @property
+    def uid(self):
+        """Get the unique id of the task.
+
+        Every task will have a unique id, the md5sum of description if not
+        provided. It is computed on first use.
+        """
+        if self._uid is None:
             m = hashlib.md5()
-            m.update(self.description.encode('utf-8'))
-            self.uid = m.hexdigest()
+            m.update(self._description.encode('utf-8'))
+            self._uid = m.hexdigest()
+        return self._uid
 
-        return
+    @uid.setter
+    def uid(self, value):
+        self._uid = value
+        self._changed()
+
+    @property
+    def description(self):
+        """Get the description of the task."""
+        return self._description
+
+    @description.setter
+    def description(self, value):
+        self._description = value
+        self._changed()
+
+    @property
+    def estimate(self):
+        """Get the estimated pomodoros of the task."""
+        return self._estimate
+
+    @estimate.setter
+    def estimate(self, value):
+        self._estimate = value
+        self._changed()
+
+    @property
+    def actual(self):
+        """Get the completed pomodoros of the task."""
+        return self._actual
+
+    @actual.setter
+    def actual(self, value):
+        self._actual = value
+        self._changed()
+
+    @property
+    def tags(self):
+        """Get the tags of the task."""
+        return self._tags
+
+    @tags.setter
+    def tags(self, value):
+        self._tags = value
+        self._changed()
 
     def __str__(self):
         """Get a string representation for the task."""
-        return "I:{0} | E:{1} | A:{2} | T:{3} | D:{4}"\
-            .format(self.uid, self.estimate, self.actual, self.tags,
-                    self.description)
+        if self._str is None:
+            self._str = "I:{0} | E:{1} | A:{2} | T:{3} | D:{4}"\
+                .format(self.uid, self._estimate, self._actual, self._tags,
+                        self._description)
+        return self._str
 
     def update_actual(self):
         """Update actual pomodoros for a task."""
@@ -49,11 +118,352 @@ class Task(object):
         """Update estimated pomodoros for a task."""
         self.estimate = int(new_estimate)
 
+    def _changed(self):
+        self._str = None
+        _update_version()
+
     def mark_complete(self):
         """Mark a task as complete."""
         self.completed = 1
 
 
+class TaskStore(object):
+    """A sequence of tasks stored as columns.
+
+    Columns are parallel lists of uid, estimate, actual, tags and
+    description. A `Task` is created on first access and the same object is
+    returned after; it holds the data of the task from then on. Use for
+    large task lists which are mostly not read, e.g. parsed from a file.
+    """
+
+    __slots__ = ("uids", "estimates", "actuals", "tags", "descriptions",
+                 "_tasks")
+
+    def __init__(self):
+        """Create an empty store."""
+        self.uids = []
+        self.estimates = []
+        self.actuals = []
+        self.tags = []
+        self.descriptions = []
+        self._tasks = []
+
+    @classmethod
+    def from_columns(cls, uids, estimates, actuals, tags, descriptions, copy=True):
+        """Create a store from columns of equal length.
+
+        Estimates and actuals must be `int`. Columns are copied to lists,
+        unless `copy` is False; columns used as is must support item access
+        and `len`, e.g. `StringColumn` or `array`.
+        """
+        store = cls()
+        columns = (uids, estimates, actuals, tags, descriptions)
+        if copy:
+            columns = [list(c) for c in columns]
+        store.uids, store.estimates, store.actuals, store.tags, store.descriptions = columns
+        count = len(store.uids)
+        if any(len(c) != count
+               for c in (store.estimates, store.actuals, store.tags, store.descriptions)):
+            raise ValueError("Columns must be of equal length.")
+        store._tasks = [None] * count
+        return store
+
+    def append(self, uid, estimate, actual, tags, description):
+        """Add a task."""
+        self.uids.append(uid)
+        self.estimates.append(int(estimate))
+        self.actuals.append(int(actual))
+        self.tags.append(tags)
+        self.descriptions.append(description)
+        self._tasks.append(None)
+        _update_version()
+
+    def splice(self, start, stop, store):
+        """Get a new store with the tasks from `start` to `stop` replaced.
+
+        Args:
+            start, stop: range of tasks to replace
+            store: `TaskStore` of the new tasks
+
+        Created tasks are shared with the new store, this store is unchanged.
+        """
+        spliced = TaskStore()
+        for name in ("uids", "estimates", "actuals", "tags", "descriptions", "_tasks"):
+            column = list(getattr(self, name))
+            column[start:stop] = getattr(store, name)
+            setattr(spliced, name, column)
+        return spliced
+
+    def columns(self):
+        """Get the current columns, including updates to created tasks.
+
+        Returns:
+            Tuple of lists `(uids, estimates, actuals, tags, descriptions)`.
+        """
+        columns = (list(self.uids), list(self.estimates), list(self.actuals),
+                   list(self.tags), list(self.descriptions))
+        for i, t in enumerate(self._tasks):
+            if t is not None:
+                for column, value in zip(columns, (t.uid, t.estimate, t.actual,
+                                                   t.tags, t.description)):
+                    column[i] = value
+        return columns
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self._tasks)))]
+        task = self._tasks[i]
+        if task is None:
+            task = self._tasks[i] = Task(self.uids[i], self.estimates[i],
+                                         self.actuals[i], self.tags[i],
+                                         self.descriptions[i])
+        return task
+
+    def __setitem__(self, i, task):
+        self.uids[i] = task.uid
+        self.estimates[i] = task.estimate
+        self.actuals[i] = task.actual
+        self.tags[i] = task.tags
+        self.descriptions[i] = task.description
+        self._tasks[i] = task
+        _update_version()
+
+    def __iter__(self):
+        for i, task in enumerate(self._tasks):
+            yield self[i] if task is None else task
+
+
+class StringColumn(object):
+    """Read-only sequence of strings packed in a single string.
+
+    A column of `TaskStore` which is loaded at once, e.g. from a file. The
+    strings are sliced from `text` on access, `offsets` has the start of
+    every string and the end of the last one. Empty strings are `empty`.
+    """
+
+    __slots__ = ("_text", "_offsets", "_empty")
+
+    def __init__(self, text, offsets, empty=""):
+        """Create a column of `len(offsets) - 1` strings."""
+        self._text = text
+        self._offsets = offsets
+        self._empty = empty
+
+    @classmethod
+    def pack(cls, strings, typecode="L", empty=""):
+        """Create a column of `strings`, `empty` is stored as an empty string.
+
+        Returns:
+            `StringColumn`, see `text` and `offsets` to save it.
+        """
+        strings = ["" if s == empty else s for s in strings]
+        offsets = array(typecode, [0])
+        offsets.extend(accumulate(len(s) for s in strings))
+        return cls("".join(strings), offsets, empty)
+
+    @property
+    def text(self):
+        """Get the packed strings."""
+        return self._text
+
+    @property
+    def offsets(self):
+        """Get the offsets of the strings in `text`."""
+        return self._offsets
+
+    def index(self, value):
+        """Get the position of the first string equal to `value`.
+
+        Raises:
+            ValueError: if no string is equal to `value`
+        """
+        if value == self._empty or not isinstance(value, str):
+            return list(self).index(value)
+        text, offsets = self._text, self._offsets
+        position = text.find(value)
+        while position >= 0:
+            # Match must span a whole string
+            i = bisect_right(offsets, position) - 1
+            if i < len(offsets) - 1 and offsets[i] == position and \
+                    offsets[i + 1] - position == len(value):
+                return i
+            position = text.find(value, position + 1)
+        raise ValueError("{0} is not in column".format(value))
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("column index out of range")
+        return self._text[self._offsets[i]:self._offsets[i + 1]] or self._empty
+
+    def __iter__(self):
+        text, empty = self._text, self._empty
+        start = 0
+        for end in islice(self._offsets, 1, None):
+            yield text[start:end] or empty
+            start = end
+
+
+class TaskIndex(object):
+    """Index over a list of tasks for lookup by uid prefix and text.
+
+    Uids are kept sorted for prefix lookup with bisect. String forms of the
+    tasks are split into words, an inverted index maps every word to the
+    positions of the tasks with it. A text search looks up the words of the
+    text in the index and checks the string form of the tasks found for the
+    least common word only.
+
+    `update` rebuilds the index only if the tasks changed, and formats only
+    the tasks added or changed since the last update (see `get_version`).
+    """
+
+    _word = re.compile(r"\w+")
+    _separator = "\n"
+
+    def __init__(self):
+        """Create an empty index."""
+        self._version = None
+        self._tasks = []
+        self._entries = {}
+        # tasks, string forms, postings by word, sorted words, words joined by
+        # separator, starting offsets of words, sorted uids, tasks by uid
+        self._state = ([], [], {}, [], "", [0], [], [])
+
+    def update(self, tasks):
+        """Update the index with `tasks`.
+
+        Args:
+            tasks: iterable of `Task`
+
+        Returns:
+            True if the index was rebuilt.
+        """
+        # Read first, a task changed while indexing is indexed on next update
+        version = get_version()
+        tasks = list(tasks)
+        if version == self._version and tasks == self._tasks:
+            return False
+
+        entries = self._entries
+        new_entries = {}
+        for t in tasks:
+            entry = entries.get(id(t))
+            # Cached string form is reset if the task changed
+            if entry is None or entry[0] is not t or entry[1] is not t._str:
+                text = str(t)
+                entry = (t, text, str(t.uid), tuple(set(self._word.findall(text))))
+            new_entries[id(t)] = entry
+        ordered = [new_entries[id(t)] for t in tasks]
+
+        postings = defaultdict(list)
+        for position, entry in enumerate(ordered):
+            for word in entry[3]:
+                postings[word].append(position)
+        postings = dict(postings)
+        words = sorted(postings)
+        offsets = [0]
+        offsets.extend(accumulate(len(w) + 1 for w in words))
+        by_uid = sorted(ordered, key=lambda e: e[2])
+
+        self._version = version
+        self._tasks = tasks
+        self._entries = new_entries
+        self._state = (tasks, [e[1] for e in ordered], postings, words,
+                       self._separator.join(words), offsets,
+                       [e[2] for e in by_uid], [e[0] for e in by_uid])
+        return True
+
+    def find_by_uid(self, prefix):
+        """Get tasks with uid starting with `prefix`, ordered by uid."""
+        uids, tasks = self._state[6:]
+        low = bisect_left(uids, prefix)
+        high = low
+        # Common case: unique or no match, avoid scanning
+        while high < len(uids) and uids[high].startswith(prefix):
+            high += 1
+            if high - low > 1:
+                high = bisect_right(uids, prefix + chr(0x10ffff), high)
+                break
+        return tasks[low:high]
+
+    def search(self, text):
+        """Get tasks with `text` in their string form, in index order."""
+        tasks, texts = self._state[:2]
+        candidates = None
+        for match in self._word.finditer(text):
+            # A word of the text is a whole word of the task if there are
+            # other characters on both its sides in the text
+            positions = self._find_word(match.group(), match.start() > 0,
+                                        match.end() < len(text))
+            if len(positions) == 0:
+                return []
+            if candidates is None or len(positions) < len(candidates):
+                candidates = positions
+        if candidates is None:
+            return [t for t, s in zip(tasks, texts) if text in s]
+        return [tasks[p] for p in candidates if text in texts[p]]
+
+    def _find_word(self, word, starts, ends):
+        """Get positions of the tasks with a word containing `word`.
+
+        Args:
+            starts: the word of the task must start with `word`
+            ends: the word of the task must end with `word`
+
+        Returns:
+            Sorted list of positions.
+        """
+        _, _, postings, words, joined, offsets, _, _ = self._state
+        if starts and ends:
+            return postings.get(word, [])
+
+        found = []
+        if starts:
+            low = bisect_left(words, word)
+            high = bisect_left(words, word + chr(0x10ffff), low)
+            found = words[low:high]
+        else:
+            find = joined.find
+            position = find(word)
+            while position >= 0:
+                i = bisect_right(offsets, position) - 1
+                if not ends or position + len(word) == offsets[i + 1] - 1:
+                    found.append(words[i])
+                    position = find(word, offsets[i + 1])
+                else:
+                    position = find(word, position + 1)
+
+        if len(found) == 1:
+            return postings[found[0]]
+        positions = set()
+        for w in found:
+            positions.update(postings[w])
+        return sorted(positions)
+
+
+def get_version():
+    """Get the version of the tasks.
+
+    It increases whenever a `Task` or a `TaskStore` is changed, e.g. to check
+    if indexed tasks changed.
+    """
+    return _version
+
+
+def _update_version():
+    global _version
+    _version = next(_versions)
+
+
 def get_null_task():
     """Get a null task."""
     return Task(0, 0, 0, None, "No task selected.")
@@ -2,8 +2,15 @@
 # Pomito - Pomodoro timer on steroids
 """Test doubles for pomito."""
 
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
 from unittest.mock import Mock, MagicMock
 from unittest.mock import patch
+from urllib.parse import parse_qs, urlsplit
 
 from peewee import SqliteDatabase
 
@@ -40,6 +47,7 @@ class FakeTimer:
 
     def stop(self):
         """Stop the timer."""
+        self._alive = False
         self._parent_callback(pomodoro.TimerChange.INTERRUPT)
 
     def trigger_callback(self, notify_reason):
@@ -117,6 +125,7 @@ class PomitoTestFactory:
                    "plugins": {"ui": "dummyUI", "task": "dummyTask"}}
     config_file = None
     message_dispatcher = FakeMessageDispatcher()
+    _database_counter = itertools.count()
 
     def create_fake_service(self):
         """Create a fake instance of `Pomodoro` service.
@@ -124,7 +133,7 @@ class PomitoTestFactory:
         Note: call `create_patch` before calling this method if you want to
         replace os/path calls. See tests/hooks/test_activity.py for example.
         """
-        database = SqliteDatabase(':memory:')
+        database = self.create_fake_database()
         config = self.create_fake_config()
         pomito = main.Pomito(config, database, self.message_dispatcher)
         pomito.initialize()
@@ -135,6 +144,16 @@ class PomitoTestFactory:
 
         return pomodoro.Pomodoro(pomito, create_timer=create_fake_timer)
 
+    def create_fake_database(self):
+        """Create an in-memory database.
+
+        The database is shared by connections from all threads, e.g. the
+        activity writer thread, till the connection on this thread is open.
+        """
+        name = "file:pomito-test-{0}?mode=memory&cache=shared"\
+            .format(next(self._database_counter))
+        return SqliteDatabase(name, uri=True)
+
     def create_fake_config(self):
         """Create a fake configuration instance."""
         from pomito.plugins import PLUGINS
@@ -158,3 +177,165 @@ class PomitoTestFactory:
         patcher = patch(target, new)
         patcher.start()
         testcase.addCleanup(patcher.stop)
+
+
+class FakeRemoteServer(ThreadingMixIn, HTTPServer):
+    """A local http server standing in for a remote task service.
+
+    Every request waits `latency` seconds before the response. Requested
+    paths are recorded in `requests`.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, latency=0.0):
+        """Create a server on a free localhost port."""
+        HTTPServer.__init__(self, ("127.0.0.1", 0), _FakeRemoteHandler)
+        self.latency = latency
+        self.requests = []
+        self._thread = threading.Thread(target=self.serve_forever, args=(0.05,),
+                                        daemon=True)
+
+    @property
+    def url(self):
+        """Get the base url of the server."""
+        return "http://{0}:{1}".format(*self.server_address)
+
+    def start(self):
+        """Start serving requests on a background thread."""
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the server."""
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
+
+    def get(self, path, query):
+        """Get the json response for a request.
+
+        Args:
+            path: request path
+            query: dict of query parameter to value
+
+        Returns:
+            json serializable response, `None` if path is not found.
+        """
+        raise NotImplementedError()
+
+
+class _FakeRemoteHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        self.server.requests.append(url.path)
+        time.sleep(self.server.latency)
+
+        response = self.server.get(url.path.rstrip("/"), query)
+        body = json.dumps(response).encode("utf-8")
+        self.send_response(404 if response is None else 200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeAsanaServer(FakeRemoteServer):
+    """Stand-in for the asana api with tasks in a few workspaces."""
+
+    def __init__(self, workspaces=2, tasks=10, latency=0.0, page_size=50):
+        """Create a server with `tasks` tasks in each of `workspaces`.
+
+        At most `page_size` tasks are returned per request.
+        """
+        FakeRemoteServer.__init__(self, latency)
+        self.page_size = page_size
+        self.workspaces = [{"id": w, "name": "ws{0}".format(w)}
+                           for w in range(1, workspaces + 1)]
+        self.tasks = {w["id"]: [{"id": w["id"] * 10000 + t,
+                                 "name": "ws{0} task{1}".format(w["id"], t)}
+                                for t in range(tasks)]
+                      for w in self.workspaces}
+
+    def create_client(self):
+        """Create an asana client for this server."""
+        import asana
+        return asana.Client(base_url=self.url + "/api/1.0")
+
+    def get(self, path, query):
+        """Get users/me and paginated tasks of a workspace."""
+        if path == "/api/1.0/users/me":
+            return {"data": {"id": 1, "name": "me",
+                             "workspaces": self.workspaces}}
+        if path == "/api/1.0/tasks":
+            tasks = self.tasks.get(int(query.get("workspace", 0)))
+            if tasks is None:
+                return None
+            offset = int(query.get("offset", 0))
+            limit = min(int(query.get("limit", 50)), self.page_size)
+            next_page = None
+            if offset + limit < len(tasks):
+                next_page = {"offset": str(offset + limit)}
+            return {"data": tasks[offset:offset + limit],
+                    "next_page": next_page}
+        return None
+
+
+class FakeTrelloServer(FakeRemoteServer):
+    """Stand-in for the trello api with boards, lists and cards."""
+
+    def __init__(self, boards=2, lists=2, cards=10, latency=0.0):
+        """Create a server with `cards` cards in each list of each board."""
+        FakeRemoteServer.__init__(self, latency)
+        self.boards = [{"id": "b{0}".format(b), "name": "board{0}".format(b),
+                        "closed": False, "url": ""} for b in range(boards)]
+        self.lists = {b["id"]: [{"id": "{0}l{1}".format(b["id"], i),
+                                 "name": "list{0}".format(i),
+                                 "closed": False, "pos": i}
+                                for i in range(lists)]
+                      for b in self.boards}
+        self.cards = {board_list["id"]: [self._create_card(b, board_list, c) for c in range(cards)]
+                      for b in self.boards for board_list in self.lists[b["id"]]}
+
+    def create_client(self):
+        """Create a trello client for this server."""
+        import requests
+        from trello import TrelloClient
+
+        base_url = self.url
+
+        class _HTTPService(object):
+            def request(self, method, url, **kwargs):
+                url = url.replace("https://api.trello.com", base_url)
+                return requests.request(method, url, **kwargs)
+
+        client = TrelloClient(api_key="key", api_secret="secret")
+        client.http_service = _HTTPService()
+        return client
+
+    def get(self, path, query):
+        """Get boards, lists of a board and cards of a list."""
+        parts = path.split("/")
+        if path == "/1/members/me/boards":
+            return self.boards
+        if len(parts) == 5 and parts[2] == "boards" and parts[4] == "lists":
+            return self.lists.get(parts[3])
+        if len(parts) == 5 and parts[2] == "lists" and parts[4] == "cards":
+            return self.cards.get(parts[3])
+        return None
+
+    @staticmethod
+    def _create_card(board, trello_list, index):
+        return {"id": "{0}c{1}".format(trello_list["id"], index),
+                "name": "{0} {1} card{2}".format(board["name"],
+                                                 trello_list["name"], index),
+                "dueComplete": False, "closed": False, "url": "",
+                "pos": index, "shortUrl": "", "idMembers": [], "idLabels": [],
+                "idBoard": board["id"], "idList": trello_list["id"],
+                "idShort": index, "badges": {"checkItems": 0},
+                "idChecklists": [], "labels": [],
+                "dateLastActivity": "2020-01-01T00:00:00.000Z"}
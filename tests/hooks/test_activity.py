@@ -1,9 +1,21 @@
 # -*- coding: utf-8 -*-
 """Tests for the Activity hook."""
 
+import os
+import tempfile
+import threading
+import time
 import unittest
+from datetime import datetime
+from unittest.mock import Mock, patch
 
-from pomito.hooks.activity import ActivityHook, ActivityModel
+import pytest
+from peewee import SqliteDatabase
+
+from pomito.hooks.activity import (ActivityHook, ActivityModel,
+                                   DailyRollupModel, TaskRollupModel,
+                                   database_proxy, migrate_activities,
+                                   rebuild_rollups)
 from pomito.test import PomitoTestFactory
 
 
@@ -17,8 +29,11 @@ class ActivityHookTests(unittest.TestCase):
         self.database = self.pomodoro_service.get_db()
 
     def tearDown(self):
-        ActivityModel.drop_table(True)
         self.activityhook.close()
+        self.pomodoro_service._pomito_instance.exit()
+        ActivityModel.drop_table(True)
+        DailyRollupModel.drop_table(True)
+        TaskRollupModel.drop_table(True)
 
     def test_initialize_sets_activity_db(self):
         count = ActivityModel.select().count()
@@ -50,24 +65,127 @@ class ActivityHookTests(unittest.TestCase):
         test_task = self._create_task(100, 'session_start_task')
         self.pomodoro_service.start_session(test_task)
         self.pomodoro_service.stop_session()
+        self.activityhook.flush()
 
-        activities = ActivityModel.get(ActivityModel.category == 'session')
-        assert activities is not None
+        activity = ActivityModel.get(ActivityModel.category == 'session')
+        assert activity.task_uid == '100'
+        assert activity.session_count == 0
+        assert activity.reason == 'interrupt'
+        assert activity.started_at <= activity.timestamp
+        assert activity.duration >= 0
 
     def test_log_handles_break_stop_event(self):
         self.pomodoro_service.start_break()
         self.pomodoro_service.stop_break()
+        self.activityhook.flush()
 
         self._dump_activity_model()
-        activities = ActivityModel.get(ActivityModel.category == 'break')
-        assert activities is not None
+        activity = ActivityModel.get(ActivityModel.category == 'break')
+        assert activity.break_type == 'short_break'
+        assert activity.reason == 'interrupt'
 
     def test_log_handles_interruption_stop_event(self):
         self.pomodoro_service.start_interruption(None, False, False)
         self.pomodoro_service.stop_interruption()
+        self.activityhook.flush()
 
         act = ActivityModel.get(ActivityModel.category == 'interruption')
-        assert act is not None
+        assert act.duration == 0.1
+
+    def test_log_writes_activities_after_flush_interval(self):
+        activityhook = ActivityHook(self.pomodoro_service, flush_interval=0.05)
+        activityhook.initialize()
+
+        activityhook.log("session", reason="dummy")
+        time.sleep(0.2)
+
+        assert ActivityModel.select().where(ActivityModel.reason == "dummy").count() == 1
+        activityhook.close()
+
+    def test_log_writes_a_full_batch_in_one_transaction(self):
+        activityhook = ActivityHook(self.pomodoro_service, batch_size=3,
+                                    flush_interval=60)
+        activityhook.initialize()
+        database = self.pomodoro_service.get_db()
+
+        with patch.object(database, "atomic", wraps=database.atomic) as atomic:
+            for i in range(3):
+                activityhook.log("session", reason="dummy")
+            activityhook.flush()
+
+        assert atomic.call_count == 1
+        assert ActivityModel.select().where(ActivityModel.reason == "dummy").count() == 3
+        activityhook.close()
+
+    def test_close_writes_pending_activities(self):
+        activityhook = ActivityHook(self.pomodoro_service, flush_interval=60)
+        activityhook.initialize()
+
+        activityhook.log("session", reason="dummy")
+        activityhook.close()
+
+        assert ActivityModel.select().where(ActivityModel.reason == "dummy").count() == 1
+
+    def test_flush_retries_a_failed_batch(self):
+        activityhook = ActivityHook(self.pomodoro_service, flush_interval=60)
+        activityhook.initialize()
+        ActivityModel.drop_table()
+
+        activityhook.log("session", reason="dummy")
+        with self.assertLogs("pomito.hooks.activity", "ERROR"):
+            activityhook.flush()
+        ActivityModel.create_table()
+        activityhook.flush()
+
+        assert ActivityModel.select().where(ActivityModel.reason == "dummy").count() == 1
+        activityhook.close()
+
+    def test_close_does_not_throw_without_initialize(self):
+        activityhook = ActivityHook(self.pomodoro_service)
+
+        activityhook.close()
+
+    def test_log_updates_rollups(self):
+        self.activityhook.log("session", duration=1500, task_uid="t1",
+                              reason="complete")
+        self.activityhook.log("session", duration=1500, task_uid="t1",
+                              reason="complete")
+        self.activityhook.log("session", duration=300, reason="interrupt")
+        self.activityhook.log("break", duration=300, reason="complete")
+        self.activityhook.flush()
+        self.activityhook.log("interruption", duration=60)
+        self.activityhook.flush()
+
+        daily = self._dump_rollups()
+        assert daily[0] == [(datetime.now().date(), 2, 1, 1, 1, 3300.0)]
+        assert daily[1] == [(datetime.now().date(), "", 0, 1, 300.0),
+                            (datetime.now().date(), "t1", 2, 0, 3000.0)]
+        rebuild_rollups(self.database)
+        assert self._dump_rollups() == daily
+
+    def test_initialize_rebuilds_missing_rollups(self):
+        self.activityhook.log("session", duration=1500, reason="complete")
+        self.activityhook.close()
+        DailyRollupModel.drop_table()
+        TaskRollupModel.drop_table()
+        self.activityhook = ActivityHook(self.pomodoro_service)
+
+        self.activityhook.initialize()
+
+        assert DailyRollupModel.get().sessions == 1
+        assert TaskRollupModel.get().sessions == 1
+
+    def _dump_rollups(self):
+        daily = DailyRollupModel.select(
+            DailyRollupModel.day, DailyRollupModel.sessions,
+            DailyRollupModel.interrupted_sessions, DailyRollupModel.breaks,
+            DailyRollupModel.interruptions, DailyRollupModel.focused_seconds)
+        tasks = TaskRollupModel.select(
+            TaskRollupModel.day, TaskRollupModel.task_uid,
+            TaskRollupModel.sessions, TaskRollupModel.interrupted_sessions,
+            TaskRollupModel.focused_seconds)\
+            .order_by(TaskRollupModel.task_uid)
+        return list(daily.tuples()), list(tasks.tuples())
 
     def _create_task(self, uid, description):
         from pomito.task import Task
@@ -77,10 +195,127 @@ class ActivityHookTests(unittest.TestCase):
 
     def _dump_activity_model(self):
         for activity in ActivityModel.select():
-            print("{0};{1};{2}".format(activity.timestamp, activity.category,
-                                       activity.data))
+            print("{0};{1};{2};{3}".format(activity.timestamp, activity.category,
+                                           activity.reason, activity.duration))
 
     def _receivers(self, signal, count):
         from blinker.base import ANY
 
         return sum(1 for r in signal.receivers_for(ANY)) == count
+
+
+LEGACY_ROWS = [
+    ("session", "session_count=1;task=I:123 | E:2 | A:4 | T:None | D:a;b=c;"
+                "reason=TimerChange.COMPLETE"),
+    ("break", "break_type=TimerType.LONG_BREAK;reason=TimerChange.INTERRUPT"),
+    ("interruption", "duration=42"),
+    ("session", "session_count=0;task=None;reason=TimerChange.INTERRUPT"),
+]
+
+
+def _create_legacy_database(rows):
+    database = SqliteDatabase(":memory:")
+    database.execute_sql("CREATE TABLE activitymodel (id INTEGER NOT NULL PRIMARY KEY, "
+                         "timestamp DATETIME NOT NULL, category VARCHAR(255) NOT NULL, "
+                         "data TEXT NOT NULL)")
+    database.execute_sql("CREATE INDEX activitymodel_category ON activitymodel (category)")
+    database.cursor().executemany("INSERT INTO activitymodel (timestamp, category, data) "
+                                  "VALUES ('2020-01-01 10:00:00.000000', ?, ?)", rows)
+    database_proxy.initialize(database)
+    return database
+
+
+def test_migrate_activities_parses_legacy_data():
+    database = _create_legacy_database(LEGACY_ROWS)
+
+    migrate_activities(database)
+
+    activities = list(ActivityModel.select().order_by(ActivityModel.id))
+    assert [(a.session_count, a.task_uid, a.reason) for a in activities if
+            a.category == "session"] == [(1, "123", "complete"), (0, None, "interrupt")]
+    assert (activities[1].break_type, activities[1].reason) == ("long_break", "interrupt")
+    assert activities[2].duration == 42
+    assert activities[0].data == LEGACY_ROWS[0][1]
+    assert activities[0].timestamp == datetime(2020, 1, 1, 10)
+    database.close()
+
+
+def test_migrate_activities_is_noop_for_new_schema():
+    database = _create_legacy_database([])
+    migrate_activities(database)
+    ActivityModel.create(timestamp=datetime.now(), category="session", reason="complete")
+
+    migrate_activities(database)
+
+    assert ActivityModel.select().count() == 1
+    database.close()
+
+
+@pytest.mark.perf
+def test_migrate_activities_benchmark():
+    rows = 1000000
+    with tempfile.TemporaryDirectory() as tmpdir:
+        database = SqliteDatabase(os.path.join(tmpdir, "pomito.db"))
+        database.execute_sql("CREATE TABLE activitymodel (id INTEGER NOT NULL PRIMARY KEY, "
+                             "timestamp DATETIME NOT NULL, category VARCHAR(255) NOT NULL, "
+                             "data TEXT NOT NULL)")
+        with database.atomic():
+            database.cursor().executemany(
+                "INSERT INTO activitymodel (timestamp, category, data) "
+                "VALUES ('2020-01-01 10:00:00.000000', ?, ?)",
+                (LEGACY_ROWS[i % len(LEGACY_ROWS)] for i in range(rows)))
+        database_proxy.initialize(database)
+
+        time_start = time.perf_counter()
+        migrate_activities(database)
+        time_total = time.perf_counter() - time_start
+
+        count = ActivityModel.select().where(ActivityModel.reason.is_null(False)).count()
+        database.close()
+
+    print("\nmigrated {0} rows in {1:.2f}s, rows/sec = {2:.0f}"
+          .format(rows, time_total, rows / time_total))
+    assert count == rows * 3 / 4
+
+
+@pytest.mark.perf
+@pytest.mark.parametrize("writer", ["synchronous", "batched"])
+def test_activity_writer_throughput(writer):
+    events = 5000
+    with tempfile.TemporaryDirectory() as tmpdir:
+        database = SqliteDatabase(os.path.join(tmpdir, "pomito.db"))
+        service = Mock()
+        service.get_db.return_value = database
+        hook = ActivityHook(service)
+        hook.initialize()
+        if writer == "synchronous":
+            # Previous behavior: a transaction per event on the caller thread
+            def log(category, **kwargs):
+                ActivityModel.create(timestamp=datetime.now(),
+                                     category=category, **kwargs)
+            hook.log = log
+
+        latencies = []
+
+        def dispatch():
+            for i in range(events):
+                time_start = time.perf_counter()
+                hook.log("session", session_count=i)
+                latencies.append(time.perf_counter() - time_start)
+
+        time_start = time.perf_counter()
+        dispatcher = threading.Thread(target=dispatch)
+        dispatcher.start()
+        dispatcher.join()
+        hook.close()
+        time_total = time.perf_counter() - time_start
+
+        count = ActivityModel.select().count()
+        database.close()
+
+    latencies.sort()
+    print("\n{0}: events/sec = {1:.0f}, dispatcher latency p50 = {2:.1f}us, "
+          "p99 = {3:.1f}us".format(writer, events / time_total,
+                                   latencies[len(latencies) // 2] * 1e6,
+                                   latencies[int(len(latencies) * 0.99)] * 1e6))
+    assert count == events
@@ -1,12 +1,14 @@
 # -*- coding: utf-8 -*-
 """Tests for asana task plugin."""
 
+import time
 import unittest
 import asana
+import pytest
 from unittest.mock import Mock, MagicMock
 
 from pomito.plugins.task.asana import AsanaTask
-from pomito.test import PomitoTestFactory
+from pomito.test import FakeAsanaServer, PomitoTestFactory
 
 
 class AsanaTests(unittest.TestCase):
@@ -121,3 +123,99 @@ class AsanaTests(unittest.TestCase):
     def _setup_tasks(self, tasks):
         self.asana_api.tasks = MagicMock(asana.resources.tasks.Tasks)
         self.asana_api.tasks.find_all.return_value = tasks
+
+
+@pytest.fixture
+def asana_server():
+    server = FakeAsanaServer(workspaces=4, tasks=30, latency=0.01,
+                             page_size=10).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def create_asana():
+    services = []
+
+    def _create_asana(asana_server, max_workers=None):
+        test_factory = PomitoTestFactory()
+        test_factory.config_data = dict(PomitoTestFactory.config_data)
+        test_factory.config_data["task.asana"] = {"api_key": "dummy_key"}
+        if max_workers is not None:
+            test_factory.config_data["task.asana"]["max_workers"] = max_workers
+        pomodoro_service = test_factory.create_fake_service()
+        services.append(pomodoro_service)
+
+        asana = AsanaTask(pomodoro_service,
+                          lambda api_key: asana_server.create_client())
+        asana.initialize()
+        return asana
+
+    yield _create_asana
+    for s in services:
+        s._pomito_instance.exit()
+
+
+def test_get_tasks_fetches_all_pages_of_all_workspaces(create_asana, asana_server):
+    asana = create_asana(asana_server)
+
+    tasks = list(asana.get_tasks())
+
+    assert sorted(t.uid for t in tasks) == \
+        sorted(t["id"] for ts in asana_server.tasks.values() for t in ts)
+
+
+def test_get_tasks_fetches_workspaces_concurrently(create_asana, asana_server):
+    asana_server.latency = 0.1
+    asana = create_asana(asana_server)
+
+    start = time.perf_counter()
+    next(asana.get_tasks())
+    elapsed = time.perf_counter() - start
+
+    # users.me and first page of the workspaces
+    assert elapsed < 0.1 * 4
+
+
+def test_initialize_reads_max_workers_from_config(create_asana, asana_server):
+    asana = create_asana(asana_server, "2")
+
+    assert asana.max_workers == 2
+
+
+def test_get_tasks_stops_fetching_if_caller_stops_reading(create_asana, asana_server):
+    asana = create_asana(asana_server, "1")
+
+    tasks = asana.get_tasks()
+    next(tasks)
+    tasks.close()
+    requests = len(asana_server.requests)
+    time.sleep(0.05)
+
+    # users.me, first workspace's first page and maybe its next page
+    assert requests <= 3
+    assert len(asana_server.requests) == requests
+
+
+@pytest.mark.perf
+def test_get_tasks_benchmark(create_asana):
+    server = FakeAsanaServer(workspaces=12, tasks=100, latency=0.05,
+                             page_size=50).start()
+    try:
+        results = {}
+        for workers in ("1", "8"):
+            asana = create_asana(server, workers)
+            start = time.perf_counter()
+            tasks = asana.get_tasks()
+            next(tasks)
+            first = time.perf_counter() - start
+            count = 1 + len(list(tasks))
+            results[workers] = (first, time.perf_counter() - start)
+            assert count == 1200
+    finally:
+        server.stop()
+
+    print("\n12 workspaces, 50ms latency: " + ", ".join(
+        "{0} workers: first = {1:.0f}ms, all = {2:.0f}ms".format(
+            w, r[0] * 1000, r[1] * 1000) for w, r in results.items()))
+    assert results["8"][1] * 3 < results["1"][1]
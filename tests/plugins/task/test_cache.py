@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+"""Tests for the task cache of remote plugins."""
+
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from pomito.plugins.task import TaskPlugin
+from pomito.plugins.task.asana import AsanaTask
+from pomito.plugins.task.cache import (CachedTaskPlugin, TaskCacheModel,
+                                       TaskCacheStateModel)
+from pomito.plugins.task.trello import TrelloTask
+from pomito.task import Task
+from pomito.test import FakeAsanaServer, FakeTrelloServer, PomitoTestFactory
+
+
+class CountingTaskPlugin(TaskPlugin):
+    """Task plugin which counts the fetches."""
+
+    def __init__(self, tasks):
+        self.tasks = tasks
+        self.fetches = 0
+
+    def initialize(self):
+        pass
+
+    def get_tasks(self):
+        self.fetches += 1
+        yield from list(self.tasks)
+
+
+@pytest.fixture
+def test_factory():
+    test_factory = PomitoTestFactory()
+    test_factory.config_data = dict(PomitoTestFactory.config_data)
+    return test_factory
+
+
+@pytest.fixture
+def pomodoro_service(test_factory):
+    pomodoro_service = test_factory.create_fake_service()
+    yield pomodoro_service
+    pomodoro_service._pomito_instance.exit()
+
+
+@pytest.fixture
+def remote():
+    return CountingTaskPlugin([Task(uid="t{0}".format(i), estimate=0, actual=0,
+                                    tags=["a"], description="task {0}".format(i))
+                               for i in range(10)])
+
+
+def _create_cache(plugin, pomodoro_service, section="task.remote"):
+    cache = CachedTaskPlugin(plugin, pomodoro_service, section)
+    cache.initialize()
+    return cache
+
+
+def _expire(cache):
+    cache._fetched_at = datetime.now() - timedelta(days=1)
+
+
+def test_get_tasks_fetches_once_and_serves_from_memory(pomodoro_service, remote):
+    cache = _create_cache(remote, pomodoro_service)
+
+    first = list(cache.get_tasks())
+    second = list(cache.get_tasks())
+
+    assert remote.fetches == 1
+    assert [t.uid for t in first] == [t.uid for t in second] == \
+        ["t{0}".format(i) for i in range(10)]
+
+
+def test_get_task_by_id_does_not_fetch_again(pomodoro_service, remote):
+    cache = _create_cache(remote, pomodoro_service)
+    cache.get_tasks()
+
+    task = cache.get_task_by_id("t3")
+
+    assert task.description == "task 3"
+    assert remote.fetches == 1
+
+
+def test_get_tasks_returns_cached_tasks_and_refreshes_stale_cache(pomodoro_service,
+                                                                  remote):
+    cache = _create_cache(remote, pomodoro_service)
+    cache.get_tasks()
+    remote.tasks = remote.tasks[:2]
+    _expire(cache)
+
+    stale = list(cache.get_tasks())
+    cache._refresh_thread.join()
+
+    assert len(stale) == 10
+    assert remote.fetches == 2
+    assert len(list(cache.get_tasks())) == 2
+    assert not cache.is_stale()
+
+
+def test_initialize_loads_persisted_tasks(pomodoro_service, remote):
+    _create_cache(remote, pomodoro_service).get_tasks()
+
+    other = CountingTaskPlugin([])
+    cache = _create_cache(other, pomodoro_service)
+    tasks = list(cache.get_tasks())
+
+    assert other.fetches == 0
+    assert [(t.uid, t.tags, t.description) for t in tasks] == \
+        [(t.uid, t.tags, t.description) for t in remote.tasks]
+
+
+def test_initialize_refreshes_stale_persisted_tasks(pomodoro_service, remote):
+    cache = _create_cache(remote, pomodoro_service)
+    cache.get_tasks()
+    TaskCacheStateModel.update(fetched_at=datetime.now() - timedelta(days=1))\
+        .execute()
+
+    cache = _create_cache(remote, pomodoro_service)
+    cache._refresh_thread.join()
+
+    assert remote.fetches == 2
+
+
+def test_caches_are_separate_per_section(pomodoro_service, remote):
+    _create_cache(remote, pomodoro_service, "task.one").get_tasks()
+
+    other = CountingTaskPlugin([Task("x", 0, 0, None, "x")])
+    tasks = list(_create_cache(other, pomodoro_service, "task.two").get_tasks())
+
+    assert [t.uid for t in tasks] == ["x"]
+    assert TaskCacheModel.select().where(TaskCacheModel.plugin == "task.one")\
+        .count() == 10
+
+
+def test_refresh_does_not_rewrite_unchanged_tasks(pomodoro_service, remote):
+    cache = _create_cache(remote, pomodoro_service)
+    cache.get_tasks()
+    ids = [t.id for t in TaskCacheModel.select()]
+
+    changed = cache.refresh()
+
+    assert not changed
+    assert [t.id for t in TaskCacheModel.select()] == ids
+
+
+def test_refresh_rewrites_changed_tasks(pomodoro_service, remote):
+    cache = _create_cache(remote, pomodoro_service)
+    cache.get_tasks()
+    remote.tasks = remote.tasks[5:]
+
+    changed = cache.refresh()
+
+    assert changed
+    assert [t.uid for t in TaskCacheModel.select()
+            .order_by(TaskCacheModel.position)] == \
+        ["t{0}".format(i) for i in range(5, 10)]
+
+
+def test_refresh_async_runs_one_refresh_at_a_time(pomodoro_service):
+    class SlowTaskPlugin(CountingTaskPlugin):
+        def get_tasks(self):
+            time.sleep(0.1)
+            return super().get_tasks()
+
+    slow = SlowTaskPlugin([])
+    cache = _create_cache(slow, pomodoro_service)
+
+    threads = {cache.refresh_async() for _ in range(5)}
+    for t in threads:
+        t.join()
+
+    assert len(threads) == 1
+    assert slow.fetches == 1
+
+
+def test_close_waits_for_refresh_and_closes_plugin(pomodoro_service):
+    class SlowTaskPlugin(CountingTaskPlugin):
+        closed = False
+
+        def get_tasks(self):
+            time.sleep(0.1)
+            return super().get_tasks()
+
+        def close(self):
+            self.closed = True
+
+    slow = SlowTaskPlugin([])
+    cache = _create_cache(slow, pomodoro_service)
+    thread = cache.refresh_async()
+
+    cache.close()
+
+    assert not thread.is_alive()
+    assert slow.closed
+    assert cache.refresh_async() is None
+
+
+def test_initialize_reads_ttl_from_config(test_factory, remote):
+    test_factory.config_data["task.remote"] = {"cache_ttl": "0"}
+    pomodoro_service = test_factory.create_fake_service()
+    try:
+        cache = _create_cache(remote, pomodoro_service)
+        cache.get_tasks()
+        time.sleep(0.01)
+
+        assert cache.is_stale()
+    finally:
+        pomodoro_service._pomito_instance.exit()
+
+
+def test_get_tasks_does_not_throw_for_refresh_errors(pomodoro_service):
+    class FailingTaskPlugin(CountingTaskPlugin):
+        def get_tasks(self):
+            raise IOError("offline")
+
+    cache = _create_cache(FailingTaskPlugin([]), pomodoro_service)
+    _expire(cache)
+
+    assert list(cache.get_tasks()) == []
+    cache.refresh_async().join()
+
+
+@pytest.fixture
+def asana_server():
+    server = FakeAsanaServer(workspaces=2, tasks=120, latency=0.01).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def trello_server():
+    server = FakeTrelloServer(boards=2, lists=2, cards=10, latency=0.01).start()
+    yield server
+    server.stop()
+
+
+def test_asana_tasks_are_served_from_cache(pomodoro_service, asana_server):
+    asana = AsanaTask(pomodoro_service, lambda api_key: asana_server.create_client())
+    cache = _create_cache(asana, pomodoro_service, "task.asana")
+
+    tasks = list(cache.get_tasks())
+    requests = len(asana_server.requests)
+    task = cache.get_task_by_id(20119)
+
+    assert len(tasks) == 240
+    assert task.description == "ws2 task119"
+    assert len(asana_server.requests) == requests
+
+
+def test_trello_tasks_are_served_from_cache(pomodoro_service, trello_server):
+    trello = TrelloTask(pomodoro_service,
+                        lambda key, secret: trello_server.create_client())
+    cache = _create_cache(trello, pomodoro_service, "task.trello")
+
+    tasks = list(cache.get_tasks())
+    requests = len(trello_server.requests)
+    reloaded = _create_cache(trello, pomodoro_service, "task.trello")
+
+    assert len(tasks) == 40
+    assert [t.uid for t in reloaded.get_tasks()] == [t.uid for t in tasks]
+    assert len(trello_server.requests) == requests
+
+
+@pytest.mark.perf
+def test_cached_get_task_by_id_benchmark(pomodoro_service):
+    server = FakeAsanaServer(workspaces=4, tasks=250, latency=0.02).start()
+    try:
+        asana = AsanaTask(pomodoro_service, lambda api_key: server.create_client())
+        asana.initialize()
+        cache = _create_cache(asana, pomodoro_service, "task.asana")
+        cache.get_tasks()
+        uid = 4 * 10000 + 249
+
+        start = time.perf_counter()
+        assert asana.get_task_by_id(uid) is not None
+        uncached = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(100):
+            assert cache.get_task_by_id(uid) is not None
+        cached = (time.perf_counter() - start) / 100
+    finally:
+        server.stop()
+
+    print("\nget_task_by_id for 1000 tasks: uncached = {0:.1f}ms, "
+          "cached = {1:.2f}ms".format(uncached * 1000, cached * 1000))
+    assert cached * 10 < uncached
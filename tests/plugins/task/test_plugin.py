@@ -1,9 +1,12 @@
 # -*- coding: utf-8 -*-
 """Tests for the TaskPlugin."""
 
+import time
 import unittest
 from unittest.mock import MagicMock
 
+import pytest
+
 from pomito import task
 from pomito.test import FakeTaskPlugin
 
@@ -55,3 +58,80 @@ class TaskPluginTests(unittest.TestCase):
 
     def test_get_task_by_id_throws_if_multiple_tasks_match_idish(self):
         self.assertRaises(ValueError, self.taskPlugin.get_task_by_id, 1009)
+
+    def test_get_tasks_by_filter_returns_tasks_matching_filter(self):
+        tasks = list(self.taskPlugin.get_tasks_by_filter("1"))
+
+        assert tasks == [self.task_list[1], self.task_list[10],
+                         self.task_list[11]]
+
+    def test_get_task_by_id_uses_updated_tasks(self):
+        plugin = FakeTaskPlugin()
+        plugin.task_list = self.task_list[:2]
+        assert plugin.get_task_by_id(100992) == self.task_list[1]
+
+        plugin.task_list = self.task_list[2:]
+
+        assert plugin.get_task_by_id(100992) is None
+        assert plugin.get_task_by_id(101002) == self.task_list[2]
+
+    def test_get_tasks_by_filter_uses_tasks_replaced_in_place(self):
+        plugin = FakeTaskPlugin()
+        plugin.task_list = [task.Task(1, 1, 0, None, "apple"),
+                            task.Task(2, 1, 0, None, "pear")]
+        assert list(plugin.get_tasks_by_filter("apple")) == [plugin.task_list[0]]
+
+        plugin.task_list[0] = task.Task(3, 1, 0, None, "plum")
+
+        assert list(plugin.get_tasks_by_filter("apple")) == []
+        assert list(plugin.get_tasks_by_filter("plum")) == [plugin.task_list[0]]
+        assert plugin.get_task_by_id(3) is plugin.task_list[0]
+
+
+def _create_tasks(count):
+    return [task.Task("{0:08x}".format(i * 7919), i % 5, 0, "tag{0}".format(i % 50),
+                      "task {0} for project {1}".format(i, i % 300))
+            for i in range(count)]
+
+
+def _scan_by_id(tasks, task_id):
+    """Lookup by scanning all tasks, as earlier versions of TaskPlugin did."""
+    return [t for t in tasks if str(t.uid).startswith(task_id)]
+
+
+def _scan_by_filter(tasks, task_filter):
+    return [t for t in tasks if task_filter in str(t)]
+
+
+@pytest.mark.perf
+def test_task_lookup_benchmark():
+    plugin = FakeTaskPlugin()
+    plugin.task_list = _create_tasks(100000)
+    queries = ["project 29", "task 99999 ", "tag4", "nomatch"]
+
+    start = time.perf_counter()
+    plugin.get_task_by_id("none")
+    build = time.perf_counter() - start
+
+    def measure(fn, *args):
+        start = time.perf_counter()
+        for _ in range(10):
+            result = fn(*args)
+        return (time.perf_counter() - start) / 10, result
+
+    uid = plugin.task_list[-1].uid
+    indexed_id, found = measure(plugin.get_task_by_id, uid)
+    scan_id, _ = measure(_scan_by_id, plugin.task_list, uid)
+    assert found is plugin.task_list[-1]
+
+    print("\n100k tasks: index build = {0:.0f}ms".format(build * 1000))
+    print("  get_task_by_id: indexed = {0:.2f}ms, scan = {1:.1f}ms"
+          .format(indexed_id * 1000, scan_id * 1000))
+    for q in queries:
+        indexed, result = measure(lambda: list(plugin.get_tasks_by_filter(q)))
+        scan, expected = measure(_scan_by_filter, plugin.task_list, q)
+        assert result == expected
+        print("  filter {0!r}: {1} tasks, indexed = {2:.2f}ms, scan = {3:.1f}ms"
+              .format(q, len(result), indexed * 1000, scan * 1000))
+        assert indexed < scan
+    assert indexed_id * 10 < scan_id
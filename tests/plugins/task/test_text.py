@@ -0,0 +1,477 @@
+# -*- coding: utf-8 -*-
+"""Tests for the text task plugin."""
+
+import logging
+import os
+import time
+import tracemalloc
+
+import pytest
+
+from pomito import main
+from pomito.plugins.task import TaskPlugin
+from pomito.plugins.task import text as text_plugin
+from pomito.plugins.task.text import (TaskJournal, TaskSnapshot, TextTask, parse_tasks,
+                                      read_tasks)
+from pomito.pomodoro import TimerChange
+from pomito.task import Task
+from pomito.test import PomitoTestFactory
+
+SAMPLE_TODO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..",
+                           "..", "docs", "sample_todo.txt")
+
+
+@pytest.fixture
+def task_file(tmpdir):
+    return str(tmpdir.join("todo.txt"))
+
+
+@pytest.fixture
+def data_dir(tmpdir, monkeypatch):
+    path = str(tmpdir.join("data"))
+    monkeypatch.setattr(main, "DATA_DIR", path)
+    return path
+
+
+@pytest.fixture
+def create_text(task_file, data_dir):
+    services = []
+    texts = []
+
+    def create(**options):
+        test_factory = PomitoTestFactory()
+        test_factory.config_data = dict(PomitoTestFactory.config_data)
+        test_factory.config_data["task.text"] = dict(options, file=task_file)
+        services.append(test_factory.create_fake_service())
+        texts.append(TextTask(services[-1]))
+        texts[-1].initialize()
+        return texts[-1]
+    yield create
+    for t in texts:
+        t.close()
+    for s in services:
+        s._pomito_instance.exit()
+
+
+def _write(path, lines):
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def _read(path):
+    with open(path) as f:
+        return f.read().splitlines()
+
+
+def _replace(path, lines):
+    # Write a new file and rename it over the original, like most editors
+    _write(path + ".new", lines)
+    os.replace(path + ".new", path)
+
+
+def _fields(tasks):
+    return [(t.uid, t.estimate, t.actual) for t in tasks]
+
+
+def test_text_task_is_a_task_plugin():
+    assert issubclass(TextTask, TaskPlugin)
+
+
+def test_parse_task_returns_fields():
+    fields = TextTask._parse_task("I:123 | E:2 | A:4 | T:t1,t2, t3 | D:One task\n")
+
+    assert fields == ("123", 2, 4, "t1,t2, t3", "One task")
+
+
+def test_parse_task_ignores_completed_field():
+    fields = TextTask._parse_task("I:127 | E:2 | A:4 | C:1 | T:t1 | D:Done\n")
+
+    assert fields == ("127", 2, 4, "t1", "Done")
+
+
+def test_parse_task_keeps_punctuation_in_description():
+    fields = TextTask._parse_task("I:1 | E:1 | A:0 | T: | D:Fix #12, then ship | v2.\n")
+
+    assert fields == ("1", 1, 0, "", "Fix #12, then ship | v2.")
+
+
+def test_parse_task_returns_none_for_malformed_line():
+    assert TextTask._parse_task("I:1 | E:one | A:0 | T: | D:x") is None
+    assert TextTask._parse_task("just a note") is None
+
+
+def test_parse_tasks_uses_md5_uid_for_missing_id():
+    task = next(parse_tasks(["I: | E:1 | A:0 | T: | D:A Simple Task"]))
+
+    assert task.uid == "192eb3491d0dac0498d6efdc594337c0"
+
+
+def test_parse_tasks_skips_comments_and_blank_lines():
+    tasks = list(parse_tasks(["-- comment", "", "   ",
+                              "I:1 | E:1 | A:0 | T: | D:one"]))
+
+    assert [t.uid for t in tasks] == ["1"]
+
+
+def test_parse_tasks_reports_malformed_lines_with_line_number(caplog):
+    lines = ["I:1 | E:1 | A:0 | T: | D:one", "I:2 | E:x | A:0 | T: | D:two",
+             "I:3 | E:3 | A:0 | T: | D:three"]
+
+    with caplog.at_level(logging.WARNING, logger="pomito.plugins.task.text"):
+        tasks = list(parse_tasks(lines, "todo.txt"))
+
+    assert [t.uid for t in tasks] == ["1", "3"]
+    assert "todo.txt:2" in caplog.text
+
+
+def test_read_tasks_reads_lazily(task_file):
+    _write(task_file, ["I:{0} | E:1 | A:0 | T: | D:task {0}".format(i)
+                       for i in range(3)])
+
+    tasks = read_tasks(task_file)
+    first = next(tasks)
+    tasks.close()
+
+    assert isinstance(first, Task)
+    assert first.description == "task 0"
+
+
+def test_read_tasks_parses_sample_todo():
+    tasks = list(read_tasks(SAMPLE_TODO))
+
+    assert [t.uid for t in tasks] == ["123", "124", "126", "125", "125", "127", "128"]
+    assert tasks[5].description == ""
+    assert tasks[3].description.endswith("appropriately")
+
+
+def test_initialize_reads_tasks_from_file(create_text, task_file):
+    _write(task_file, ["-- tasks", "I:1 | E:2 | A:1 | T:a | D:one",
+                       "broken", "I:2 | E:3 | A:0 | T:b | D:two"])
+
+    text = create_text()
+    tasks = list(text.get_tasks())
+
+    assert [(t.uid, t.estimate, t.actual, t.tags, t.description) for t in tasks] == \
+        [("1", 2, 1, "a", "one"), ("2", 3, 0, "b", "two")]
+    assert text.get_task_by_id("2") is tasks[1]
+
+
+def test_initialize_does_not_throw_for_missing_file(create_text):
+    text = create_text()
+
+    assert len(text.get_tasks()) == 0
+
+
+def test_update_actual_is_kept_on_restart(create_text, task_file):
+    _write(task_file, ["I:1 | E:2 | A:1 | T:a | D:one", "I:2 | E:3 | A:0 | T:b | D:two"])
+    text = create_text()
+
+    text.update_actual(text.get_task_by_id("2"))
+    text.update_actual(text.get_task_by_id("2"))
+    text.update_estimate(text.get_task_by_id("1"), 5)
+
+    assert _fields(create_text().get_tasks()) == [("1", 5, 1), ("2", 3, 2)]
+    assert _read(task_file)[0] == "I:1 | E:2 | A:1 | T:a | D:one"
+
+
+def test_filter_returns_tasks_updated_since_last_filter(create_text, task_file):
+    _write(task_file, ["I:1 | E:2 | A:0 | T:a | D:one", "I:2 | E:3 | A:0 | T:b | D:two"])
+    text = create_text()
+    assert len(list(text.get_tasks_by_filter("A:0"))) == 2
+
+    text.update_actual(text.get_task_by_id("2"))
+
+    assert _fields(text.get_tasks_by_filter("A:1")) == [("2", 3, 1)]
+    assert _fields(text.get_tasks_by_filter("A:0")) == [("1", 2, 0)]
+
+
+def test_completed_session_updates_actual(create_text, task_file):
+    _write(task_file, ["I:1 | E:2 | A:1 | T:a | D:one"])
+    text = create_text()
+    task = text.get_task_by_id("1")
+
+    for reason in (TimerChange.COMPLETE, TimerChange.INTERRUPT):
+        text._pomodoro_service.signal_session_stopped.send(
+            None, session_count=1, task=task, reason=reason)
+
+    assert task.actual == 2
+    assert _fields(create_text().get_tasks()) == [("1", 2, 2)]
+
+
+def test_update_actual_of_task_without_id_is_kept_on_restart(create_text, task_file):
+    _write(task_file, ["I: | E:2 | A:1 | T: | D:A Simple Task"])
+
+    create_text().update_actual(next(iter(create_text().get_tasks())))
+
+    assert _fields(create_text().get_tasks()) == \
+        [("192eb3491d0dac0498d6efdc594337c0", 2, 2)]
+
+
+def test_journal_is_compacted_into_task_file(create_text, task_file):
+    _write(task_file, ["-- tasks", "I:1 | E:2 | A:1 | C:0 | T:a | D:one, big",
+                       "broken", "I:2 | E:3 | A:0 | T:b | D:two"])
+    text = create_text(journal_size="2")
+
+    for uid in ("1", "2", "1"):
+        text.update_actual(text.get_task_by_id(uid))
+
+    assert _read(task_file) == ["-- journal: 3", "-- tasks",
+                                "I:1 | E:2 | A:3 | C:0 | T:a | D:one, big",
+                                "broken", "I:2 | E:3 | A:1 | T:b | D:two"]
+    assert _read(task_file + ".journal") == []
+    assert _fields(create_text().get_tasks()) == [("1", 2, 3), ("2", 3, 1)]
+
+
+def test_replay_skips_entries_written_to_task_file(create_text, task_file):
+    _write(task_file, ["-- journal: 2", "I:1 | E:2 | A:3 | T:a | D:one"])
+    # Journal wasn't cleared after compaction, and a session was recorded
+    _write(task_file + ".journal", ["1 0 1 1", "2 0 1 1", "3 0 1 1"])
+
+    text = create_text()
+    text.update_actual(text.get_task_by_id("1"))
+
+    assert _fields(create_text().get_tasks()) == [("1", 2, 5)]
+    assert _read(task_file + ".journal")[-1] == "4 0 1 1"
+
+
+def test_journal_replay_skips_malformed_entries(tmpdir):
+    path = str(tmpdir.join("todo.txt.journal"))
+    with open(path, "w") as f:
+        f.write("1 0 1 a b\nbad entry\n2 1 0 c\n3 0 1 c")
+
+    journal = TaskJournal(path)
+    changes = journal.replay()
+
+    assert changes == {"a b": [0, 1], "c": [1, 0]}
+    assert (journal.sequence, journal.size) == (2, 2)
+
+
+def test_reload_parses_changed_lines(create_text, task_file):
+    _write(task_file, ["I:1 | E:2 | A:1 | T:a | D:one", "I:2 | E:3 | A:0 | T:b | D:two",
+                       "I:3 | E:1 | A:0 | T:c | D:three"])
+    text = create_text(watch="false")
+    one, two, three = text.get_tasks()
+
+    _write(task_file, ["I:1 | E:2 | A:1 | T:a | D:one", "I:2 | E:4 | A:0 | T:b | D:two",
+                       "-- later", "I:4 | E:1 | A:0 | T:d | D:four"])
+    added, removed, changed = text.reload()
+
+    assert _fields(text.get_tasks()) == [("1", 2, 1), ("2", 4, 0), ("4", 1, 0)]
+    assert text.get_tasks()[0] is one
+    assert _fields(added) == [("4", 1, 0)]
+    assert removed == [three]
+    assert [(old, new.estimate) for old, new in changed] == [(two, 4)]
+    assert text.get_task_by_id("4") is added[0]
+
+
+def test_reload_sends_tasks_changed(create_text, task_file):
+    _write(task_file, ["I:1 | E:2 | A:1 | T:a | D:one"])
+    text = create_text(watch="false")
+    calls = []
+
+    def on_tasks_changed(sender, **kwargs):
+        calls.append(kwargs)
+    text._pomodoro_service.signal_tasks_changed.connect(on_tasks_changed)
+    try:
+        text.reload()
+        _write(task_file, ["I:1 | E:2 | A:1 | T:a | D:one", "I:2 | E:1 | A:0 | T: | D:two"])
+        text.reload()
+    finally:
+        text._pomodoro_service.signal_tasks_changed.disconnect(on_tasks_changed)
+
+    assert len(calls) == 1
+    assert _fields(calls[0]["added"]) == [("2", 1, 0)]
+    assert calls[0]["removed"] == calls[0]["changed"] == []
+
+
+def test_reload_applies_journal_changes(create_text, task_file):
+    _write(task_file, ["I:1 | E:2 | A:1 | T:a | D:one", "I:2 | E:3 | A:0 | T:b | D:two"])
+    text = create_text(watch="false")
+    text.update_actual(text.get_task_by_id("2"))
+
+    _write(task_file, ["I:1 | E:2 | A:1 | T:a | D:one", "I:2 | E:3 | A:4 | T:b | D:2"])
+    _, _, changed = text.reload()
+
+    assert [(new.actual, new.description) for _, new in changed] == [(5, "2")]
+    assert _fields(create_text(watch="false").get_tasks()) == [("1", 2, 1), ("2", 3, 5)]
+
+
+def test_reload_after_compaction_has_no_changes(create_text, task_file):
+    _write(task_file, ["I:1 | E:2 | A:1 | T:a | D:one", "I:2 | E:3 | A:0 | T:b | D:two"])
+    text = create_text(journal_size="0", watch="false")
+    tasks = list(text.get_tasks())
+
+    text.update_actual(tasks[1])
+
+    assert _read(task_file)[0] == "-- journal: 1"
+    assert text.reload() == ([], [], [])
+    assert list(text.get_tasks()) == tasks
+
+
+def test_file_changes_are_reloaded(create_text, task_file):
+    _write(task_file, ["I:1 | E:2 | A:1 | T:a | D:one"])
+    text = create_text()
+
+    _replace(task_file, ["I:1 | E:2 | A:1 | T:a | D:one", "I:2 | E:3 | A:0 | T:b | D:two"])
+    deadline = time.time() + 5
+    while len(text.get_tasks()) < 2 and time.time() < deadline:
+        time.sleep(0.01)
+
+    assert _fields(text.get_tasks()) == [("1", 2, 1), ("2", 3, 0)]
+
+
+def _fail_parse(file_path):
+    raise AssertionError("Parsed {0}".format(file_path))
+
+
+def test_snapshot_is_loaded_for_unchanged_file(create_text, task_file, monkeypatch):
+    _write(task_file, ["-- journal: 2", "I:1 | E:2 | A:1 | T:a | D:one",
+                       "I: | E:3 | A:0 | T: | D:A Simple Task"])
+    _write(task_file + ".journal", ["2 0 1 1", "3 0 1 1", "4 1 0 192eb3491d0dac0498d6efdc594337c0"])
+    create_text()
+
+    monkeypatch.setattr(text_plugin, "_read_file", _fail_parse)
+    tasks = create_text().get_tasks()
+
+    assert [(t.uid, t.estimate, t.actual, t.tags, t.description) for t in tasks] == \
+        [("1", 2, 2, "a", "one"),
+         ("192eb3491d0dac0498d6efdc594337c0", 4, 0, "", "A Simple Task")]
+
+
+def test_snapshot_is_not_loaded_for_changed_contents(create_text, task_file):
+    _write(task_file, ["I:1 | E:2 | A:1 | T:a | D:one"])
+    create_text()
+    stat = os.stat(task_file)
+
+    # Same size and modification time
+    _write(task_file, ["I:1 | E:2 | A:1 | T:a | D:two"])
+    os.utime(task_file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    assert [t.description for t in create_text().get_tasks()] == ["two"]
+
+
+def test_snapshot_is_not_saved_if_off(create_text, task_file, data_dir):
+    _write(task_file, ["I:1 | E:2 | A:1 | T:a | D:one"])
+
+    create_text(snapshot="false")
+
+    assert not os.path.exists(TaskSnapshot(os.path.join(data_dir, "snapshots"),
+                                           task_file).path)
+
+
+def test_reload_after_snapshot_load(create_text, task_file):
+    _write(task_file, ["I:1 | E:2 | A:1 | T:a | D:one", "I:2 | E:3 | A:0 | T:b | D:two"])
+    create_text()
+    text = create_text(watch="false")
+
+    _write(task_file, ["I:1 | E:2 | A:1 | T:a | D:one", "I:2 | E:5 | A:0 | T:b | D:two"])
+    _, _, changed = text.reload()
+
+    assert [(old.estimate, new.estimate) for old, new in changed] == [(3, 5)]
+    assert _fields(text.get_tasks()) == [("1", 2, 1), ("2", 5, 0)]
+
+
+@pytest.mark.perf
+def test_snapshot_benchmark(create_text, task_file):
+    count = 1000000
+    with open(task_file, "w") as f:
+        for i in range(count):
+            f.write("I:{0} | E:4 | A:{1} | T:work, home | D:Task number {0}, "
+                    "some details.\n".format(i, i % 5))
+    start = time.perf_counter()
+    parsed = create_text(watch="false")
+    parsing = time.perf_counter() - start
+
+    text = TextTask(parsed._pomodoro_service)
+    start = time.perf_counter()
+    text.initialize()
+    loading = time.perf_counter() - start
+
+    print("\n1M lines: snapshot = {0:.0f}ms, parse and save = {1:.0f}ms"
+          .format(loading * 1000, parsing * 1000))
+    assert len(text.get_tasks()) == count
+    assert text.get_tasks()[count - 1].description == "Task number 999999, some details."
+    assert loading * 10 < parsing
+
+
+@pytest.mark.perf
+def test_reload_benchmark(create_text, task_file):
+    count = 1000000
+    lines = ["I:{0} | E:4 | A:{1} | T:work, home | D:Task number {0}, "
+             "some details.".format(i, i % 5) for i in range(count)]
+    _write(task_file, lines)
+    start = time.perf_counter()
+    text = create_text(watch="false")
+    loading = time.perf_counter() - start
+
+    lines[count // 2] = "I:edited | E:1 | A:0 | T: | D:Edited task"
+    _write(task_file, lines)
+    start = time.perf_counter()
+    added, removed, _ = text.reload()
+    reloading = time.perf_counter() - start
+
+    print("\n1M lines, one line edit: reload = {0:.0f}ms, "
+          "initialize = {1:.0f}ms".format(reloading * 1000, loading * 1000))
+    assert _fields(added) == [("edited", 1, 0)]
+    assert len(removed) == 1 and len(text.get_tasks()) == count
+    assert reloading * 5 < loading
+
+
+@pytest.mark.perf
+def test_journal_sessions_benchmark(create_text, task_file):
+    lines = 500000
+    sessions = 5000
+    with open(task_file, "w") as f:
+        for i in range(lines):
+            f.write("I:{0} | E:4 | A:0 | T:work | D:Task number {0}\n".format(i))
+    text = create_text()
+    tasks = text.get_tasks()
+
+    start = time.perf_counter()
+    for i in range(sessions):
+        text.update_actual(tasks[i * 97 % lines])
+    journaled = time.perf_counter() - start
+
+    # Rewriting the task file for every session, the task is in the middle
+    text.compact()
+    start = time.perf_counter()
+    text.update_actual(tasks[lines // 2])
+    text.compact()
+    rewrite = time.perf_counter() - start
+
+    print("\n500k lines: journal = {0:.0f} sessions/s (compacted every {1}), "
+          "rewrite = {2:.1f} sessions/s".format(sessions / journaled,
+                                                text.default_journal_size,
+                                                1 / rewrite))
+    assert sessions / journaled > 10 / rewrite
+    assert _fields(create_text().get_tasks()[:1]) == [("0", 4, 1)]
+
+
+@pytest.mark.perf
+def test_parse_benchmark(create_text, task_file):
+    count = 1000000
+    with open(task_file, "w") as f:
+        for i in range(count):
+            f.write("I:{0} | E:4 | A:{1} | T:work, home | D:Task number {0}, "
+                    "some details.\n".format(i, i % 5))
+    start = time.perf_counter()
+    streamed = sum(1 for _ in read_tasks(task_file))
+    streaming = time.perf_counter() - start
+    start = time.perf_counter()
+    text = create_text()
+    loading = time.perf_counter() - start
+
+    tracemalloc.start()
+    try:
+        for _ in read_tasks(task_file):
+            pass
+        _, streaming_peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    print("\n1M lines: stream = {0:.0f} lines/s, peak {1:.2f}MB; "
+          "initialize = {2:.0f} lines/s".format(count / streaming,
+                                                streaming_peak / 2 ** 20,
+                                                count / loading))
+    assert streamed == len(text.get_tasks()) == count
+    assert streaming_peak < 2 ** 20
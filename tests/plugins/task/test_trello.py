@@ -3,6 +3,7 @@
 
 import logging
 import os
+import time
 import pytest
 
 from trello import TrelloClient
@@ -10,7 +11,7 @@ from unittest.mock import MagicMock
 
 from pomito.pomodoro import Pomodoro
 from pomito.plugins.task.trello import TrelloTask
-from pomito.test import PomitoTestFactory
+from pomito.test import FakeTrelloServer, PomitoTestFactory
 
 
 @pytest.fixture(scope="module")
@@ -86,3 +87,132 @@ def test_get_tasks_returns_tasks_for_board_and_list(trello_api):
     t = list(trello.get_tasks())
 
     assert len(t) == 2
+
+
+@pytest.fixture
+def trello_server():
+    server = FakeTrelloServer(boards=3, lists=3, cards=5).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def create_trello():
+    services = []
+
+    def _create_trello(trello_server, **config):
+        test_factory = PomitoTestFactory()
+        test_factory.config_data = dict(PomitoTestFactory.config_data)
+        test_factory.config_data["task.trello"] = dict(
+            {"api_key": "a", "api_secret": "a"}, **config)
+        pomodoro_service = test_factory.create_fake_service()
+        services.append(pomodoro_service)
+
+        trello = TrelloTask(pomodoro_service,
+                            lambda key, secret: trello_server.create_client())
+        trello.initialize()
+        return trello
+
+    yield _create_trello
+    for s in services:
+        s._pomito_instance.exit()
+
+
+def _get_tasks(trello, trello_server):
+    del trello_server.requests[:]
+    return sorted(t.description for t in trello.get_tasks())
+
+
+def test_get_tasks_resolves_board_and_list_once(create_trello, trello_server):
+    trello = create_trello(trello_server, board="board1", list="list2")
+
+    first = _get_tasks(trello, trello_server)
+    first_requests = list(trello_server.requests)
+    second = _get_tasks(trello, trello_server)
+
+    assert first == second == ["board1 list2 card{0}".format(i) for i in range(5)]
+    assert first_requests == ["/1/members/me/boards/", "/1/boards/b1/lists",
+                              "/1/lists/b1l2/cards"]
+    assert trello_server.requests == ["/1/lists/b1l2/cards"]
+
+
+def test_get_tasks_fetches_configured_list_id_directly(create_trello,
+                                                       trello_server):
+    trello = create_trello(trello_server, list_id="b2l0")
+
+    tasks = _get_tasks(trello, trello_server)
+
+    assert tasks == ["board2 list0 card{0}".format(i) for i in range(5)]
+    assert trello_server.requests == ["/1/lists/b2l0/cards"]
+
+
+def test_get_tasks_fetches_lists_of_configured_board_id(create_trello,
+                                                        trello_server):
+    trello = create_trello(trello_server, board_id="b0", list="list1")
+
+    tasks = _get_tasks(trello, trello_server)
+
+    assert tasks == ["board0 list1 card{0}".format(i) for i in range(5)]
+    assert trello_server.requests == ["/1/boards/b0/lists", "/1/lists/b0l1/cards"]
+
+
+def test_get_tasks_fetches_all_boards_and_lists(create_trello, trello_server):
+    trello = create_trello(trello_server)
+
+    tasks = _get_tasks(trello, trello_server)
+
+    assert len(tasks) == 3 * 3 * 5
+    assert len(trello_server.requests) == 1 + 3 + 3 * 3
+
+
+def test_get_tasks_resolves_lists_again_after_error(create_trello, trello_server):
+    trello = create_trello(trello_server, board="board1", list="list2")
+    _get_tasks(trello, trello_server)
+
+    # Recreate the list with a new id
+    board_lists = trello_server.lists["b1"]
+    board_lists[2] = dict(board_lists[2], id="b1l2new")
+    trello_server.cards["b1l2new"] = trello_server.cards.pop("b1l2")
+    with pytest.raises(Exception):
+        _get_tasks(trello, trello_server)
+
+    assert len(_get_tasks(trello, trello_server)) == 5
+
+
+def test_get_tasks_fetches_lists_concurrently(create_trello):
+    server = FakeTrelloServer(boards=2, lists=4, cards=1, latency=0.1).start()
+    try:
+        trello = create_trello(server)
+
+        start = time.perf_counter()
+        _get_tasks(trello, server)
+        elapsed = time.perf_counter() - start
+    finally:
+        server.stop()
+
+    # boards, then lists of boards, then cards of lists; 11 requests serially
+    assert elapsed < 0.1 * 6
+
+
+@pytest.mark.perf
+def test_get_tasks_benchmark(create_trello):
+    server = FakeTrelloServer(boards=4, lists=5, cards=20, latency=0.05).start()
+    try:
+        results = {}
+        for workers in ("1", "8"):
+            trello = create_trello(server, max_workers=workers)
+            for call in ("first", "second"):
+                start = time.perf_counter()
+                tasks = _get_tasks(trello, server)
+                results[workers, call] = (time.perf_counter() - start,
+                                          len(server.requests))
+                assert len(tasks) == 4 * 5 * 20
+    finally:
+        server.stop()
+
+    print("\n4 boards, 20 lists, 50ms latency:")
+    for (workers, call), (elapsed, requests) in sorted(results.items()):
+        print("  {0} workers, {1} call: {2:.0f}ms, {3} requests".format(
+            workers, call, elapsed * 1000, requests))
+    assert results["8", "first"][0] * 3 < results["1", "first"][0]
+    assert results["8", "second"][1] == 20
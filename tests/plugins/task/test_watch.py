@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""Tests for the file watcher of task plugins."""
+
+import os
+import threading
+
+import pytest
+
+from pomito.plugins.task.watch import FileWatcher
+
+
+@pytest.fixture(params=[True, False], ids=["inotify", "poll"])
+def watch(request, tmpdir):
+    path = str(tmpdir.join("todo.txt"))
+    _write(path, "one\n")
+    watchers = []
+
+    def create():
+        changed = threading.Event()
+        watcher = FileWatcher(path, changed.set, interval=0.01,
+                              use_inotify=request.param)
+        watchers.append(watcher.start())
+        return watcher, changed
+    create.path = path
+    yield create
+    for w in watchers:
+        w.stop()
+
+
+def _write(path, text):
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def test_watcher_calls_back_on_write(watch):
+    _, changed = watch()
+
+    _write(watch.path, "one\ntwo\n")
+
+    assert changed.wait(5)
+
+
+def test_watcher_calls_back_on_rename(watch):
+    _, changed = watch()
+
+    _write(watch.path + ".new", "two\n")
+    os.replace(watch.path + ".new", watch.path)
+
+    assert changed.wait(5)
+
+
+def test_watcher_ignores_other_files(watch):
+    _, changed = watch()
+
+    _write(watch.path + ".journal", "1 0 1 a\n")
+
+    assert not changed.wait(0.2)
+
+
+def test_watcher_does_not_call_back_after_stop(watch):
+    watcher, changed = watch()
+
+    watcher.stop()
+    _write(watch.path, "two\n")
+
+    assert not changed.wait(0.2)
+
+
+def _open_fds():
+    return set(os.listdir("/proc/self/fd"))
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self/fd"), reason="needs /proc")
+def test_watcher_does_not_open_files_till_start(tmpdir):
+    fds = _open_fds()
+
+    FileWatcher(str(tmpdir.join("todo.txt")), lambda: None)
+
+    assert _open_fds() == fds
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self/fd"), reason="needs /proc")
+def test_watcher_closes_files_when_stopped_from_callback(tmpdir):
+    path = str(tmpdir.join("todo.txt"))
+    _write(path, "one\n")
+    fds = _open_fds()
+    stopped = threading.Event()
+
+    def stop():
+        watcher.stop()
+        stopped.set()
+    watcher = FileWatcher(path, stop, interval=0.01).start()
+    _write(path, "one\ntwo\n")
+
+    assert stopped.wait(5)
+    watcher._thread.join(5)
+    assert _open_fds() == fds
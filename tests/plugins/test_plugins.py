@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""Tests for the plugin registry."""
+
+import os
+import re
+import subprocess
+import sys
+from unittest.mock import Mock
+
+import pytest
+
+from pomito import plugins
+from pomito.plugins import PluginFactory
+from pomito.plugins.task import TaskPlugin
+from pomito.plugins.task.nulltask import NullTask
+from pomito.plugins.ui import UIPlugin
+
+
+@pytest.fixture
+def registry():
+    saved = plugins.PLUGINS.copy()
+    plugins.PLUGINS.clear()
+    plugins.initialize(Mock())
+    yield plugins.PLUGINS
+    plugins.PLUGINS.clear()
+    plugins.PLUGINS.update(saved)
+
+
+def test_initialize_registers_default_plugins_without_creating(registry):
+    names = ["console", "asana", "rtm", "text", "trello", "nulltask"]
+
+    assert all(isinstance(registry[n], PluginFactory) for n in names)
+
+
+def test_get_plugin_creates_plugin_once(registry):
+    plugin = plugins.get_plugin("nulltask")
+
+    assert isinstance(plugin, NullTask)
+    assert plugins.get_plugin("nulltask") is plugin
+    assert registry["nulltask"] is plugin
+
+
+def test_get_plugin_returns_registered_instance(registry):
+    registry["dummyUI"] = Mock(spec=UIPlugin)
+
+    assert plugins.get_plugin("dummyUI") is registry["dummyUI"]
+
+
+def test_get_plugins_by_kind_does_not_create_other_plugins(registry):
+    registry["missing"] = PluginFactory("pomito.plugins.missing", "Missing", "ui")
+    registry["dummyTask"] = Mock(spec=TaskPlugin)
+
+    task_plugins = plugins.get_plugins("task")
+
+    assert set(task_plugins) == {"asana", "rtm", "text", "trello", "nulltask",
+                                 "dummyTask"}
+    assert isinstance(registry["missing"], PluginFactory)
+    assert isinstance(registry["console"], PluginFactory)
+
+
+def test_get_plugin_wraps_remote_task_plugins_in_cache(registry):
+    from pomito.plugins.task.cache import CachedTaskPlugin
+    from pomito.plugins.task.trello import TrelloTask
+
+    plugin = plugins.get_plugin("trello")
+
+    assert isinstance(plugin, CachedTaskPlugin)
+    assert isinstance(plugin.plugin, TrelloTask)
+
+
+def _import_time(code):
+    """Get total import time in microseconds for `code`."""
+    env = dict(os.environ, POMITO_TEST="1")
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                         env=env, stderr=subprocess.PIPE, check=True,
+                         universal_newlines=True).stderr
+    # Columns: self time | cumulative time | module; top level imports only
+    top_level = re.findall(r"^import time:\s+\d+ \|\s+(\d+) \| (\S.*)$", out,
+                           re.MULTILINE)
+    return sum(int(t) for t, _ in top_level)
+
+
+@pytest.mark.perf
+def test_plugin_import_time_benchmark():
+    lazy = ("from pomito import plugins; plugins.initialize(object()); "
+            "plugins.get_plugin('console'); plugins.get_plugin('text')")
+    # Earlier versions imported every plugin module on initialize
+    eager = lazy + ("; [plugins.get_plugin(n) for n in list(plugins.PLUGINS) "
+                    "if plugins.PLUGINS[n] is not None]")
+
+    lazy_times = [_import_time(lazy) for _ in range(5)]
+    eager_times = [_import_time(eager) for _ in range(5)]
+
+    print("\nconsole + text: lazy = {0:.1f}ms, eager = {1:.1f}ms"
+          .format(min(lazy_times) / 1000, min(eager_times) / 1000))
+    assert min(lazy_times) < min(eager_times)
@@ -2,7 +2,7 @@
 """Tests for console user interface."""
 
 import unittest
-from unittest.mock import Mock, MagicMock
+from unittest.mock import Mock, MagicMock, patch
 
 from click.testing import CliRunner
 
@@ -103,6 +103,7 @@ class ConsoleTests(unittest.TestCase):
     def test_stop_stops_a_pomodoro_session(self):
         self.pomodoro_service.signal_session_stopped\
             .connect(self.dummy_callback, weak=False)
+        self.pomodoro_service.start_session(self.task_list[0])
 
         out = self._invoke_command("stop")
 
@@ -115,6 +116,13 @@ class ConsoleTests(unittest.TestCase):
     def test_stop_shows_message_if_no_active_session(self):
         pass
 
+    def test_rebuild_rebuilds_activity_rollups(self):
+        with patch("pomito.plugins.ui.console.rebuild_rollups") as rebuild:
+            out = self._invoke_command("rebuild")
+
+        assert out.exit_code == 0
+        rebuild.assert_called_once_with(self.pomodoro_service.get_db())
+
     def test_quit_should_return_exit_code_one(self):
         out = self._invoke_command("quit")
 
@@ -1,22 +1,37 @@
 # -*- coding: utf-8 -*-
 """Tests for task widget."""
 
+import shutil
+from datetime import date, datetime
+
 import pytest
+from PyQt5 import QtCore
 
+from pomito import main
+from pomito.hooks.activity import ActivityModel
 from pomito.plugins.ui.qt.task_widget import TaskWindow
+from pomito.task import Task
 from pomito.test import PomitoTestFactory
 
 
 @pytest.fixture(scope="function")
-def task_window(qtbot):
+def task_window(qtbot, tmpdir, monkeypatch):
+    # Sessions and snapshots of the text plugin are written next to the task
+    # file and to the data directory
+    monkeypatch.setattr(main, "DATA_DIR", str(tmpdir.join("data")))
+    task_file = str(tmpdir.join("tasks.txt"))
+    shutil.copy("tests/data/tasks.txt", task_file)
     factory = PomitoTestFactory()
     factory.config_file = "tests/data/config.ini"
-    factory.config_data["plugins"]["task"] = "text"
+    factory.config_data = dict(PomitoTestFactory.config_data,
+                               plugins={"ui": "dummyUI", "task": "text"})
+    factory.config_data["task.text"] = {"file": task_file}
 
     pomodoro_service = factory.create_fake_service()
     task_window = TaskWindow(pomodoro_service)
     qtbot.addWidget(task_window)
-    return task_window
+    yield task_window
+    pomodoro_service._pomito_instance.exit()
 
 
 @pytest.mark.integration
@@ -28,3 +43,60 @@ def test_task_widget_lists_tasks(qtbot, task_window):
 
     qtbot.waitUntil(tasks_loaded, timeout=10000)
     assert task_window.list_task.model().rowCount(0) == 7
+
+
+def test_apply_task_filter_shows_best_matches_first(task_window):
+    tasks = [Task("a1", 1, 1, None, "Review report draft"),
+             Task("b2", 2, 0, None, "Reporting pipeline"),
+             Task("c3", 2, 1, None, "Write report")]
+    task_window._search.update(tasks)
+
+    task_window._apply_task_filter("report")
+
+    model = task_window.list_task.model()
+    rows = [model.data(model.index(i), QtCore.Qt.DisplayRole).uid
+            for i in range(model.rowCount(0))]
+    assert rows == ["c3", "a1", "b2"]
+
+
+def test_task_model_fetches_tasks_in_batches():
+    model = TaskWindow.TaskModel()
+    tasks = [Task(i, 1, 0, None, "task {0}".format(i)) for i in range(120)]
+
+    model.setTasks(iter(tasks))
+    rows = [model.rowCount(0)]
+    while model.canFetchMore(QtCore.QModelIndex()):
+        model.fetchMore(QtCore.QModelIndex())
+        rows.append(model.rowCount(0))
+
+    assert rows == [50, 100, 120]
+    assert model._tasks == tasks
+
+
+def test_get_last_used_reads_sessions_of_tasks(task_window):
+    ActivityModel.insert(timestamp=datetime.now(), category="session",
+                         reason="complete", duration=1500.0,
+                         task_uid="t1").execute()
+
+    assert task_window._get_last_used() == {"t1": date.today()}
+
+
+def test_task_model_applies_changes():
+    model = TaskWindow.TaskModel()
+    tasks = [Task(i, 1, 0, None, "task {0}".format(i)) for i in range(3)]
+    model.setTasks(tasks)
+    new = Task(1, 2, 0, None, "task 1")
+
+    model.applyChanges([tasks[2]], [(tasks[1], new)])
+
+    assert model._tasks == [tasks[0], new]
+
+
+def test_tasks_changed_signal_updates_model(qtbot, task_window):
+    tasks = [Task(i, 1, 0, None, "task {0}".format(i)) for i in range(3)]
+    task_window._taskmodel.setTasks(tasks)
+
+    task_window._service.notify_tasks_changed([], [tasks[0]], [])
+
+    qtbot.waitUntil(lambda: task_window._taskmodel.rowCount(0) == 2)
+    assert task_window._taskmodel._tasks == tasks[1:]
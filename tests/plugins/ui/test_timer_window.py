@@ -14,7 +14,8 @@ def timer_window(qtbot):
     pomodoro_service = factory.create_fake_service()
     timer = TimerWindow(pomodoro_service, FakeKeyBinder())
     qtbot.addWidget(timer)
-    return timer
+    yield timer
+    pomodoro_service._pomito_instance.exit()
 
 
 @pytest.mark.integration
@@ -24,3 +25,12 @@ def test_timer_window_pomodoro_session(qtbot, timer_window):
 
     # assert task_window.list_task is not None
     pass
+
+
+def test_timer_window_handles_service_signals_on_ui_thread(qtbot, timer_window):
+    timer_window._service.start_break()
+
+    assert timer_window._session_active is False
+    qtbot.waitUntil(lambda: timer_window._session_active, timeout=1000)
+    assert timer_window._session_duration == 120
+    timer_window._service.stop_break()
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""Tests for Qt utilities."""
+
+import threading
+import time
+
+import blinker
+import pytest
+
+from pomito.plugins.ui.qt.utils import SignalBridge
+from pomito.test import PomitoTestFactory
+
+
+@pytest.fixture
+def pomodoro_service():
+    pomodoro_service = PomitoTestFactory().create_fake_service()
+    yield pomodoro_service
+    pomodoro_service._pomito_instance.exit()
+
+
+@pytest.fixture
+def bridge():
+    bridge = SignalBridge()
+    yield bridge
+    bridge.disconnect()
+
+
+def test_signal_bridge_calls_receivers_on_qt_thread(qtbot, bridge):
+    signal = blinker.signal("bridge_test_signal")
+    calls = []
+    bridge.connect(signal, lambda sender, **kwargs:
+                   calls.append((threading.current_thread(), kwargs)))
+
+    sender = threading.Thread(target=lambda: signal.send(None, value=1))
+    sender.start()
+    sender.join()
+    qtbot.waitUntil(lambda: len(calls) == 1, timeout=1000)
+
+    assert calls == [(threading.main_thread(), {"value": 1})]
+
+
+def test_signal_bridge_coalesces_pending_increments(qtbot, bridge, pomodoro_service):
+    calls = []
+    bridge.connect_timer_increment(pomodoro_service, calls.append)
+
+    for time_elapsed in range(1, 101):
+        pomodoro_service._notify_timer_increment(time_elapsed)
+    qtbot.waitUntil(lambda: len(calls) > 0, timeout=1000)
+    qtbot.wait(10)
+
+    assert calls == [100]
+
+
+def test_signal_bridge_disconnect_stops_delivery(qtbot, bridge, pomodoro_service):
+    signal = blinker.signal("bridge_test_signal")
+    calls = []
+    bridge.connect(signal, lambda sender, **kwargs: calls.append(kwargs))
+    bridge.connect_timer_increment(pomodoro_service, calls.append)
+
+    bridge.disconnect()
+    signal.send(None, value=1)
+    pomodoro_service._notify_timer_increment(1)
+    qtbot.wait(10)
+
+    assert calls == []
+    assert not signal.receivers
+
+
+def test_signal_bridge_disconnect_drops_pending_events(qtbot, bridge):
+    signal = blinker.signal("bridge_test_signal")
+    calls = []
+    bridge.connect(signal, lambda sender, **kwargs: calls.append(kwargs))
+    signal.send(None, value=1)
+
+    bridge.disconnect()
+    bridge.connect(signal, lambda sender, **kwargs: calls.append(kwargs))
+    signal.send(None, value=2)
+    qtbot.waitUntil(lambda: len(calls) > 0, timeout=1000)
+    qtbot.wait(10)
+
+    assert calls == [{"value": 2}]
+
+
+def test_signal_bridge_bounds_events_for_slow_receiver(qtbot, bridge, pomodoro_service):
+    increments = 500
+    repaint = 0.02
+    calls = []
+    send_times = []
+
+    def slow_receiver(time_elapsed):
+        calls.append(time_elapsed)
+        time.sleep(repaint)
+
+    def fire():
+        # Increments at 1 kHz, as sent on the timer thread
+        start = time.perf_counter()
+        for i in range(1, increments + 1):
+            send_start = time.perf_counter()
+            pomodoro_service._notify_timer_increment(i)
+            send_times.append(time.perf_counter() - send_start)
+            delay = start + i * 0.001 - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    bridge.connect_timer_increment(pomodoro_service, slow_receiver)
+    start = time.perf_counter()
+    timer_thread = threading.Thread(target=fire)
+    timer_thread.start()
+    qtbot.waitUntil(lambda: len(calls) > 0 and calls[-1] == increments,
+                    timeout=5000)
+    elapsed = time.perf_counter() - start
+    timer_thread.join()
+
+    # Every delivery takes a repaint, increments meanwhile are coalesced
+    assert len(calls) <= elapsed / repaint + 1
+    assert calls == sorted(calls)
+    assert max(send_times) < repaint
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""Measure startup phases of pomito in a fresh interpreter.
+
+Usage: python startup_probe.py <console|qtapp> <work_dir>
+
+Creates a configuration and task file in `work_dir`, starts pomito till the
+first task list is rendered, and prints the phase timings in seconds as json.
+Run by tests/test_startup.py.
+"""
+
+import time
+
+time_start = time.perf_counter()
+
+import io  # noqa: E402
+import json  # noqa: E402
+import os  # noqa: E402
+import sys  # noqa: E402
+from contextlib import redirect_stdout  # noqa: E402
+
+
+def _create_config(ui, work_dir):
+    task_file = os.path.join(work_dir, "tasks.txt")
+    with open(task_file, "w") as f:
+        for i in range(100):
+            f.write("I:{0} | E:4 | A:0 | T:startup | D:Task {0}\n".format(i))
+
+    config_file = os.path.join(work_dir, "config.ini")
+    with open(config_file, "w") as f:
+        f.write("[plugins]\nui = {0}\ntask = text\n\n"
+                "[task.text]\nfile = {1}\n".format(ui, task_file))
+    return config_file
+
+
+def _render_console(pomito):
+    from pomito.plugins.ui.console import pomito_shell
+
+    out = io.StringIO()
+    with redirect_stdout(out):
+        pomito_shell.main(args=["list"], standalone_mode=False)
+    assert out.getvalue()
+
+
+def _render_qtapp(pomito):
+    app = pomito.ui_plugin._app
+    timer_window = app._timer_window
+    task_window = timer_window._task_window
+    timer_window.show()
+    task_window.get_task()
+
+    deadline = time.monotonic() + 10
+    while task_window.list_task.model().rowCount(0) == 0:
+        app.processEvents()
+        if time.monotonic() > deadline:
+            raise RuntimeError("Timed out waiting for the task list.")
+    app.processEvents()
+
+
+def main(ui, work_dir):
+    config_file = _create_config(ui, work_dir)
+    times = {}
+
+    phase_start = time.perf_counter()
+    from pomito import main
+    from pomito.config import Configuration
+    times["import"] = time.perf_counter() - phase_start
+
+    main.DATA_DIR = os.path.join(work_dir, "data")
+    pomito = main.Pomito(Configuration(config_file))
+    pomito.initialize()
+    times.update(pomito.startup_times)
+
+    phase_start = time.perf_counter()
+    globals()["_render_" + ui](pomito)
+    times["first_render"] = time.perf_counter() - phase_start
+    times["total"] = time.perf_counter() - time_start
+
+    pomito.exit()
+    return times
+
+
+if __name__ == "__main__":
+    print(json.dumps(main(sys.argv[1], sys.argv[2])))
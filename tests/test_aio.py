@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""Tests for the asyncio runtime."""
+
+import asyncio
+import gc
+import time
+import tracemalloc
+import unittest
+from unittest.mock import Mock
+
+import blinker
+import pytest
+
+from pomito import aio, main, pomodoro, task
+from pomito.test import FakeTaskPlugin, PomitoTestFactory
+
+
+class AsyncTimerTests(unittest.TestCase):
+    def setUp(self):
+        self.mock_callback = Mock()
+
+    def test_callback_reason_increment_and_complete(self):
+        async def run():
+            timer = aio.AsyncTimer(0.2, self.mock_callback, 0.1)
+            timer.start()
+            await timer.wait()
+
+        asyncio.run(run())
+
+        self.assertListEqual(self.mock_callback.call_args_list,
+                             [((pomodoro.TimerChange.INCREMENT,), {}),
+                              ((pomodoro.TimerChange.COMPLETE,), {})])
+
+    def test_stop_invokes_interrupt_callback(self):
+        async def run():
+            timer = aio.AsyncTimer(10, self.mock_callback, 1)
+            timer.start()
+            timer.stop()
+            return timer.is_alive()
+
+        is_alive = asyncio.run(run())
+
+        assert is_alive is False
+        self.mock_callback.assert_called_once_with(pomodoro.TimerChange.INTERRUPT)
+
+    def test_start_throws_if_timer_is_already_started(self):
+        async def run():
+            timer = aio.AsyncTimer(10, self.mock_callback, 1)
+            timer.start()
+            try:
+                self.assertRaises(RuntimeError, timer.start)
+            finally:
+                timer.stop()
+
+        asyncio.run(run())
+
+
+class AsyncMessageDispatcherTests(unittest.TestCase):
+    def setUp(self):
+        self.signal = blinker.signal('async_dummy_signal')
+        self.calls = []
+
+    def test_dispatcher_awaits_coroutine_receivers(self):
+        async def coroutine_receiver(sender, **kwargs):
+            await asyncio.sleep(0)
+            self.calls.append(("coroutine", kwargs))
+
+        def receiver(sender, **kwargs):
+            self.calls.append(("function", kwargs))
+
+        async def run():
+            dispatcher = aio.AsyncMessageDispatcher()
+            dispatcher.start()
+            dispatcher.queue_message(main.Message(self.signal, arg1=1))
+            dispatcher.stop()
+            await dispatcher.wait_closed()
+
+        self.signal.connect(coroutine_receiver)
+        self.signal.connect(receiver)
+        asyncio.run(run())
+
+        assert sorted(self.calls) == [("coroutine", {"arg1": 1}),
+                                      ("function", {"arg1": 1})]
+
+    def test_dispatcher_dispatches_messages_queued_before_start(self):
+        def receiver(sender, **kwargs):
+            self.calls.append(kwargs["arg1"])
+
+        async def run():
+            dispatcher = aio.AsyncMessageDispatcher()
+            dispatcher.queue_message(main.Message(self.signal, arg1=1))
+            dispatcher.queue_message(main.Message(self.signal, arg1=2))
+            dispatcher.start()
+            dispatcher.stop()
+            await dispatcher.wait_closed()
+            return dispatcher.is_alive()
+
+        self.signal.connect(receiver)
+        is_alive = asyncio.run(run())
+
+        assert self.calls == [1, 2]
+        assert is_alive is False
+
+    def test_queue_message_throws_for_invalid_message(self):
+        dispatcher = aio.AsyncMessageDispatcher()
+
+        self.assertRaises(TypeError, dispatcher.queue_message, None)
+
+
+class AsyncPomodoroTests(unittest.TestCase):
+    def setUp(self):
+        test_factory = PomitoTestFactory()
+        self.pomito = test_factory.create_fake_service()._pomito_instance
+        self.dummy_task = Mock(spec=task.Task)
+        self.dummy_callback = Mock()
+
+    def tearDown(self):
+        self.pomito.exit()
+
+    def test_session_stopped_for_reason_complete(self):
+        async def run():
+            service = aio.AsyncPomodoro(self.pomito)
+            service._config.session_duration = 0.2
+            service.start_session(self.dummy_task)
+            await service._timer.wait()
+
+        pomodoro.Pomodoro.signal_session_stopped \
+            .connect(self.dummy_callback, weak=False)
+        try:
+            asyncio.run(run())
+        finally:
+            pomodoro.Pomodoro.signal_session_stopped \
+                .disconnect(self.dummy_callback)
+
+        self.dummy_callback.assert_called_once_with(None, session_count=1,
+                                                    task=self.dummy_task,
+                                                    reason=pomodoro.TimerChange.COMPLETE)
+
+    def test_start_interruption_preempts_running_session(self):
+        async def run():
+            service = aio.AsyncPomodoro(self.pomito)
+            service.start_session(self.dummy_task)
+            service.start_interruption("reason", False, False)
+            timer_type = service._timer_type
+            service.stop_interruption()
+            return timer_type
+
+        pomodoro.Pomodoro.signal_session_stopped \
+            .connect(self.dummy_callback, weak=False)
+        try:
+            timer_type = asyncio.run(run())
+        finally:
+            pomodoro.Pomodoro.signal_session_stopped \
+                .disconnect(self.dummy_callback)
+
+        assert timer_type == pomodoro.TimerType.INTERRUPT
+        self.dummy_callback.assert_called_once_with(None, session_count=0,
+                                                    task=self.dummy_task,
+                                                    reason=pomodoro.TimerChange.INTERRUPT)
+
+    def test_coroutine_increment_receivers_are_kept_till_done(self):
+        calls = []
+
+        async def receiver(time_elapsed):
+            await asyncio.sleep(0)
+            calls.append(time_elapsed)
+
+        async def failing_receiver(time_elapsed):
+            raise ValueError("receiver failed")
+
+        async def run():
+            service = aio.AsyncPomodoro(self.pomito)
+            service.connect_timer_increment(receiver)
+            service.connect_timer_increment(failing_receiver)
+            service._notify_timer_increment(1)
+            pending = len(service._increment_tasks)
+            for _ in range(3):
+                await asyncio.sleep(0)
+            return pending, len(service._increment_tasks)
+
+        with self.assertLogs("pomito.aio", "ERROR") as logs:
+            pending, remaining = asyncio.run(run())
+
+        assert (pending, remaining) == (2, 0)
+        assert calls == [1]
+        assert "receiver failed" in logs.output[0]
+
+    def test_get_tasks_async_returns_tasks_from_task_plugin(self):
+        task_plugin = FakeTaskPlugin()
+        task_plugin.task_list = (t for t in [self.dummy_task])
+        self.pomito.task_plugin = task_plugin
+
+        async def run():
+            service = aio.AsyncPomodoro(self.pomito)
+            return await service.get_tasks_async()
+
+        tasks = asyncio.run(run())
+
+        assert tasks == [self.dummy_task]
+
+
+@pytest.mark.perf
+@pytest.mark.parametrize("runtime", ["threaded", "asyncio"])
+def test_tick_latency_and_memory_per_session(runtime):
+    sessions = 1000
+    duration = 5   # sessions tick every second
+    lateness = []
+    test_factory = PomitoTestFactory()
+    pomito = main.Pomito(test_factory.create_fake_config(),
+                         message_dispatcher=test_factory.message_dispatcher)
+    pomito._config.session_duration = duration
+
+    def create_services(create):
+        gc.collect()
+        tracemalloc.start()
+        snapshot_start = tracemalloc.take_snapshot()
+        services = [create() for _ in range(sessions)]
+        for service in services:
+            timer_callback = service._update_state
+
+            def on_tick(reason, service=service, callback=timer_callback):
+                timer = service._timer
+                now = (service._loop.time() if runtime == "asyncio"
+                       else time.monotonic())
+                lateness.append(now - timer.deadline)
+                callback(reason)
+            service._update_state = on_tick
+            service.start_session(task.get_null_task())
+        snapshot_end = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        memory = sum(s.size_diff for s in
+                     snapshot_end.compare_to(snapshot_start, "filename"))
+        return services, memory / sessions
+
+    if runtime == "asyncio":
+        async def run():
+            services, memory = create_services(lambda: aio.AsyncPomodoro(pomito))
+            await asyncio.gather(*[s._timer.wait() for s in services])
+            return memory
+        memory = asyncio.run(run())
+    else:
+        services, memory = create_services(lambda: pomodoro.Pomodoro(pomito))
+        for service in services:
+            service.flush()
+            service._timer.join()
+    pomito.exit()
+
+    lateness.sort()
+    print("\n{0}: memory/session = {1:.0f} bytes, tick lateness p50 = {2:.2f}ms, "
+          "p99 = {3:.2f}ms".format(runtime, memory,
+                                   lateness[len(lateness) // 2] * 1000,
+                                   lateness[int(len(lateness) * 0.99)] * 1000))
+    assert len(lateness) == sessions * duration
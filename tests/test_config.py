@@ -103,6 +103,33 @@ def test_load_reads_fractional_config_duration():
     assert config.long_break_frequency == 2
 
 
+def test_load_reads_database_settings():
+    data = {"pomito": dict(config_data["pomito"], journal_mode="delete",
+                           synchronous="full", cache_size=100,
+                           mmap_size=0, busy_timeout=0.5)}
+    config = Configuration(None, data)
+
+    config.load()
+
+    assert config.journal_mode == "delete"
+    assert config.synchronous == "full"
+    assert config.cache_size == 100
+    assert config.mmap_size == 0
+    assert config.busy_timeout == 0.5
+
+
+def test_load_sets_default_database_settings():
+    config = Configuration(None, config_data)
+
+    config.load()
+
+    assert config.journal_mode == "wal"
+    assert config.synchronous == "normal"
+    assert config.cache_size == 8 * 1024
+    assert config.mmap_size == 64
+    assert config.busy_timeout == 5
+
+
 def test_load_prefers_config_data_over_file_settings(config):
     config._config_data = {"section1": {"k1": "v2"}}
 
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""Tests for the database connections."""
+
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from peewee import OperationalError
+
+from pomito import stats
+from pomito.config import Configuration
+from pomito.db import create_database, create_reporting_database, get_pragmas
+from pomito.hooks.activity import (ActivityModel, ActivityWriter,
+                                   DailyRollupModel, TaskRollupModel,
+                                   database_proxy)
+
+
+@pytest.fixture
+def config():
+    c = Configuration(None)
+    c.load()
+    return c
+
+
+@pytest.fixture
+def database_path():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        yield os.path.join(tmpdir, "pomito.db")
+
+
+def _pragma(database, name):
+    return database.execute_sql("PRAGMA {0}".format(name)).fetchone()[0]
+
+
+def test_get_pragmas_converts_units(config):
+    config.cache_size = 100
+    config.mmap_size = 2
+
+    pragmas = dict(get_pragmas(config))
+
+    assert pragmas == {"journal_mode": "wal", "synchronous": "normal",
+                       "cache_size": -100, "mmap_size": 2 * 1024 * 1024}
+
+
+def test_create_database_sets_pragmas(config, database_path):
+    database = create_database(database_path, config)
+
+    assert _pragma(database, "journal_mode") == "wal"
+    assert _pragma(database, "synchronous") == 1
+    assert _pragma(database, "cache_size") == -8192
+    database.close()
+
+
+def test_create_database_sets_pragmas_for_every_thread(config, database_path):
+    database = create_database(database_path, config)
+    connection = database.connection()
+    result = {}
+
+    def read_pragma():
+        result["connection"] = database.connection()
+        result["synchronous"] = _pragma(database, "synchronous")
+        database.close()
+
+    thread = threading.Thread(target=read_pragma)
+    thread.start()
+    thread.join()
+
+    assert result["connection"] is not connection
+    assert result["synchronous"] == 1
+    database.close()
+
+
+def test_create_database_uses_configured_journal_mode(config, database_path):
+    config.journal_mode = "delete"
+
+    database = create_database(database_path, config)
+
+    assert _pragma(database, "journal_mode") == "delete"
+    database.close()
+
+
+def test_reporting_database_reads_committed_writes(config, database_path):
+    database = create_database(database_path, config)
+    database.execute_sql("CREATE TABLE t (v INTEGER)")
+    reporting = create_reporting_database(database_path, config)
+
+    database.execute_sql("INSERT INTO t VALUES (1)")
+
+    assert reporting.execute_sql("SELECT v FROM t").fetchall() == [(1,)]
+    reporting.close()
+    database.close()
+
+
+def test_reporting_database_is_read_only(config, database_path):
+    database = create_database(database_path, config)
+    database.execute_sql("CREATE TABLE t (v INTEGER)")
+    reporting = create_reporting_database(database_path, config)
+
+    with pytest.raises(OperationalError):
+        reporting.execute_sql("INSERT INTO t VALUES (1)")
+    reporting.close()
+    database.close()
+
+
+@pytest.mark.perf
+@pytest.mark.parametrize("journal_mode", ["delete", "wal"])
+def test_concurrent_readers_benchmark(journal_mode, database_path):
+    config = Configuration(None)
+    config.load()
+    config.journal_mode = journal_mode
+    config.busy_timeout = 30
+    readers = 4
+    duration = 3.0
+
+    database = create_database(database_path, config)
+    database_proxy.initialize(database)
+    for model in (ActivityModel, DailyRollupModel, TaskRollupModel):
+        model.create_table()
+    reporting = create_reporting_database(database_path, config)
+    writer = ActivityWriter(database, batch_size=100, flush_interval=0.01)
+    writer.start()
+
+    stop = threading.Event()
+    read_latency = []
+    errors = []
+
+    def read():
+        end = datetime.now() + timedelta(days=1)
+        start = end - timedelta(days=30)
+        try:
+            while not stop.is_set():
+                time_start = time.perf_counter()
+                stats.get_sessions_per_day(start, end, reporting)
+                read_latency.append(time.perf_counter() - time_start)
+        except OperationalError as e:
+            errors.append(e)
+        finally:
+            reporting.close()
+
+    threads = [threading.Thread(target=read) for _ in range(readers)]
+    for t in threads:
+        t.start()
+
+    # Write batches like the activity hook and measure time to commit
+    rows = 0
+    write_latency = []
+    time_start = time.perf_counter()
+    while time.perf_counter() - time_start < duration:
+        time_batch = time.perf_counter()
+        for _ in range(100):
+            writer.write({"timestamp": datetime.now(), "category": "session",
+                          "started_at": None, "duration": 1500.0,
+                          "task_uid": "t{0}".format(rows % 10),
+                          "session_count": None, "break_type": None,
+                          "reason": "complete", "data": None})
+            rows += 1
+        writer.flush()
+        write_latency.append(time.perf_counter() - time_batch)
+    stop.set()
+    for t in threads:
+        t.join()
+    writer.close()
+    written = ActivityModel.select().count()
+    database.close()
+
+    def percentile(latency, p):
+        return sorted(latency)[int(len(latency) * p)] * 1000
+
+    print("\n{0}: commits = {1}, commit p50 = {2:.2f}ms, p99 = {3:.2f}ms; "
+          "reads = {4}, read p50 = {5:.2f}ms, p99 = {6:.2f}ms; errors = {7}"
+          .format(journal_mode, len(write_latency),
+                  percentile(write_latency, 0.5), percentile(write_latency, 0.99),
+                  len(read_latency), percentile(read_latency, 0.5),
+                  percentile(read_latency, 0.99), len(errors)))
+    assert written == rows
+    assert errors == []
@@ -1,10 +1,12 @@
 # -*- coding: utf-8 -*-
 """Tests for message dispatcher."""
 
+import time
 import unittest
 from unittest.mock import Mock
 
 import blinker
+import pytest
 
 from pomito import main
 
@@ -75,3 +77,89 @@ class MessageDispatcherTests(unittest.TestCase):
         self.dispatcher.queue_message(self.test_message)
 
         assert self.mock_callback.called is False
+
+    def test_stop_wakes_up_idle_dispatcher(self):
+        self.dispatcher.start()
+
+        self.dispatcher.stop()
+        self.dispatcher.join(timeout=1)
+
+        assert self.dispatcher.is_alive() is False
+
+    def test_stop_dispatches_messages_queued_before_stop(self):
+        self.test_message.signal.connect(self.mock_callback, weak=False)
+        self.dispatcher.queue_message(self.test_message)
+        self.dispatcher.queue_message(self.test_message)
+
+        self.dispatcher.start()
+        self.dispatcher.stop()
+        self.dispatcher.join()
+
+        assert self.mock_callback.call_count == 2
+
+
+class PollingMessageDispatcher(main.MessageDispatcher):
+    """Dispatcher with the legacy 10ms polling loop. Used for benchmarks."""
+
+    def run(self):
+        while self._stop_event.is_set() is False:
+            while self._message_queue.empty() is False:
+                message = self._message_queue.get()
+                if message is not self._STOP:
+                    message.send()
+                self._message_queue.task_done()
+            self.wakeups += 1
+            self._stop_event.wait(0.01)
+
+
+class BlockingMessageDispatcher(main.MessageDispatcher):
+    """Dispatcher which counts the wakeups of the blocking loop."""
+
+    def run(self):
+        get = self._message_queue.get
+
+        def counting_get(*args, **kwargs):
+            item = get(*args, **kwargs)
+            self.wakeups += 1
+            return item
+        self._message_queue.get = counting_get
+        super().run()
+
+
+@pytest.mark.perf
+@pytest.mark.parametrize("dispatcher_type", [PollingMessageDispatcher,
+                                             BlockingMessageDispatcher])
+def test_dispatcher_idle_wakeups_and_latency(dispatcher_type):
+    idle_duration = 2.0
+    message_count = 1000
+    latencies = []
+    signal = blinker.signal('dispatcher_benchmark')
+
+    def receiver(sender, enqueued_at):
+        latencies.append(time.perf_counter() - enqueued_at)
+    signal.connect(receiver)
+
+    dispatcher = dispatcher_type()
+    dispatcher.wakeups = 0
+    dispatcher.start()
+    time.sleep(idle_duration)
+    idle_wakeups = dispatcher.wakeups
+
+    for _ in range(message_count):
+        dispatcher.queue_message(main.Message(signal,
+                                              enqueued_at=time.perf_counter()))
+        time.sleep(0.001)
+    dispatcher._message_queue.join()
+    dispatcher.stop()
+    dispatcher.join()
+    signal.disconnect(receiver)
+
+    latencies.sort()
+    print("\n{0}: idle wakeups/min = {1:.0f}, latency p50 = {2:.3f}ms, "
+          "p99 = {3:.3f}ms".format(dispatcher_type.__name__,
+                                   idle_wakeups * 60 / idle_duration,
+                                   latencies[len(latencies) // 2] * 1000,
+                                   latencies[int(len(latencies) * 0.99)] * 1000))
+    assert len(latencies) == message_count
+    if dispatcher_type is BlockingMessageDispatcher:
+        assert idle_wakeups == 0
@@ -3,6 +3,7 @@
 """Tests for the Main module."""
 
 import os
+import time
 from unittest.mock import Mock, MagicMock, patch
 
 import tempfile
@@ -91,6 +92,57 @@ def test_initialize_uses_injected_database():
     pomito.exit()
 
 
+def test_initialize_creates_database_with_write_ahead_log():
+    with _setup_data_dir():
+        pomito = main.Pomito()
+        _setup_pomito_plugins(pomito)
+        _setup_pomito_hooks(pomito)
+
+        pomito.initialize()
+
+        journal_mode = pomito.get_db().execute_sql("PRAGMA journal_mode")
+        assert journal_mode.fetchone()[0] == "wal"
+        pomito.exit()
+
+
+def test_get_reporting_db_returns_read_only_database():
+    with _setup_data_dir():
+        pomito = main.Pomito()
+        _setup_pomito_plugins(pomito)
+        _setup_pomito_hooks(pomito)
+        pomito.initialize()
+
+        reporting = pomito.get_reporting_db()
+
+        assert reporting is not pomito.get_db()
+        assert reporting is pomito.get_reporting_db()
+        assert reporting.execute_sql("PRAGMA query_only").fetchone()[0] == 1
+        pomito.exit()
+        assert reporting.is_closed()
+
+
+def test_get_reporting_db_returns_injected_database():
+    dummy_db = SqliteDatabase(':memory:')
+    pomito = main.Pomito(database=dummy_db)
+
+    assert pomito.get_reporting_db() is dummy_db
+    pomito.exit()
+
+
+def test_initialize_records_startup_times():
+    with _setup_data_dir():
+        pomito = main.Pomito()
+        _setup_pomito_plugins(pomito)
+        _setup_pomito_hooks(pomito)
+
+        pomito.initialize()
+
+        assert set(pomito.startup_times) == {"config", "plugins", "database",
+                                             "plugin_init", "hooks"}
+        assert all(t >= 0 for t in pomito.startup_times.values())
+        pomito.exit()
+
+
 def test_initialize_setup_plugins_and_hooks():
     with _setup_data_dir():
         pomito = main.Pomito()
@@ -127,6 +179,32 @@ def test_exit_closes_database(pomito_instance, memory_db):
     assert memory_db.is_closed
 
 
+def test_exit_closes_task_plugin(pomito_instance):
+    pomito_instance.task_plugin = Mock(spec=TaskPlugin)
+
+    pomito_instance.exit()
+
+    pomito_instance.task_plugin.close.assert_called_once_with()
+
+
+def test_exit_dispatches_signals_of_commands_posted_before(pomito_instance):
+    from pomito.pomodoro import Pomodoro, TimerChange
+    receiver = Mock()
+    Pomodoro.signal_session_stopped.connect(receiver)
+    pomito_instance._message_dispatcher.start()
+    service = pomito_instance.pomodoro_service
+    # Commands are still queued on exit
+    pomito_instance.get_scheduler().call_soon(lambda: time.sleep(0.2))
+
+    service.start_session(Mock())
+    service.stop_session()
+    pomito_instance.exit()
+
+    Pomodoro.signal_session_stopped.disconnect(receiver)
+    assert receiver.call_count == 1
+    assert receiver.call_args[1]["reason"] == TimerChange.INTERRUPT
+
+
 def _setup_pomito_plugins(pomito):
     pomito.ui_plugin = Mock(spec=UIPlugin)
     pomito.task_plugin = Mock(spec=TaskPlugin)
@@ -2,6 +2,7 @@
 """Tests for pomodoro service."""
 import os
 import sys
+import threading
 import time
 import unittest
 import pytest
@@ -62,7 +63,8 @@ class PomodoroServiceTests(unittest.TestCase):
 
     def test_get_task_plugins_gets_list_of_all_task_plugins(self):
         from pomito import plugins
-        plugins.PLUGINS = {'a': plugins.task.nulltask.NullTask(None),
+        from pomito.plugins.task import nulltask
+        plugins.PLUGINS = {'a': nulltask.NullTask(None),
                            'b': self.pomodoro_service}
         task_plugins = self.pomodoro_service.get_task_plugins()
 
@@ -217,6 +219,173 @@ class PomodoroServiceTests(unittest.TestCase):
         self.pomodoro_service.signal_break_stopped\
             .disconnect(self.dummy_callback)
 
+    def test_start_interruption_preempts_running_session(self):
+        self.pomodoro_service.signal_session_stopped \
+            .connect(self.dummy_callback, weak=False)
+
+        self.pomodoro_service.start_session(self.dummy_task)
+        self.pomodoro_service.start_interruption("reason", False, False)
+
+        assert self.pomodoro_service._timer_type == pomodoro.TimerType.INTERRUPT
+        self.dummy_callback.assert_called_once_with(None, session_count=0,
+                                                    task=self.dummy_task,
+                                                    reason=pomodoro.TimerChange.INTERRUPT)
+
+        self.pomodoro_service.signal_session_stopped \
+            .disconnect(self.dummy_callback)
+        self.pomodoro_service.stop_interruption()
+
+    def test_stop_interruption_resumes_preempted_session(self):
+        self.pomodoro_service.signal_session_started \
+            .connect(self.dummy_callback, weak=False)
+
+        self.pomodoro_service.start_session(self.dummy_task)
+        self._tick([200])
+        self.pomodoro_service.start_interruption("reason", False, False)
+        self.pomodoro_service.stop_interruption(resume=True)
+
+        assert self.pomodoro_service._timer_type == pomodoro.TimerType.SESSION
+        self.dummy_callback.assert_called_with(None, session_count=0,
+                                               session_duration=400,
+                                               task=self.dummy_task)
+
+        self.pomodoro_service.signal_session_started \
+            .disconnect(self.dummy_callback)
+        self.pomodoro_service.stop_session()
+
+    def test_stop_interruption_does_not_resume_by_default(self):
+        self.pomodoro_service.start_session(self.dummy_task)
+        self.pomodoro_service.start_interruption("reason", False, False)
+        self.pomodoro_service.stop_interruption()
+
+        assert self.pomodoro_service._timer_type is None
+
+    def test_start_session_stops_running_break(self):
+        self.pomodoro_service.signal_break_stopped \
+            .connect(self.dummy_callback, weak=False)
+
+        self.pomodoro_service.start_break()
+        self.pomodoro_service.start_session(self.dummy_task)
+
+        self.dummy_callback.assert_called_once_with(None,
+                                                    break_type=pomodoro.TimerType.SHORT_BREAK,
+                                                    reason=pomodoro.TimerChange.INTERRUPT)
+        assert self.pomodoro_service._timer_type == pomodoro.TimerType.SESSION
+
+        self.pomodoro_service.signal_break_stopped \
+            .disconnect(self.dummy_callback)
+        self.pomodoro_service.stop_session()
+
+    def test_callbacks_of_stopped_timer_are_ignored(self):
+        self.pomodoro_service.start_session(self.dummy_task)
+        timer = self.pomodoro_service._timer
+        self.pomodoro_service.stop_session()
+        self.pomodoro_service.signal_session_stopped \
+            .connect(self.dummy_callback, weak=False)
+
+        timer.trigger_callback(pomodoro.TimerChange.COMPLETE)
+
+        self.dummy_callback.assert_not_called()
+        assert self.pomodoro_service._session_count == 0
+        self.pomodoro_service.signal_session_stopped \
+            .disconnect(self.dummy_callback)
+
+    def test_stop_session_without_session_does_not_send_signal(self):
+        self.pomodoro_service.signal_session_stopped \
+            .connect(self.dummy_callback, weak=False)
+
+        self.pomodoro_service.stop_session()
+
+        self.dummy_callback.assert_not_called()
+        self.pomodoro_service.signal_session_stopped \
+            .disconnect(self.dummy_callback)
+
+    def test_connect_timer_increment_notifies_at_resolution(self):
+        minute_callback = Mock()
+        self.pomodoro_service.connect_timer_increment(self.dummy_callback, 1)
+        self.pomodoro_service.connect_timer_increment(minute_callback, 60)
+
+        self.pomodoro_service.start_session(self.dummy_task)
+        self._tick(range(1, 150))
+        self.pomodoro_service.stop_session()
+
+        assert self.dummy_callback.call_count == 149
+        self.assertListEqual(minute_callback.call_args_list,
+                             [((60,), {}), ((120,), {})])
+
+    def test_connect_timer_increment_coalesces_skipped_ticks(self):
+        self.pomodoro_service.connect_timer_increment(self.dummy_callback, 10)
+
+        self.pomodoro_service.start_session(self.dummy_task)
+        self._tick([5, 25, 26, 29, 31])
+        self.pomodoro_service.stop_session()
+
+        self.assertListEqual(self.dummy_callback.call_args_list,
+                             [((25,), {}), ((31,), {})])
+
+    def test_connect_timer_increment_resets_for_new_timer(self):
+        self.pomodoro_service.connect_timer_increment(self.dummy_callback, 60)
+
+        self.pomodoro_service.start_session(self.dummy_task)
+        self._tick([60])
+        self.pomodoro_service.stop_session()
+        self.pomodoro_service.start_break()
+        self._tick([60])
+        self.pomodoro_service.stop_break()
+
+        assert self.dummy_callback.call_count == 2
+
+    def test_connect_timer_increment_throws_for_invalid_resolution(self):
+        self.assertRaises(ValueError,
+                          self.pomodoro_service.connect_timer_increment,
+                          self.dummy_callback, 0)
+
+    def test_disconnect_timer_increment_stops_notifications(self):
+        self.pomodoro_service.connect_timer_increment(self.dummy_callback, 1)
+        self.pomodoro_service.disconnect_timer_increment(self.dummy_callback)
+
+        self.pomodoro_service.start_session(self.dummy_task)
+        self._tick([1, 2])
+        self.pomodoro_service.stop_session()
+
+        self.dummy_callback.assert_not_called()
+
+    @pytest.mark.perf
+    def test_timer_increment_callbacks_per_session(self):
+        session_ticks = range(1, 25 * 60)
+        ui, tray, activity = Mock(), Mock(), Mock()
+
+        # Every receiver gets every tick with the signal
+        for receiver in (ui, tray, activity):
+            self.pomodoro_service.signal_timer_increment.connect(receiver, weak=False)
+        self.pomodoro_service.start_session(self.dummy_task)
+        self._tick(session_ticks)
+        self.pomodoro_service.stop_session()
+        for receiver in (ui, tray, activity):
+            self.pomodoro_service.signal_timer_increment.disconnect(receiver)
+        callbacks_before = sum(r.call_count for r in (ui, tray, activity))
+
+        # Receivers declare the resolution they need, activity log only
+        # listens to session_stopped
+        for receiver in (ui, tray, activity):
+            receiver.reset_mock()
+        self.pomodoro_service.connect_timer_increment(ui, 1)
+        self.pomodoro_service.connect_timer_increment(tray, 60)
+        self.pomodoro_service.start_session(self.dummy_task)
+        self._tick(session_ticks)
+        self.pomodoro_service.stop_session()
+        callbacks_after = sum(r.call_count for r in (ui, tray, activity))
+
+        print("\ncallbacks per session: before = {0}, after = {1}"
+              .format(callbacks_before, callbacks_after))
+        assert callbacks_after < callbacks_before
+
+    def _tick(self, elapsed_values):
+        timer = self.pomodoro_service._timer
+        for time_elapsed in elapsed_values:
+            timer.time_elapsed = time_elapsed
+            timer.trigger_callback(pomodoro.TimerChange.INCREMENT)
+
     def test_get_data_dir_returns_correct_default(self):
         expected_data_dir = os.path.join(os.path.expanduser("~"), "pomito")
         if sys.platform.startswith("linux"):
@@ -256,6 +425,91 @@ class PomodoroServiceTests(unittest.TestCase):
         pomito.exit()
 
 
+class PomodoroStateMachineTests(unittest.TestCase):
+    """Tests for the pomodoro service with timers on the scheduler thread."""
+
+    def setUp(self):
+        test_factory = PomitoTestFactory()
+        self.pomito = main.Pomito(test_factory.create_fake_config(),
+                                  message_dispatcher=test_factory.message_dispatcher)
+        self.pomito._config.session_duration = 60
+        self.pomodoro_service = pomodoro.Pomodoro(self.pomito)
+        self.dummy_task = Mock(spec=task.Task)
+
+    def tearDown(self):
+        self.pomito.exit()
+
+    def test_commands_run_on_the_scheduler_thread(self):
+        threads = []
+        self.pomodoro_service._post(lambda: threads.append(threading.current_thread()))
+
+        assert self.pomodoro_service.flush(timeout=1)
+        assert threads == [self.pomito.get_scheduler()]
+
+    def test_start_interruption_does_not_wait_for_running_session(self):
+        self.pomodoro_service.start_session(self.dummy_task)
+        self.pomodoro_service.flush(timeout=1)
+
+        time_start = time.perf_counter()
+        self.pomodoro_service.start_interruption("reason", False, False)
+        latency = time.perf_counter() - time_start
+        self.pomodoro_service.flush(timeout=1)
+
+        assert latency < 0.5
+        assert self.pomodoro_service._timer_type == pomodoro.TimerType.INTERRUPT
+        self.pomodoro_service.stop_interruption()
+
+    def test_session_completes_on_the_scheduler_thread(self):
+        self.pomito._config.session_duration = 0.2
+        self.pomodoro_service._get_timer = \
+            lambda duration, callback, interval=1: \
+            pomodoro.Timer(duration, callback, 0.1, self.pomito.get_scheduler())
+
+        self.pomodoro_service.start_session(self.dummy_task)
+        self.pomodoro_service.flush(timeout=1)
+        self.pomodoro_service._timer.join(timeout=1)
+        self.pomodoro_service.flush(timeout=1)
+
+        assert self.pomodoro_service._session_count == 1
+        assert self.pomodoro_service._timer_type is None
+
+    @pytest.mark.perf
+    def test_transition_latency_under_running_timer(self):
+        transitions = [
+            ("start_session", lambda s: s.start_session(self.dummy_task)),
+            ("start_interruption", lambda s: s.start_interruption("r", False, False)),
+            ("stop_interruption(resume)", lambda s: s.stop_interruption(resume=True)),
+            ("stop_session", lambda s: s.stop_session()),
+            ("start_break", lambda s: s.start_break()),
+            ("stop_break", lambda s: s.stop_break())]
+        rounds = 1000
+        # A ticking timer keeps the scheduler thread busy meanwhile
+        ticker = pomodoro.Timer(60, lambda reason: None, 0.001,
+                                self.pomito.get_scheduler())
+        ticker.start()
+        calls = {name: [] for name, _ in transitions}
+        applied = {name: [] for name, _ in transitions}
+        try:
+            for _ in range(rounds):
+                for name, transition in transitions:
+                    time_start = time.perf_counter()
+                    transition(self.pomodoro_service)
+                    calls[name].append(time.perf_counter() - time_start)
+                    self.pomodoro_service.flush()
+                    applied[name].append(time.perf_counter() - time_start)
+        finally:
+            ticker.stop()
+
+        print()
+        for name, _ in transitions:
+            latency = sorted(calls[name])
+            print("{0}: call p50 = {1:.1f}us, p99 = {2:.1f}us, applied p50 = {3:.1f}us"
+                  .format(name, latency[rounds // 2] * 1e6,
+                          latency[int(rounds * 0.99)] * 1e6,
+                          sorted(applied[name])[rounds // 2] * 1e6))
+            assert latency[int(rounds * 0.99)] < 0.001
+
+
 class TimerTests(unittest.TestCase):
     def setUp(self):
         self.timestamp_start = 0.0
@@ -321,20 +575,176 @@ class TimerTests(unittest.TestCase):
         timer.stop()
         time.sleep(0.1)
 
+    def test_slow_callbacks_do_not_drift_the_timer(self):
+        def slow_callback(reason):
+            time.sleep(0.05)
+        timer = pomodoro.Timer(0.5, slow_callback, 0.1)
+
+        timer.start()
+        timer.join(timeout=2)
+
+        assert timer.actual_elapsed == pytest.approx(0.5, abs=0.04)
+
+    def test_missed_ticks_are_coalesced(self):
+        reasons = []
+
+        def starving_callback(reason):
+            reasons.append(reason)
+            if len(reasons) == 1:
+                time.sleep(0.35)
+        timer = pomodoro.Timer(1.0, starving_callback, 0.1)
+
+        timer.start()
+        timer.join(timeout=3)
+
+        assert len(reasons) < 10
+        assert reasons[-1] == pomodoro.TimerChange.COMPLETE
+        assert timer.time_elapsed == 1.0
+
     @pytest.mark.perf
     def test_callback_granular(self):
-        duration = 60.00
-        delta_granular = 1.0    # windows
-        if sys.platform.startswith("linux"):
-            delta_granular = 0.03
+        duration = 20.0
+        interval = 0.1
+        delta_granular = 0.01
+        if not sys.platform.startswith("linux"):
+            delta_granular = 0.05   # windows
+        lateness = []
+
+        def callback(reason):
+            lateness.append(time.monotonic() - timer.deadline)
+            self.dummy_callback(reason)
+            sum(i * i for i in range(20000))    # work in the callback
+
+        # Synthetic CPU load competing for the interpreter
+        stop_load = threading.Event()
+
+        def burn():
+            while not stop_load.is_set():
+                sum(i * i for i in range(1000))
+        load = [threading.Thread(target=burn) for _ in range(4)]
+        for t in load:
+            t.start()
+
+        try:
+            timer = pomodoro.Timer(duration, callback, interval)
+            timer.start()
+            timer.join()
+        finally:
+            stop_load.set()
+            for t in load:
+                t.join()
+
+        drift = lateness[-1]    # lateness of the completion callback
+        lateness.sort()
+        print("\ndrift = {0:.4f}s, ticks = {1}, lateness p50 = {2:.2f}ms, "
+              "p99 = {3:.2f}ms".format(drift, len(lateness),
+                                       lateness[len(lateness) // 2] * 1000,
+                                       lateness[int(len(lateness) * 0.99)] * 1000))
+        assert self.reason == pomodoro.TimerChange.COMPLETE
+        assert drift < delta_granular + lateness[int(len(lateness) * 0.99)]
+        assert timer.actual_elapsed == pytest.approx(duration, abs=0.1)
+
+
+class TimerSchedulerTests(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = pomodoro.TimerScheduler()
+        self.mock_callback = Mock()
+
+    def tearDown(self):
+        self.scheduler.stop()
+
+    def test_scheduler_runs_concurrent_timers_on_one_thread(self):
+        threads = set()
+
+        def callback(reason):
+            threads.add(threading.current_thread())
+        timers = [pomodoro.Timer(0.2, callback, 0.1, self.scheduler)
+                  for _ in range(10)]
+
+        for timer in timers:
+            timer.start()
+        for timer in timers:
+            timer.join(timeout=1)
+
+        assert threads == {self.scheduler}
+        assert all(not timer.is_alive() for timer in timers)
 
-        timer = pomodoro.Timer(duration, self.dummy_callback)
-        self.timestamp_start = time.time()
+    def test_scheduler_fires_earliest_deadline_first(self):
+        reasons = []
+        slow = pomodoro.Timer(0.3, lambda r: reasons.append(("slow", r)),
+                              0.3, self.scheduler)
+        fast = pomodoro.Timer(0.1, lambda r: reasons.append(("fast", r)),
+                              0.1, self.scheduler)
+
+        slow.start()
+        fast.start()
+        slow.join(timeout=2)
+
+        assert reasons[0] == ("fast", pomodoro.TimerChange.COMPLETE)
+        assert reasons[-1] == ("slow", pomodoro.TimerChange.COMPLETE)
+
+    def test_scheduler_survives_callback_errors(self):
+        failing = pomodoro.Timer(0.1, Mock(side_effect=ValueError), 0.1,
+                                 self.scheduler)
+        timer = pomodoro.Timer(0.2, self.mock_callback, 0.1, self.scheduler)
+
+        failing.start()
         timer.start()
-        time.sleep(duration + 2)
+        timer.join(timeout=1)
 
-        assert self.reason == pomodoro.TimerChange.COMPLETE
-        self.assertAlmostEqual(self.delta, duration, delta=delta_granular)
+        assert self.mock_callback.call_count == 2
+
+    def test_call_soon_runs_callback_on_scheduler_thread(self):
+        threads = []
+        done = threading.Event()
+
+        def callback():
+            threads.append(threading.current_thread())
+            # Timers can be started from the scheduler thread
+            pomodoro.Timer(0.1, self.mock_callback, 0.1, self.scheduler).start()
+            done.set()
+
+        self.scheduler.call_soon(callback)
+        done.wait(timeout=1)
+        time.sleep(0.2)
+
+        assert threads == [self.scheduler]
+        self.mock_callback.assert_called_once_with(pomodoro.TimerChange.COMPLETE)
+
+    def test_schedule_throws_for_stopped_scheduler(self):
+        self.scheduler.stop()
+        timer = pomodoro.Timer(1, self.mock_callback, 1, self.scheduler)
+
+        self.assertRaises(RuntimeError, timer.start)
+
+    @pytest.mark.perf
+    def test_scheduler_start_stop_latency(self):
+        for count in (1, 100, 10000):
+            scheduler = pomodoro.TimerScheduler()
+            threads_before = threading.active_count()
+            timers = [pomodoro.Timer(60, self.mock_callback, 1, scheduler)
+                      for _ in range(count)]
+
+            time_start = time.perf_counter()
+            for timer in timers:
+                timer.start()
+            start_latency = (time.perf_counter() - time_start) / count
+            thread_count = threading.active_count() - threads_before
+
+            time_start = time.perf_counter()
+            for timer in timers:
+                timer.stop()
+            for timer in timers:
+                timer.join()
+            stop_latency = (time.perf_counter() - time_start) / count
+            scheduler.stop()
+            scheduler.join()
+
+            print("\n{0} timers: threads = {1}, start = {2:.1f}us, "
+                  "stop = {3:.1f}us".format(count, thread_count,
+                                            start_latency * 1e6,
+                                            stop_latency * 1e6))
+            assert thread_count == 1
 
 
 class DummyUIPlugin(UIPlugin):
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""Tests for the task search."""
+
+import random
+import statistics
+import time
+from datetime import date, timedelta
+from itertools import islice
+
+import pytest
+
+from pomito.search import TaskSearch
+from pomito.task import Task
+
+
+@pytest.fixture
+def tasks():
+    return [Task("a1", 2, 1, "work", "Write quarterly report"),
+            Task("b2", 1, 1, None, "Review report draft"),
+            Task("c3", 3, 0, "home,chores", "Fix the sink"),
+            Task("d4", 1, 0, None, "Reporting pipeline"),
+            Task("e5", 2, 0, "work", "Plan the week")]
+
+
+@pytest.fixture
+def search(tasks):
+    search = TaskSearch()
+    search.update(tasks)
+    return search
+
+
+def _uids(results):
+    return [t.uid for t in results]
+
+
+def test_search_returns_all_tasks_for_empty_query(search):
+    assert sorted(_uids(search.search(""))) == ["a1", "b2", "c3", "d4", "e5"]
+
+
+def test_search_ranks_exact_above_prefix_matches(search):
+    assert _uids(search.search("report")) == ["a1", "b2", "d4"]
+    assert _uids(search.search("Reporting")) == ["d4"]
+
+
+def test_search_matches_prefix_and_fuzzy_tokens(search):
+    assert _uids(search.search("repo")) == ["a1", "d4", "b2"]
+    assert _uids(search.search("eport")) == ["a1", "d4", "b2"]
+    assert _uids(search.search("rport")) == ["a1", "d4", "b2"]
+    assert _uids(search.search("quartely")) == ["a1"]
+
+
+def test_search_matches_tags(search):
+    assert _uids(search.search("work")) == ["a1", "e5"]
+    assert _uids(search.search("sink chores")) == ["c3"]
+
+
+def test_search_requires_all_query_tokens(search):
+    assert _uids(search.search("report week")) == []
+    assert _uids(search.search("the work")) == ["e5"]
+    assert _uids(search.search("missing")) == []
+
+
+def test_search_ranks_recently_used_tasks_first(tasks, search):
+    search.update(tasks, {"d4": date(2020, 1, 2), "b2": date(2020, 1, 1)})
+
+    assert _uids(search.search("report")) == ["b2", "a1", "d4"]
+    assert _uids(search.search("rep")) == ["d4", "b2", "a1"]
+
+
+def test_search_ranks_tasks_with_pomodoros_left_first(search):
+    # a1 is in progress, b2 used up its estimate
+    assert _uids(search.search("report")) == ["a1", "b2", "d4"]
+    assert _uids(search.search("the")) == ["c3", "e5"]
+
+
+def test_update_returns_false_for_unchanged_tasks(tasks, search):
+    assert not search.update(list(tasks))
+    assert not search.update(tasks, {})
+    assert search.update(tasks, {"a1": date(2020, 1, 1)})
+
+
+def test_update_indexes_added_and_removed_tasks(tasks, search):
+    added = Task("f6", 1, 0, None, "Report expenses")
+
+    search.update(tasks[1:] + [added])
+
+    assert _uids(search.search("report")) == ["f6", "b2", "d4"]
+
+
+def test_update_indexes_tasks_changed_since_last_update(tasks, search):
+    tasks[4].description = "Report the week"
+    tasks[0].update_actual()
+
+    assert search.update(tasks)
+
+    assert _uids(search.search("plan")) == []
+    # a1 used up its estimate, it no longer ranks above e5
+    assert _uids(search.search("report")) == ["e5", "a1", "b2", "d4"]
+
+
+def _create_tasks(count, seed=7):
+    rnd = random.Random(seed)
+    syllables = ["ra", "po", "ti", "ken", "mar", "lo", "su", "vi", "de", "ba",
+                 "no", "qui", "ter", "fa", "gen", "hu", "ol", "an", "es", "ri"]
+    words = sorted({"".join(rnd.choice(syllables)
+                            for _ in range(rnd.randint(2, 4)))
+                    for _ in range(3000)})
+    tags = words[:40]
+    tasks = [Task("{0:x}".format(i), rnd.randint(1, 6), rnd.randint(0, 6),
+                  ",".join(rnd.sample(tags, 2)),
+                  " ".join(rnd.choice(words) for _ in range(rnd.randint(3, 8))))
+             for i in range(count)]
+    last_used = {t.uid: date.today() - timedelta(days=rnd.randint(0, 90))
+                 for t in rnd.sample(tasks, count // 20)}
+    return words, tasks, last_used
+
+
+@pytest.mark.perf
+def test_search_keystroke_benchmark():
+    words, tasks, last_used = _create_tasks(100000)
+    search = TaskSearch()
+
+    start = time.perf_counter()
+    search.update(tasks, last_used)
+    build = time.perf_counter() - start
+
+    print("\n100k tasks: index build = {0:.0f}ms".format(build * 1000))
+    timings = []
+    queries = [words[1000] + " " + words[2000], words[5] + " " + words[-1],
+               "xyz"]
+    for query in queries:
+        for i in range(1, len(query) + 1):
+            samples = []
+            for _ in range(5):
+                start = time.perf_counter()
+                results = list(islice(search.search(query[:i]), 50))
+                samples.append(time.perf_counter() - start)
+            timings.append((query[:i], len(results), statistics.median(samples)))
+
+    for query, count, timing in timings:
+        print("  {0!r}: {1} results, first page = {2:.2f}ms"
+              .format(query, count, timing * 1000))
+    assert max(t for _, _, t in timings) < 0.016
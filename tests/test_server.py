@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""Tests for the multi-tenant pomodoro server."""
+
+import json
+import resource
+import threading
+import time
+import unittest
+from http.client import HTTPConnection
+from unittest.mock import Mock
+
+import pytest
+
+from pomito import pomodoro
+from pomito.server import SessionManager, SessionServer
+from pomito.task import Task
+from pomito.test import FakeMessageDispatcher, PomitoTestFactory
+
+
+def _create_manager(session_duration=None):
+    config = PomitoTestFactory().create_fake_config()
+    config.load()
+    if session_duration is not None:
+        config.session_duration = session_duration
+    return SessionManager(config, message_dispatcher=FakeMessageDispatcher())
+
+
+class SessionManagerTests(unittest.TestCase):
+    def setUp(self):
+        self.manager = _create_manager()
+        self.dummy_task = Task(1, 0, 0, None, "dummy task")
+        self.dummy_callback = Mock()
+
+    def tearDown(self):
+        self.manager.stop()
+
+    def test_start_session_sends_session_started_for_user(self):
+        pomodoro.Pomodoro.signal_session_started.connect(self.dummy_callback)
+
+        self.manager.start_session("u1", self.dummy_task)
+
+        pomodoro.Pomodoro.signal_session_started.disconnect(self.dummy_callback)
+        self.dummy_callback.assert_called_once_with(None, user="u1",
+                                                    session_count=0,
+                                                    session_duration=600,
+                                                    task=self.dummy_task)
+
+    def test_start_session_throws_if_no_task_is_provided(self):
+        self.assertRaises(ValueError, self.manager.start_session, "u1", None)
+
+    def test_start_session_throws_if_timer_is_running(self):
+        self.manager.start_session("u1", self.dummy_task)
+
+        self.assertRaises(RuntimeError, self.manager.start_session,
+                          "u1", self.dummy_task)
+
+    def test_start_session_after_stop_session_starts_a_session(self):
+        pomodoro.Pomodoro.signal_session_stopped.connect(self.dummy_callback)
+        self.manager.start_session("u1", self.dummy_task)
+        timer = self.manager.get_session("u1").timer
+
+        self.manager.stop_session("u1")
+        self.manager.start_session("u1", self.dummy_task)
+        timer.join(timeout=1)
+
+        pomodoro.Pomodoro.signal_session_stopped.disconnect(self.dummy_callback)
+        assert self.manager.get_session("u1").timer is not timer
+        assert self.manager.get_session("u1").timer.is_alive()
+        assert self.dummy_callback.call_count == 1
+
+    def test_stop_break_throws_if_session_is_running(self):
+        self.manager.start_session("u1", self.dummy_task)
+
+        self.assertRaises(RuntimeError, self.manager.stop_break, "u1")
+
+        assert self.manager.get_session("u1").timer.is_alive()
+
+    def test_get_session_returns_none_for_unknown_user(self):
+        self.manager.stop_session("u1")
+
+        assert self.manager.get_session("u1") is None
+
+    def test_sessions_are_independent_for_users(self):
+        self.manager.start_session("u1", self.dummy_task)
+
+        self.manager.start_session("u2", self.dummy_task)
+
+        assert self.manager.get_session("u1").timer.is_alive()
+        assert self.manager.get_session("u2").timer.is_alive()
+
+    def test_stop_session_sends_session_stopped_for_user(self):
+        pomodoro.Pomodoro.signal_session_stopped.connect(self.dummy_callback)
+        self.manager.start_session("u1", self.dummy_task)
+        timer = self.manager.get_session("u1").timer
+
+        self.manager.stop_session("u1")
+        timer.join(timeout=1)
+
+        pomodoro.Pomodoro.signal_session_stopped.disconnect(self.dummy_callback)
+        self.dummy_callback.assert_called_once_with(None, user="u1",
+                                                    session_count=0,
+                                                    task=self.dummy_task,
+                                                    reason=pomodoro.TimerChange.INTERRUPT)
+
+    def test_completed_session_increments_session_count(self):
+        manager = _create_manager(session_duration=1)
+        manager.start_session("u1", self.dummy_task)
+
+        manager.get_session("u1").timer.join(timeout=2)
+
+        assert manager.get_session("u1").session_count == 1
+        manager.stop()
+
+    def test_start_break_starts_long_break_after_frequency(self):
+        self.manager.start_break("u1")
+        self.manager.stop_break("u1")
+        self.manager.get_session("u1").session_count = 4
+        pomodoro.Pomodoro.signal_break_started.connect(self.dummy_callback)
+
+        self.manager.start_break("u1")
+
+        pomodoro.Pomodoro.signal_break_started.disconnect(self.dummy_callback)
+        self.dummy_callback.assert_called_once_with(None, user="u1",
+                                                    break_type=pomodoro.TimerType.LONG_BREAK,
+                                                    break_duration=300)
+
+
+class SessionServerTests(unittest.TestCase):
+    def setUp(self):
+        self.manager = _create_manager()
+        self.server = SessionServer(self.manager)
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.05,))
+        self.thread.start()
+        self.connection = HTTPConnection(*self.server.server_address)
+
+    def tearDown(self):
+        self.connection.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        self.manager.stop()
+
+    def test_post_session_starts_a_session(self):
+        status, body = self._request("POST", "/users/u1/session", {"task": "t1"})
+
+        assert status == 200
+        assert body["timer_type"] == "session"
+        assert body["task"] == "t1"
+
+    def test_delete_session_stops_the_session(self):
+        self._request("POST", "/users/u1/session", {"task": "t1"})
+        timer = self.manager.get_session("u1").timer
+
+        status, _ = self._request("DELETE", "/users/u1/session")
+        timer.join(timeout=1)
+
+        assert status == 200
+        assert self._request("GET", "/users/u1")[1]["timer_type"] is None
+
+    def test_post_session_returns_conflict_for_running_timer(self):
+        self._request("POST", "/users/u1/break")
+
+        status, _ = self._request("POST", "/users/u1/session", {"task": "t1"})
+
+        assert status == 409
+
+    def test_post_session_after_delete_session_starts_a_session(self):
+        self._request("POST", "/users/u1/session", {"task": "t1"})
+        self._request("DELETE", "/users/u1/session")
+
+        status, body = self._request("POST", "/users/u1/session", {"task": "t2"})
+
+        assert status == 200
+        assert body["task"] == "t2"
+
+    def test_delete_break_returns_conflict_for_running_session(self):
+        self._request("POST", "/users/u1/session", {"task": "t1"})
+
+        status, _ = self._request("DELETE", "/users/u1/break")
+
+        assert status == 409
+        assert self._request("GET", "/users/u1")[1]["timer_type"] == "session"
+
+    def test_unknown_user_returns_not_found(self):
+        assert self._request("GET", "/users/u1")[0] == 404
+        assert self._request("DELETE", "/users/u1/session")[0] == 404
+        assert self.manager.get_session("u1") is None
+
+    def test_post_session_returns_bad_request_for_invalid_json(self):
+        status, _ = self._request("POST", "/users/u1/session", "[1, 2]")
+
+        assert status == 400
+
+    def test_unknown_path_returns_not_found(self):
+        status, _ = self._request("GET", "/sessions")
+
+        assert status == 404
+
+    def _request(self, method, path, body=None):
+        if body is not None and not isinstance(body, str):
+            body = json.dumps(body)
+        self.connection.request(method, path, body)
+        response = self.connection.getresponse()
+        return response.status, json.loads(response.read().decode("utf-8"))
+
+
+@pytest.mark.perf
+def test_session_manager_load():
+    users = 10000
+    duration = 10
+    lateness = []
+    manager = _create_manager(session_duration=duration)
+
+    def on_increment(time_elapsed, user):
+        lateness.append(time.monotonic() - manager.get_session(user).timer.deadline)
+    pomodoro.Pomodoro.signal_timer_increment.connect(on_increment)
+
+    time_start = time.monotonic()
+    timers = []
+    for i in range(users):
+        manager.start_session("user{0}".format(i), Task(i, 0, 0, None, "task"))
+        timers.append(manager.get_session("user{0}".format(i)).timer)
+    for timer in timers:
+        timer.join()
+    time_total = time.monotonic() - time_start
+    manager.stop()
+    pomodoro.Pomodoro.signal_timer_increment.disconnect(on_increment)
+
+    lateness.sort()
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print("\n{0} users: ticks/sec = {1:.0f}, tick lateness p50 = {2:.2f}ms, "
+          "p99 = {3:.2f}ms, max rss = {4:.1f}MB"
+          .format(users, len(lateness) / time_total,
+                  lateness[len(lateness) // 2] * 1000,
+                  lateness[int(len(lateness) * 0.99)] * 1000, rss / 1024))
+    assert len(lateness) == users * (duration - 1)
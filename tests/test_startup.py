@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""Startup time benchmarks for pomito.
+
+Each run starts pomito in a fresh interpreter with tests/startup_probe.py.
+Cold runs start with an empty bytecode cache, warm runs reuse it. Results are
+written as json to `POMITO_STARTUP_RESULTS` if set, and compared against the
+budget in `POMITO_STARTUP_BUDGET` (default tests/data/startup_budget.json).
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(TESTS_DIR)
+PROBE = os.path.join(TESTS_DIR, "startup_probe.py")
+BUDGET = os.environ.get("POMITO_STARTUP_BUDGET",
+                        os.path.join(TESTS_DIR, "data", "startup_budget.json"))
+WARM_RUNS = 5
+# Error of Qt if the display can't be reached
+NO_DISPLAY_ERROR = "could not connect to display"
+
+
+def _run_probe(ui, pycache_dir):
+    env = dict(os.environ, PYTHONPYCACHEPREFIX=pycache_dir, PYTHONPATH=ROOT_DIR)
+    # Qt plugin is registered only outside tests
+    env.pop("POMITO_TEST", None)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    if ui == "qtapp":
+        # Hotkeys of qtapp need a X11 display on linux, e.g. not offscreen
+        if sys.platform.startswith("linux") and not env.get("DISPLAY"):
+            pytest.skip("qtapp ui needs a display.")
+        env.pop("QT_QPA_PLATFORM", None)
+    with tempfile.TemporaryDirectory() as work_dir:
+        process = subprocess.run([sys.executable, PROBE, ui, work_dir],
+                                 env=env, cwd=ROOT_DIR, universal_newlines=True,
+                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if process.returncode != 0:
+        if ui == "qtapp" and NO_DISPLAY_ERROR in process.stderr:
+            pytest.skip("qtapp ui needs a display: {0}".format(env["DISPLAY"]))
+        pytest.fail("{0} ui did not start:\n{1}".format(ui, process.stderr))
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def _measure(ui):
+    with tempfile.TemporaryDirectory() as pycache_dir:
+        cold = _run_probe(ui, pycache_dir)
+        warm = [_run_probe(ui, pycache_dir) for _ in range(WARM_RUNS)]
+    return {"cold": cold,
+            "warm": {k: statistics.median(w[k] for w in warm) for k in cold}}
+
+
+def _save_results(ui, results):
+    path = os.environ.get("POMITO_STARTUP_RESULTS")
+    if path is None:
+        return
+    data = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            data = json.load(f)
+    data[ui] = results
+    with open(path, "w") as f:
+        json.dump(data, f, indent=4, sort_keys=True)
+
+
+def _check_budget(ui, results):
+    with open(BUDGET) as f:
+        budget = json.load(f).get(ui, {})
+    return ["{0} {1}: {2:.1f}ms > {3:.1f}ms".format(run, phase,
+                                                    results[run][phase] * 1000,
+                                                    limit * 1000)
+            for run, phases in sorted(budget.items())
+            for phase, limit in sorted(phases.items())
+            if results[run][phase] > limit]
+
+
+@pytest.mark.perf
+@pytest.mark.parametrize("ui", ["console", "qtapp"])
+def test_startup_benchmark(ui):
+    results = _measure(ui)
+    _save_results(ui, results)
+
+    print("\n{0}:".format(ui))
+    for run in ("cold", "warm"):
+        print("  {0}: {1}".format(run, ", ".join(
+            "{0} = {1:.1f}ms".format(k, v * 1000) for k, v in results[run].items())))
+    regressions = _check_budget(ui, results)
+    assert regressions == []
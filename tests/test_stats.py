@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""Tests for the statistics queries."""
+
+import os
+import tempfile
+import time
+import unittest
+from datetime import date, datetime, timedelta
+
+import pytest
+from peewee import SqliteDatabase
+
+from pomito import stats
+from pomito.hooks.activity import (ActivityModel, DailyRollupModel,
+                                   TaskRollupModel, database_proxy,
+                                   rebuild_rollups)
+
+
+def _activity(timestamp, category="session", reason="complete",
+              duration=1500.0, task_uid=None):
+    return {"timestamp": timestamp, "category": category, "reason": reason,
+            "duration": duration, "task_uid": task_uid}
+
+
+class StatsTests(unittest.TestCase):
+    def setUp(self):
+        self.database = SqliteDatabase(":memory:")
+        database_proxy.initialize(self.database)
+        ActivityModel.create_table()
+        DailyRollupModel.create_table()
+        TaskRollupModel.create_table()
+        # Monday, 6th Jan 2020
+        self.start = datetime(2020, 1, 6)
+        self.end = datetime(2020, 1, 20)
+
+        day = timedelta(days=1)
+        ActivityModel.insert_many([
+            _activity(datetime(2020, 1, 5, 23), task_uid="t0"),
+            _activity(datetime(2020, 1, 6, 9), task_uid="t1"),
+            _activity(datetime(2020, 1, 6, 10), task_uid="t1"),
+            _activity(datetime(2020, 1, 6, 11), reason="interrupt",
+                      duration=300.0, task_uid="t2"),
+            _activity(datetime(2020, 1, 6, 11, 5), category="break",
+                      reason="complete", duration=300.0),
+            _activity(datetime(2020, 1, 6, 11, 10), category="interruption",
+                      reason=None, duration=60.0),
+            _activity(datetime(2020, 1, 7, 9), task_uid="t2"),
+            _activity(datetime(2020, 1, 13, 9) + day * 6),
+            _activity(datetime(2020, 1, 20), task_uid="t0"),
+        ]).execute()
+        rebuild_rollups(self.database)
+
+    def tearDown(self):
+        self.database.close()
+
+    def test_get_sessions_per_day(self):
+        sessions = stats.get_sessions_per_day(self.start, self.end)
+
+        assert sessions == [(date(2020, 1, 6), 2), (date(2020, 1, 7), 1),
+                            (date(2020, 1, 19), 1)]
+
+    def test_get_sessions_per_week(self):
+        sessions = stats.get_sessions_per_week(self.start, self.end)
+
+        assert sessions == [(date(2020, 1, 6), 3), (date(2020, 1, 13), 1)]
+
+    def test_get_sessions_per_task(self):
+        sessions = stats.get_sessions_per_task(self.start, self.end)
+
+        assert sessions == [("t1", 2, 3000.0), (None, 1, 1500.0),
+                            ("t2", 1, 1800.0)]
+
+    def test_get_interruption_rate(self):
+        rate = stats.get_interruption_rate(self.start, self.end)
+
+        assert rate == 1 / 5
+
+    def test_get_interruption_rate_without_sessions(self):
+        rate = stats.get_interruption_rate(self.end, self.end)
+
+        assert rate == 0.0
+
+    def test_get_focus_histogram(self):
+        histogram = stats.get_focus_histogram(self.start, self.end)
+
+        assert len(histogram) == 24
+        assert histogram[9] == 4500.0
+        assert histogram[10] == 1500.0
+        assert histogram[11] == 300.0
+        assert sum(histogram) == 6300.0
+
+    def test_get_last_session_per_task(self):
+        last = stats.get_last_session_per_task(self.start, self.end)
+
+        assert last == [("t2", date(2020, 1, 7)), ("t1", date(2020, 1, 6))]
+
+    def test_queries_use_database_argument(self):
+        database = SqliteDatabase(":memory:")
+        with database.bind_ctx([ActivityModel, DailyRollupModel,
+                               TaskRollupModel]):
+            ActivityModel.create_table()
+            DailyRollupModel.create_table()
+            TaskRollupModel.create_table()
+
+        sessions = stats.get_sessions_per_day(self.start, self.end, database)
+
+        assert sessions == []
+        database.close()
+
+    def test_queries_read_rollups_for_complete_days(self):
+        ActivityModel.delete().execute()
+
+        assert stats.get_sessions_per_day(self.start, self.end) ==\
+            [(date(2020, 1, 6), 2), (date(2020, 1, 7), 1), (date(2020, 1, 19), 1)]
+        assert stats.get_sessions_per_week(self.start, self.end) ==\
+            [(date(2020, 1, 6), 3), (date(2020, 1, 13), 1)]
+        assert stats.get_sessions_per_task(self.start, self.end) ==\
+            [("t1", 2, 3000.0), (None, 1, 1500.0), ("t2", 1, 1800.0)]
+        assert stats.get_interruption_rate(self.start, self.end) == 1 / 5
+        assert stats.get_last_session_per_task(self.start, self.end) ==\
+            [("t2", date(2020, 1, 7)), ("t1", date(2020, 1, 6))]
+
+    def test_queries_read_activities_for_partial_days(self):
+        now = datetime.now()
+        today = datetime.combine(now.date(), datetime.min.time())
+        ActivityModel.insert_many([
+            _activity(today, task_uid="t1"),
+            _activity(today, reason="interrupt", task_uid="t1"),
+        ]).execute()
+
+        assert stats.get_sessions_per_day(self.start, now) ==\
+            [(date(2020, 1, 6), 2), (date(2020, 1, 7), 1),
+             (date(2020, 1, 19), 1), (date(2020, 1, 20), 1), (now.date(), 1)]
+        assert stats.get_sessions_per_task(self.start, now)[0] ==\
+            ("t1", 3, 6000.0)
+        assert stats.get_interruption_rate(self.start, now) == 2 / 8
+        assert stats.get_last_session_per_task(self.start, now) ==\
+            [("t1", now.date()), ("t0", date(2020, 1, 20)),
+             ("t2", date(2020, 1, 7))]
+        # Partial first day
+        assert stats.get_sessions_per_day(datetime(2020, 1, 6, 10), self.end)\
+            == [(date(2020, 1, 6), 1), (date(2020, 1, 7), 1),
+                (date(2020, 1, 19), 1)]
+
+    def test_split_range_excludes_today(self):
+        today = datetime.combine(date.today(), datetime.min.time())
+        start = today - timedelta(days=2, hours=1)
+        end = today + timedelta(hours=1)
+
+        days, ranges = stats._split_range(start, end)
+
+        assert days == (today.date() - timedelta(days=2), today.date())
+        assert ranges == [(start, today - timedelta(days=2)), (today, end)]
+
+    def test_split_range_without_complete_days(self):
+        start = datetime(2020, 1, 6, 1)
+        end = datetime(2020, 1, 6, 2)
+
+        assert stats._split_range(start, end) == (None, [(start, end)])
+
+    def test_queries_use_covering_index(self):
+        query = stats._select_sessions(self.start, self.end, None,
+                                       ActivityModel.task_uid,
+                                       ActivityModel.duration)\
+            .where(ActivityModel.reason == "complete")
+        sql, params = query.sql()
+
+        plan = self.database.execute_sql("EXPLAIN QUERY PLAN " + sql, params)
+
+        assert "COVERING INDEX" in " ".join(str(r) for r in plan.fetchall())
+
+
+def _create_history(database, rows, end):
+    """Create activities, one a minute, ending at `end`."""
+    database.execute_sql("""
+        WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n
+                                WHERE i < ?)
+        INSERT INTO activitymodel (timestamp, category, duration, task_uid,
+                                   reason)
+        SELECT datetime(?, '-' || i || ' minutes'),
+               CASE WHEN i % 10 < 6 THEN 'session'
+                    WHEN i % 10 < 9 THEN 'break'
+                    ELSE 'interruption' END,
+               1500.0, 'task' || (i % 50),
+               CASE WHEN i % 7 = 0 THEN 'interrupt' ELSE 'complete' END
+        FROM n""", (rows, end.strftime("%Y-%m-%d %H:%M:%S")))
+
+
+@pytest.mark.perf
+def test_stats_benchmark():
+    rows = 5000000
+    end = datetime.now()
+    queries = [
+        ("sessions/day, 7 days", stats.get_sessions_per_day, 7),
+        ("sessions/day, 30 days", stats.get_sessions_per_day, 30),
+        ("sessions/week, 30 days", stats.get_sessions_per_week, 30),
+        ("sessions/task, 30 days", stats.get_sessions_per_task, 30),
+        ("interruption rate, 30 days", stats.get_interruption_rate, 30),
+        ("focus histogram, 30 days", stats.get_focus_histogram, 30),
+        ("sessions/week, 365 days", stats.get_sessions_per_week, 365),
+        ("sessions/task, 365 days", stats.get_sessions_per_task, 365),
+        ("last session/task, 365 days", stats.get_last_session_per_task, 365),
+        ("sessions/day, all", stats.get_sessions_per_day, 3650),
+    ]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        database = SqliteDatabase(os.path.join(tmpdir, "pomito.db"))
+        database_proxy.initialize(database)
+        ActivityModel.create_table()
+        DailyRollupModel.create_table()
+        TaskRollupModel.create_table()
+        with database.atomic():
+            _create_history(database, rows, end)
+        time_start = time.perf_counter()
+        rebuild_rollups(database)
+        time_rebuild = time.perf_counter() - time_start
+        database.execute_sql("ANALYZE")
+
+        timings = []
+        for name, query, days in queries:
+            start = end - timedelta(days=days)
+            query(start, end)
+            time_start = time.perf_counter()
+            for _ in range(10):
+                query(start, end)
+            timings.append((name, (time.perf_counter() - time_start) / 10))
+        database.close()
+
+    print("\nrebuild rollups: {0:.2f}s".format(time_rebuild))
+    for name, timing in timings:
+        print("{0}: {1:.1f}ms".format(name, timing * 1000))
+    assert max(t for _, t in timings) < 0.05
@@ -1,7 +1,13 @@
 #!/usr/bin/env python
 """Tests for the Task module."""
 
+import gc
+import time
+import tracemalloc
 import unittest
+
+import pytest
+
 import pomito.task
 
 
@@ -59,6 +65,38 @@ class TaskTests(unittest.TestCase):
 
         assert self.test_task.completed == 1
 
+    def test_task_has_no_instance_dict(self):
+        assert not hasattr(self.test_task, "__dict__")
+
+    def test_task_uid_is_md5_of_description_computed_on_first_use(self):
+        t = pomito.task.Task(None, 1, 0, None, "A Simple Task")
+
+        assert t._uid is None
+        assert t.uid == "192eb3491d0dac0498d6efdc594337c0"
+        assert t._uid == t.uid
+
+    def test_task_str_is_cached_till_update(self):
+        t = pomito.task.Task(1, 2, 0, "t", "d")
+
+        assert str(t) is str(t)
+        t.update_actual()
+        assert str(t) == "I:1 | E:2 | A:1 | T:t | D:d"
+        t.update_estimate(5)
+        assert str(t) == "I:1 | E:5 | A:1 | T:t | D:d"
+        t.uid = 2
+        assert str(t) == "I:2 | E:5 | A:1 | T:t | D:d"
+
+    def test_task_str_is_reset_when_a_field_is_set(self):
+        t = pomito.task.Task(1, 2, 0, "t", "d")
+        str(t)
+
+        t.description = "e"
+        t.tags = "u"
+        assert str(t) == "I:1 | E:2 | A:0 | T:u | D:e"
+        t.estimate = 3
+        t.actual = 4
+        assert str(t) == "I:1 | E:3 | A:4 | T:u | D:e"
+
     def test_get_null_task_returns_dummy_task(self):
         dummy_task = pomito.task.get_null_task()
 
@@ -67,3 +105,239 @@ class TaskTests(unittest.TestCase):
         assert dummy_task.description == "No task selected."
         assert dummy_task.estimate == 0
         assert dummy_task.tags is None
+
+
+class TaskIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.tasks = [pomito.task.Task(uid, 1, 0, tags, description)
+                      for uid, tags, description in [
+                          ("abc1", "work", "write report"),
+                          ("abd2", "home", "fix the sink"),
+                          ("b123", "work", "review report"),
+                          ("abc3", None, "plan week")]]
+        self.index = pomito.task.TaskIndex()
+        self.index.update(self.tasks)
+
+    def test_find_by_uid_returns_tasks_with_uid_prefix(self):
+        assert self.index.find_by_uid("ab") == [self.tasks[0], self.tasks[3],
+                                                self.tasks[1]]
+        assert self.index.find_by_uid("abd") == [self.tasks[1]]
+        assert self.index.find_by_uid("b123") == [self.tasks[2]]
+        assert self.index.find_by_uid("c") == []
+
+    def test_search_returns_tasks_with_substring_in_index_order(self):
+        assert self.index.search("report") == [self.tasks[0], self.tasks[2]]
+        assert self.index.search("T:work | D:rev") == [self.tasks[2]]
+        assert self.index.search("E:1") == self.tasks
+        assert self.index.search("missing") == []
+
+    def test_search_matches_parts_of_words(self):
+        for text in ["epor", "ork | D:fi", "rk | D:wr", "k | ", " | ", "1 | E", "abc", "b1", "ne"]:
+            assert self.index.search(text) == [t for t in self.tasks if text in str(t)], text
+        assert self.index.search("rk | D:wr") == [self.tasks[0]]
+
+    def test_search_does_not_match_across_tasks(self):
+        text = "report\nI:abd2"
+
+        assert self.index.search(text) == []
+        assert self.index.search("sink I:b1") == []
+
+    def test_update_returns_false_for_unchanged_tasks(self):
+        assert not self.index.update(list(self.tasks))
+
+    def test_update_indexes_added_and_removed_tasks(self):
+        added = pomito.task.Task("b999", 1, 0, None, "new report")
+
+        assert self.index.update(self.tasks[1:] + [added])
+
+        assert self.index.search("report") == [self.tasks[2], added]
+        assert self.index.find_by_uid("abc") == [self.tasks[3]]
+        assert self.index.find_by_uid("b9") == [added]
+
+    def test_search_returns_tasks_updated_since_indexed(self):
+        self.tasks[1].update_actual()
+        self.tasks[3].update_estimate(2)
+
+        assert self.index.update(self.tasks)
+
+        assert self.index.search("A:1") == [self.tasks[1]]
+        assert self.index.search("A:0") == [self.tasks[0], self.tasks[2],
+                                            self.tasks[3]]
+        assert self.index.search("E:2") == [self.tasks[3]]
+
+    def test_update_indexes_tasks_replaced_in_place(self):
+        tasks = list(self.tasks)
+        self.index.update(tasks)
+
+        tasks[0] = pomito.task.Task("c1", 1, 0, None, "plan trip")
+
+        assert self.index.update(tasks)
+        assert self.index.search("report") == [self.tasks[2]]
+        assert self.index.search("trip") == [tasks[0]]
+        assert self.index.find_by_uid("c1") == [tasks[0]]
+
+    def test_update_formats_only_new_tasks(self):
+        added = pomito.task.Task("c1", 1, 0, None, "new")
+        calls = []
+        original = pomito.task.Task.__str__
+
+        def counting_str(task):
+            calls.append(task)
+            return original(task)
+
+        pomito.task.Task.__str__ = counting_str
+        try:
+            self.index.update(self.tasks + [added])
+        finally:
+            pomito.task.Task.__str__ = original
+
+        assert calls == [added]
+
+
+class TaskStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.store = pomito.task.TaskStore.from_columns(
+            [1, None], [2, 3], [0, 1], ["t", None], ["first", "second"])
+
+    def test_from_columns_raises_for_unequal_columns(self):
+        self.assertRaises(ValueError, pomito.task.TaskStore.from_columns,
+                          [1], [1], [1], [None], [])
+
+    def test_store_creates_tasks_on_access(self):
+        assert self.store._tasks == [None, None]
+
+        t = self.store[1]
+
+        assert t.description == "second"
+        assert t.uid == pomito.task.Task(None, 0, 0, None, "second").uid
+        assert self.store[1] is t
+        assert self.store._tasks[0] is None
+
+    def test_store_is_a_sequence_of_tasks(self):
+        self.store.append("x", "4", 0, None, "third")
+
+        assert len(self.store) == 3
+        assert [t.description for t in self.store] == ["first", "second", "third"]
+        assert [t.estimate for t in self.store[1:]] == [3, 4]
+        assert list(self.store) == list(self.store)
+
+    def test_store_sets_task(self):
+        t = pomito.task.Task("x", 5, 1, None, "replaced")
+
+        self.store[0] = t
+
+        assert self.store[0] is t
+        assert (self.store.uids[0], self.store.estimates[0]) == ("x", 5)
+
+    def test_columns_include_updates_to_tasks(self):
+        self.store[0].update_actual()
+
+        uids, estimates, actuals, tags, descriptions = self.store.columns()
+
+        assert actuals == [1, 1]
+        assert uids == [1, None]
+        assert self.store.actuals == [0, 1]
+
+    def test_splice_returns_new_store_sharing_created_tasks(self):
+        first = self.store[0]
+        other = pomito.task.TaskStore.from_columns(["x", "y"], [1, 1], [0, 0],
+                                                   [None, None], ["x", "y"])
+
+        spliced = self.store.splice(1, 2, other)
+
+        assert [t.description for t in spliced] == ["first", "x", "y"]
+        assert spliced[0] is first
+        assert len(self.store) == 2
+
+
+class StringColumnTests(unittest.TestCase):
+    def setUp(self):
+        self.column = pomito.task.StringColumn.pack(["ab", None, "c", "abc", "c"],
+                                                    empty=None)
+
+    def test_column_is_a_sequence_of_strings(self):
+        assert len(self.column) == 5
+        assert list(self.column) == ["ab", None, "c", "abc", "c"]
+        assert self.column[-1] == "c"
+        assert self.column[1:3] == [None, "c"]
+        self.assertRaises(IndexError, self.column.__getitem__, 5)
+
+    def test_column_is_created_from_packed_strings(self):
+        column = pomito.task.StringColumn(self.column.text, self.column.offsets)
+
+        assert self.column.text == "abcabcc"
+        assert list(column) == ["ab", "", "c", "abc", "c"]
+
+    def test_index_matches_whole_strings(self):
+        assert self.column.index("c") == 2
+        assert self.column.index("abc") == 3
+        assert self.column.index(None) == 1
+        self.assertRaises(ValueError, self.column.index, "bc")
+
+
+class _DictTask(object):
+    """Task as in earlier versions: instance dict, eager uid, no cached str."""
+
+    def __init__(self, uid, estimate, actual, tags, description):
+        self.uid = uid
+        self.description = description
+        self.estimate = int(estimate)
+        self.actual = int(actual)
+        self.tags = tags
+        self.completed = 0
+
+    def __str__(self):
+        return "I:{0} | E:{1} | A:{2} | T:{3} | D:{4}"\
+            .format(self.uid, self.estimate, self.actual, self.tags,
+                    self.description)
+
+
+def _measure(create):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    tasks = create()
+    elapsed = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return tasks, elapsed, memory
+
+
+@pytest.mark.perf
+def test_task_memory_and_throughput_benchmark():
+    count = 1000000
+    # Share the fields, only the tasks are measured
+    uids = list(range(count))
+    descriptions = ["task {0}".format(i) for i in range(count)]
+    tags = "work,home"
+
+    def columns():
+        return uids, [4] * count, [1] * count, [tags] * count, descriptions
+
+    results = {}
+    for name, create in [
+            ("dict", lambda: [_DictTask(i, 4, 1, tags, d)
+                              for i, d in zip(uids, descriptions)]),
+            ("slots", lambda: [pomito.task.Task(i, 4, 1, tags, d)
+                               for i, d in zip(uids, descriptions)]),
+            ("store", lambda: pomito.task.TaskStore.from_columns(*columns()))]:
+        tasks, elapsed, memory = _measure(create)
+
+        # First filter creates tasks of the store and caches strings
+        timings = []
+        for _ in range(3):
+            start = time.perf_counter()
+            matches = sum(1 for t in tasks if "task 99" in str(t))
+            timings.append(time.perf_counter() - start)
+            assert matches == 11111
+        results[name] = (memory, elapsed, timings[0], min(timings[1:]))
+        del tasks
+
+    print("\n1M tasks:")
+    for name, (memory, elapsed, first, repeat) in results.items():
+        print("  {0}: {1:.0f}MB, create = {2:.2f}s, first filter = {3:.2f}s, "
+              "repeat filter = {4:.2f}s".format(name, memory / 2 ** 20,
+                                                elapsed, first, repeat))
+    assert results["slots"][0] < results["dict"][0]
+    assert results["store"][0] < results["slots"][0]
+    assert results["slots"][3] * 2 < results["dict"][3]